@@ -6,23 +6,40 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
+# Supabase settings (SUPABASE_URL can point at the local fake in mocks/supabase_server.py)
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+_supabase: Optional[Client] = None
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Columns added to recordings by backend/migrations; databases that haven't run them yet still get the base row
+_OPTIONAL_COLUMNS = ("timeline", "language", "client_key")
+_missing_columns = set()
+_upsert_supported = True
 
 
-def upload_audio_to_supabase(file_path: str, file_name: str) -> str:
+def get_supabase() -> Client:
+    """
+    Returns the Supabase client, creating it on first use.
+    Importing this module no longer requires Supabase to be configured; the
+    first storage or table call raises ValueError instead if it isn't.
+    """
+    global _supabase
+    if _supabase is None:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+        _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
+
+
+def upload_audio_to_supabase(file_path: str, file_name: str, upsert: bool = False) -> str:
     """
     Upload an audio file to Supabase Storage.
     
     Args:
         file_path: Local path to the audio file
         file_name: Name to use for the file in storage
+        upsert: Overwrite an existing object with the same name (makes retried uploads safe)
         
     Returns:
         Public URL of the uploaded file
@@ -34,14 +51,17 @@ def upload_audio_to_supabase(file_path: str, file_name: str) -> str:
         
         # Upload to the audio-commentary bucket
         bucket_name = "audio-commentary"
-        response = supabase.storage.from_(bucket_name).upload(
+        file_options = {"content-type": "audio/mpeg"}
+        if upsert:
+            file_options["upsert"] = "true"
+        response = get_supabase().storage.from_(bucket_name).upload(
             path=file_name,
             file=file_data,
-            file_options={"content-type": "audio/mpeg"}
+            file_options=file_options
         )
         
         # Get the public URL
-        public_url = supabase.storage.from_(bucket_name).get_public_url(file_name)
+        public_url = get_supabase().storage.from_(bucket_name).get_public_url(file_name)
         
         print(f"✅ Audio uploaded successfully: {public_url}")
         return public_url
@@ -51,12 +71,76 @@ def upload_audio_to_supabase(file_path: str, file_name: str) -> str:
         raise
 
 
+def _recording_row(user_id, pgn, audio_url, white_player=None, black_player=None, timeline=None, language=None,
+                   client_key=None) -> dict:
+    """Builds a recordings table row, leaving out the optional columns that weren't given."""
+    data = {
+        "user_id": user_id,
+        "pgn": pgn,
+        "audio_url": audio_url,
+        "player_white": white_player,
+        "player_black": black_player
+    }
+    if timeline is not None:
+        data["timeline"] = timeline
+    if language is not None:
+        data["language"] = language
+    if client_key is not None:
+        data["client_key"] = client_key
+    return data
+
+
+def _degrade_schema(error) -> bool:
+    """
+    Notes a schema gap reported by PostgREST (an optional column that doesn't exist, or no unique
+    constraint on client_key) so the next attempt leaves it out. Returns False for any other error.
+    """
+    global _upsert_supported
+    code = getattr(error, "code", None)
+    message = f"{getattr(error, 'message', '')} {error}"
+    if code in ("PGRST204", "42703"):
+        for column in _OPTIONAL_COLUMNS:
+            if column not in _missing_columns and column in message:
+                _missing_columns.add(column)
+                print(f"⚠️ recordings has no '{column}' column, saving without it (run backend/migrations/001_recordings_columns.sql).")
+                return True
+    if code == "42P10" and _upsert_supported:
+        _upsert_supported = False
+        print("⚠️ recordings.client_key isn't unique, falling back to plain inserts (retries may duplicate rows).")
+        return True
+    return False
+
+
+def _write_recordings(rows: list, upsert: bool) -> list:
+    """Inserts (or upserts on client_key) recordings rows, dropping the optional columns the database lacks."""
+    keys = [row.get("client_key") for row in rows]
+    while True:
+        trimmed = [{column: value for column, value in row.items() if column not in _missing_columns} for row in rows]
+        table = get_supabase().table("recordings")
+        try:
+            if upsert and _upsert_supported and "client_key" not in _missing_columns:
+                response = table.upsert(trimmed, on_conflict="client_key").execute()
+            else:
+                response = table.insert(trimmed).execute()
+            break
+        except Exception as e:
+            if not _degrade_schema(e):
+                raise
+    # Rows come back in request order; keep the keys callers match on even if the column was dropped
+    for record, key in zip(response.data, keys):
+        if key is not None:
+            record.setdefault("client_key", key)
+    return response.data
+
+
 def save_recording(
     user_id: str,
     pgn: str,
     audio_url: str,
     white_player: Optional[str] = None,
-    black_player: Optional[str] = None
+    black_player: Optional[str] = None,
+    timeline: Optional[dict] = None,
+    language: Optional[str] = None
 ) -> dict:
     """
     Save recording metadata to the recordings table.
@@ -67,29 +151,52 @@ def save_recording(
         audio_url: Public URL of the audio file
         white_player: Name of the white player (optional)
         black_player: Name of the black player (optional)
+        timeline: Per-move audio offsets index (optional, stored in the jsonb 'timeline' column)
+        language: Commentary language (optional, stored in the 'language' column)
         
     Returns:
         The inserted record
     """
     try:
-        data = {
-            "user_id": user_id,
-            "pgn": pgn,
-            "audio_url": audio_url,
-            "player_white": white_player,
-            "player_black": black_player
-        }
+        data = _recording_row(user_id, pgn, audio_url, white_player, black_player, timeline, language)
         
-        response = supabase.table("recordings").insert(data).execute()
+        saved = _write_recordings([data], upsert=False)
         
-        print(f"✅ Recording saved to database: {response.data}")
-        return response.data[0] if response.data else {}
+        print(f"✅ Recording saved to database: {saved}")
+        return saved[0] if saved else {}
         
     except Exception as e:
         print(f"❌ Error saving recording to database: {e}")
         raise
 
 
+def save_recordings(recordings: list) -> list:
+    """
+    Save several recordings in one upsert (one round trip).
+    Each recording carries a client_key (stored in the unique 'client_key' column), so a retry
+    after a lost response updates the rows already inserted instead of duplicating them.
+    
+    Args:
+        recordings: List of dicts with the same keys as save_recording's arguments, plus client_key
+        
+    Returns:
+        The saved records
+    """
+    try:
+        rows = [_recording_row(**recording) for recording in recordings]
+        # A bulk insert needs the same columns in every row
+        columns = {column for row in rows for column in row}
+        rows = [{column: row.get(column) for column in columns} for row in rows]
+        saved = _write_recordings(rows, upsert=True)
+        
+        print(f"✅ Saved {len(saved)} recordings to database")
+        return saved
+        
+    except Exception as e:
+        print(f"❌ Error saving recordings to database: {e}")
+        raise
+
+
 def get_user_recordings(user_id: str) -> list:
     """
     Fetch all recordings for a specific user from the database.
@@ -101,7 +208,7 @@ def get_user_recordings(user_id: str) -> list:
         List of recording dictionaries
     """
     try:
-        response = supabase.table("recordings").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
+        response = get_supabase().table("recordings").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
         
         print(f"✅ Fetched {len(response.data)} recordings for user {user_id}")
         return response.data
@@ -1,17 +1,24 @@
 import sys
 import os
-from fastapi import FastAPI, HTTPException
+import uuid
+import asyncio
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
 import chessdotcom
 import requests
+import torch
 
 # Import database functions
-from database import upload_audio_to_supabase, save_recording ,get_user_recordings
+from database import get_user_recordings
+from outbox import UploadOutbox
+from scheduler import JobScheduler, SchedulerFull, estimate_plies
+from prefetcher import GamePrefetcher
 
 
 
@@ -20,30 +27,117 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.append(project_root)
 
-from src.config import STOCKFISH_PATH, DEVICE, TTS_MODEL_NAME
+from src.config import STOCKFISH_PATH, DEVICE, TTS_MODEL_NAME, TTS_SEGMENT_CACHE_DIR, TTS_SEGMENT_CACHE_MAX_MB, LIVE_MAX_SESSIONS, LIVE_CONTEXT_MOVES, ANALYSIS_STORE_MAX_PLIES
+from src.config import SCHEDULER_WORKERS, SCHEDULER_PER_USER_CONCURRENCY, SCHEDULER_PER_USER_QUEUE, SCHEDULER_MAX_QUEUE, JOB_DEADLINE_SECONDS
+from src.config import LANGUAGE_CODES, TTS_WORKERS, VIDEO_OUTPUT_DIR, POSITION_BATCH_MAX
+from src.config import CHESS_COM_API_BASE, CHESS_COM_TIMEOUT
+from src.config import ADMIN_TOKEN, RESOURCE_AUTOTUNE, SYZYGY_PATH
+from src.config import PREFETCH_ENABLED, PREFETCH_GAMES_PER_USER, PREFETCH_MAX_QUEUE, PREFETCH_COMMENTARY, PREFETCH_LANGUAGE, PREFETCH_IDLE_SECONDS
+from src.config import OUTBOX_DB_PATH, OUTBOX_BATCH_SIZE, OUTBOX_UPLOAD_CONCURRENCY, OUTBOX_MAX_ATTEMPTS, OUTBOX_POLL_SECONDS, OUTBOX_RETENTION_HOURS
 from src.utils import initialize_tts_model
 from src.chess_analyzer import ChessAnalyzer
 from src.commentary_generator import CommentaryGenerator
 from src.voice_generator import VoiceGenerator
+from src.segment_cache import SegmentCache
+from src.analysis_store import AnalysisStore
+from src.timeline import load_timeline
 from src.pipeline import ChessCommentaryPipeline
+from src.live_session import LiveGameSession
+from src.video_renderer import render_commentary_video
+from src.position_service import PositionCache, PositionService
+from src.engine_supervisor import EngineUnavailable
+from src.profiler import profiler
+from src.cancellation import CancellationToken, JobCancelled
+from src.resources import detect_resources, plan_resources, engine_parameters, apply_torch_threads
 
 APP_USER_AGENT = "Chess AI Commentary Project v0.1 (Contact: your_email@example.com)"
 ml_models = {}
+live_sessions = {}
+live_pending = set()  # Reserved live session slots whose Stockfish is still starting
+LIVE_MESSAGE_FORMAT = 'Messages must be JSON objects like {"move": "e4"}'
+active_jobs = {}  # job_id -> CancellationToken of a running /generate-commentary request
+
+# How often a waiting request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 1.0
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Server starting up...")
     chessdotcom.Client.request_config["headers"]["User-Agent"] = APP_USER_AGENT
     
+    # Split this process's CPUs and memory between Stockfish and torch so they don't oversubscribe the cores
+    resource_plan = None
+    if RESOURCE_AUTOTUNE:
+        resource_plan = plan_resources(detect_resources())
+        apply_torch_threads(resource_plan)
+    ml_models["resource_plan"] = resource_plan
+
     print("Loading AI models...")
     tts = initialize_tts_model(model_name=TTS_MODEL_NAME, device=DEVICE)
-    analyzer = ChessAnalyzer(STOCKFISH_PATH)
+    # Game analysis and the position endpoints share one position cache
+    position_cache = PositionCache()
+    # Engine options shared by the game analyzer and every live session's analyzer
+    ml_models["analyzer_options"] = {
+        "syzygy_path": SYZYGY_PATH,
+        "engine_parameters": engine_parameters(resource_plan) if resource_plan else None,
+    }
+    analyzer = ChessAnalyzer(
+        STOCKFISH_PATH, store=AnalysisStore(max_plies=ANALYSIS_STORE_MAX_PLIES), position_cache=position_cache,
+        **ml_models["analyzer_options"]
+    )
     commentary_gen = CommentaryGenerator()
-    voice_gen = VoiceGenerator(tts)
+    segment_cache = SegmentCache(TTS_SEGMENT_CACHE_DIR, max_bytes=TTS_SEGMENT_CACHE_MAX_MB * 1024 * 1024)
+    voice_gen = VoiceGenerator(tts, segment_cache=segment_cache)
+    
+    # Extra TTS models let multi-language jobs synthesize their languages concurrently
+    extra_voice_gens = []
+    for _ in range(TTS_WORKERS - 1):
+        extra_tts = initialize_tts_model(model_name=TTS_MODEL_NAME, device=DEVICE)
+        if extra_tts:
+            extra_voice_gens.append(VoiceGenerator(extra_tts, segment_cache=segment_cache))
     
-    ml_models["pipeline"] = ChessCommentaryPipeline(analyzer, commentary_gen, voice_gen)
+    ml_models["pipeline"] = ChessCommentaryPipeline(analyzer, commentary_gen, voice_gen, extra_voice_gens=extra_voice_gens)
+    ml_models["segment_cache"] = segment_cache
+    ml_models["scheduler"] = JobScheduler(
+        workers=SCHEDULER_WORKERS,
+        per_user_concurrency=SCHEDULER_PER_USER_CONCURRENCY,
+        per_user_queue_limit=SCHEDULER_PER_USER_QUEUE,
+        max_queue=SCHEDULER_MAX_QUEUE
+    )
+    ml_models["position_service"] = PositionService(STOCKFISH_PATH, cache=position_cache)
+    ml_models["outbox"] = UploadOutbox(
+        OUTBOX_DB_PATH,
+        batch_size=OUTBOX_BATCH_SIZE,
+        upload_concurrency=OUTBOX_UPLOAD_CONCURRENCY,
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+        poll_seconds=OUTBOX_POLL_SECONDS,
+        retention_hours=OUTBOX_RETENTION_HOURS
+    )
+    ml_models["outbox"].start()
+    if PREFETCH_ENABLED:
+        # Uses idle capacity only: interactive jobs preempt it (see backend/prefetcher.py)
+        ml_models["prefetcher"] = GamePrefetcher(
+            ml_models["pipeline"], ml_models["scheduler"], _chess_com_get,
+            games_per_user=PREFETCH_GAMES_PER_USER,
+            max_queue=PREFETCH_MAX_QUEUE,
+            commentary_language=PREFETCH_LANGUAGE if PREFETCH_COMMENTARY else None,
+            idle_seconds=PREFETCH_IDLE_SECONDS
+        )
+        ml_models["prefetcher"].start()
     print("✅ AI Pipeline loaded and ready!")
     yield
+    for session in list(live_sessions.values()):
+        session.close()
+    live_sessions.clear()
+    if "prefetcher" in ml_models:
+        await ml_models["prefetcher"].stop()
+    if "pipeline" in ml_models:
+        ml_models["pipeline"].analyzer.close()
+    if "position_service" in ml_models:
+        ml_models["position_service"].close()
+    if "outbox" in ml_models:
+        await ml_models["outbox"].stop()
+        ml_models["outbox"].close()
     ml_models.clear()
 
 app = FastAPI(lifespan=lifespan)
@@ -59,16 +153,60 @@ app.add_middleware(
 
 # --- NEW: Serve Audio Files ---
 # This makes files in 'output/audio' accessible at 'http://localhost:8000/audio/...'
+# StaticFiles honours HTTP Range requests (Starlette >= 0.39), so the player can
+# fetch a single move's audio using the byte offsets from /api/v1/timeline/{filename}.
 # Ensure the directory exists first
 os.makedirs("../output/audio", exist_ok=True)
 app.mount("/audio", StaticFiles(directory="../output/audio"), name="audio")
 
+# Board-animation videos (rendered on request) are served the same way
+os.makedirs(VIDEO_OUTPUT_DIR, exist_ok=True)
+app.mount("/videos", StaticFiles(directory=VIDEO_OUTPUT_DIR), name="videos")
+
 class PgnModel(BaseModel):
     pgn: str
     language: str = "English"
     user_id: Optional[str] = None  # Clerk User ID
     player_white: Optional[str] = None
     player_black: Optional[str] = None
+    use_pgn_annotations: bool = False  # Reuse [%eval] comments from chess.com/Lichess exports
+    render_video: bool = False  # Also render a board-animation video with the commentary audio
+    highlights: bool = False  # Narrate only the critical moments plus a short summary, not every move
+    highlights_count: Optional[int] = None  # Moments to keep in highlights mode (default HIGHLIGHTS_TOP_K)
+    job_id: Optional[str] = None  # Client-chosen id (e.g. a UUID); required to cancel the job while it runs
+
+class MultiLanguagePgnModel(BaseModel):
+    pgn: str
+    languages: List[str] = ["English"]  # Full names, as in PgnModel.language
+    user_id: Optional[str] = None  # Clerk User ID
+    player_white: Optional[str] = None
+    player_black: Optional[str] = None
+    use_pgn_annotations: bool = False
+
+class PositionModel(BaseModel):
+    fen: str
+    depth: Optional[int] = None  # Search depth (default POSITION_DEFAULT_DEPTH)
+    movetime_ms: Optional[int] = None  # Time budget instead of a depth
+    multipv: int = Field(3, ge=1, le=5)  # Number of top lines to return
+
+class PositionBatchModel(BaseModel):
+    fens: List[str]
+    depth: Optional[int] = None
+    movetime_ms: Optional[int] = None
+    multipv: int = Field(3, ge=1, le=5)
+
+class ProfilingModel(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = None  # Fraction of pipeline runs to profile (0-1)
+    interval_ms: Optional[float] = None  # Stack sampling interval
+
+def require_admin(request: Request):
+    """Admin endpoints need the X-Admin-Token header when ADMIN_TOKEN is set, otherwise a local client."""
+    if ADMIN_TOKEN:
+        if request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+            raise HTTPException(status_code=403, detail="Admin token required")
+    elif not request.client or request.client.host not in ("127.0.0.1", "::1", "localhost"):
+        raise HTTPException(status_code=403, detail="Admin endpoints are local-only unless ADMIN_TOKEN is set")
 
 # --- ENDPOINTS ---
 
@@ -82,7 +220,7 @@ async def get_recordings(user_id: str):
     Retrieve all recordings for a specific user.
     """
     try:
-        recordings = get_user_recordings(user_id)
+        recordings = await asyncio.to_thread(get_user_recordings, user_id)
         return {"recordings": recordings}
     except Exception as e:
         print(f"❌ Error in get_recordings endpoint: {e}")
@@ -90,78 +228,336 @@ async def get_recordings(user_id: str):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def _chess_com_get(path: str):
+    """GET a chess.com public API path (blocking; run it in a thread)."""
+    response = requests.get(f"{CHESS_COM_API_BASE}{path}", headers={"User-Agent": APP_USER_AGENT}, timeout=CHESS_COM_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
 @app.get("/api/v1/games/archives/{username}")
 async def get_game_archives(username: str):
-    # ... (Keep your existing get_game_archives code here) ...
-    # (Copy the code from our previous step)
     try:
-        url = f"https://api.chess.com/pub/player/{username}/games/archives"
-        headers = {"User-Agent": APP_USER_AGENT}
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+        archives = await asyncio.to_thread(_chess_com_get, f"/player/{username}/games/archives")
     except Exception as e:
         return {"error": str(e)}
+    # Analyze the newest games in the background, so "narrate my last game" finds them cached
+    if "prefetcher" in ml_models and isinstance(archives, dict):
+        ml_models["prefetcher"].on_archives(username, archives.get("archives", []))
+    return archives
 
 @app.get("/api/v1/games/by-month/{username}/{YYYY}/{MM}")
 async def get_games_for_month(username: str, YYYY: str, MM: str):
-    # ... (Keep your existing get_games_for_month code here) ...
+    # Same response shape as chessdotcom.get_player_games_by_month(...).json, but the base
+    # URL is configurable and the request doesn't block the event loop
     try:
-        return chessdotcom.get_player_games_by_month(username, YYYY, MM).json
+        return await asyncio.to_thread(_chess_com_get, f"/player/{username}/games/{YYYY}/{MM.zfill(2)}")
     except Exception as e:
         return {"error": str(e)}
 
+async def _cancel_on_disconnect(request: Request, cancel_token: CancellationToken):
+    """Cancels a job once its client disconnects (or its deadline passes) while the request is waiting."""
+    while not cancel_token.cancelled:
+        if await request.is_disconnected():
+            cancel_token.cancel("client disconnected")
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+@app.post("/api/v1/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancels a running /api/v1/generate-commentary job by the job_id it was submitted with.
+    The id must be chosen by the client (PgnModel.job_id): the generate response, and so a
+    server-generated id, only arrives once the job is over.
+    """
+    cancel_token = active_jobs.get(job_id)
+    if cancel_token is None:
+        raise HTTPException(status_code=404, detail="No running job with this id")
+    cancel_token.cancel("cancelled by client")
+    return {"job_id": job_id, "status": "cancelling"}
+
 # --- UPDATED: Synchronous Generation Endpoint with Supabase Integration ---
 @app.post("/api/v1/generate-commentary")
-async def generate_commentary(pgn_data: PgnModel):
+async def generate_commentary(pgn_data: PgnModel, request: Request):
     """
     Runs the pipeline AND WAITS for the result.
-    Uploads to Supabase Storage and saves metadata to database.
-    Returns the Supabase URL so the frontend can play it.
+    Jobs go through the fair scheduler; if it is full, responds 429 with a queue estimate.
+    Queues the Supabase upload and metadata insert in the outbox and returns the local URL
+    right away; poll /api/v1/uploads/{upload_job_id} for the Supabase URL.
+    The job is cancelled (queued or mid-run) if the client disconnects, if
+    /api/v1/jobs/{job_id}/cancel is called (with the client-supplied job_id), or after
+    JOB_DEADLINE_SECONDS. Without a job_id, the server picks one for logs and the response.
     """
     print(f"Received PGN. Starting synchronous generation...")
     
     pipeline = ml_models.get("pipeline")
-    if not pipeline:
+    scheduler = ml_models.get("scheduler")
+    if not pipeline or not scheduler:
         raise HTTPException(status_code=500, detail="Pipeline not loaded")
     
-    # Run the pipeline (This will block for 30-60s, which is fine for this test)
-    file_path = pipeline.run_pipeline_for_backend(pgn_data.pgn, pgn_data.language)
+    # Anonymous requests are grouped per client address so they can't starve signed-in users
+    user_key = pgn_data.user_id or f"ip:{request.client.host if request.client else 'unknown'}"
+
+    job_id = pgn_data.job_id or uuid.uuid4().hex
+    if job_id in active_jobs:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is already running")
+    cancel_token = CancellationToken(deadline_seconds=JOB_DEADLINE_SECONDS or None)
+    active_jobs[job_id] = cancel_token
+    disconnect_watch = asyncio.create_task(_cancel_on_disconnect(request, cancel_token))
+    
+    # Run the pipeline in a worker thread once the scheduler admits the job
+    try:
+        file_path = await scheduler.submit(
+            user_key, estimate_plies(pgn_data.pgn),
+            pipeline.run_pipeline_for_backend, pgn_data.pgn, pgn_data.language, pgn_data.use_pgn_annotations,
+            pgn_data.highlights, pgn_data.highlights_count, cancel_token,
+            cancel_token=cancel_token
+        )
+
+        # The board video is a scheduled job of its own, so renders share the fairness and capacity limits
+        video_path = None
+        if file_path and pgn_data.render_video:
+            try:
+                video_path = await scheduler.submit(
+                    user_key, estimate_plies(pgn_data.pgn),
+                    render_commentary_video, pgn_data.pgn, file_path,
+                    cancel_token=cancel_token, timed=False # Render time would skew the per-ply commentary estimate
+                )
+            except SchedulerFull as e:
+                print(f"⚠️ Skipping the video render: {e.detail}")
+    except JobCancelled as e:
+        # 504 when the deadline passed; otherwise the client is gone or asked for it (nginx's 499)
+        raise HTTPException(
+            status_code=504 if e.reason == "deadline exceeded" else 499,
+            detail={"message": str(e), "job_id": job_id}
+        )
+    except SchedulerFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": e.detail,
+                "queue_position": e.queue_position,
+                "estimated_wait_seconds": round(e.retry_after)
+            },
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+    finally:
+        disconnect_watch.cancel()
+        active_jobs.pop(job_id, None)
     
     if not file_path:
         raise HTTPException(status_code=500, detail="Generation failed")
     
     # Get the filename
     filename = os.path.basename(file_path)
+    timeline = load_timeline(file_path)
+    
+    video_url = f"http://127.0.0.1:8000/videos/{os.path.basename(video_path)}" if video_path else None
     
-    # Upload to Supabase Storage
+    # Supabase upload and the recordings insert happen in the background (see backend/outbox.py);
+    # the local file serves playback until then, and /api/v1/uploads/{job_id} reports the final URL
+    local_url = f"http://127.0.0.1:8000/audio/{filename}"
+    upload_job_id = ml_models["outbox"].enqueue(
+        file_path, local_url,
+        user_id=pgn_data.user_id,
+        pgn=pgn_data.pgn,
+        white_player=pgn_data.player_white,
+        black_player=pgn_data.player_black,
+        timeline=timeline
+    )
+    return {
+        "status": "complete",
+        "job_id": job_id,
+        "audio_url": local_url,
+        "local_url": local_url,
+        "upload_job_id": upload_job_id,
+        "timeline": timeline,
+        "video_url": video_url,
+        "highlights": pgn_data.highlights
+    }
+
+@app.post("/api/v1/generate-commentary/multi")
+async def generate_commentary_multi(pgn_data: MultiLanguagePgnModel, request: Request):
+    """
+    Like /api/v1/generate-commentary, but for several languages from one Stockfish analysis.
+    Languages are synthesized concurrently (see TTS_WORKERS). Each language is queued
+    for upload as its own recording. Returns one entry per language.
+    """
+    pipeline = ml_models.get("pipeline")
+    scheduler = ml_models.get("scheduler")
+    if not pipeline or not scheduler:
+        raise HTTPException(status_code=500, detail="Pipeline not loaded")
+
+    languages = list(dict.fromkeys(pgn_data.languages))
+    unknown = [language for language in languages if language not in LANGUAGE_CODES]
+    if not languages or unknown:
+        raise HTTPException(status_code=400, detail=f"Languages must be some of: {', '.join(LANGUAGE_CODES)}")
+
+    user_key = pgn_data.user_id or f"ip:{request.client.host if request.client else 'unknown'}"
+
+    # Analysis is shared, but commentary and TTS scale with the number of languages
     try:
-        audio_url = upload_audio_to_supabase(file_path, filename)
-        
-        # Save metadata to database if user_id is provided
-        if pgn_data.user_id:
-            save_recording(
-                user_id=pgn_data.user_id,
-                pgn=pgn_data.pgn,
-                audio_url=audio_url,
-                white_player=pgn_data.player_white,
-                black_player=pgn_data.player_black
-            )
-        
-        # Return the Supabase URL
-        return {
-            "status": "complete",
-            "audio_url": audio_url,
-            "local_url": f"http://127.0.0.1:8000/audio/{filename}"  # Keep local URL as backup
-        }
-    except Exception as e:
-        print(f"Error with Supabase upload: {e}")
-        # Fallback to local URL if Supabase fails
-        return {
-            "status": "complete",
-            "audio_url": f"http://127.0.0.1:8000/audio/{filename}",
-            "error": "Supabase upload failed, using local storage"
+        file_paths = await scheduler.submit(
+            user_key, estimate_plies(pgn_data.pgn) * len(languages),
+            pipeline.run_multilang_pipeline_for_backend, pgn_data.pgn, languages, pgn_data.use_pgn_annotations
+        )
+    except SchedulerFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": e.detail,
+                "queue_position": e.queue_position,
+                "estimated_wait_seconds": round(e.retry_after)
+            },
+            headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+
+    if not file_paths or not any(file_paths.values()):
+        raise HTTPException(status_code=500, detail="Generation failed")
+
+    recordings = {}
+    for language, file_path in file_paths.items():
+        if not file_path:
+            recordings[language] = {"status": "failed"}
+            continue
+
+        filename = os.path.basename(file_path)
+        timeline = load_timeline(file_path)
+        local_url = f"http://127.0.0.1:8000/audio/{filename}"
+        upload_job_id = ml_models["outbox"].enqueue(
+            file_path, local_url,
+            user_id=pgn_data.user_id,
+            pgn=pgn_data.pgn,
+            white_player=pgn_data.player_white,
+            black_player=pgn_data.player_black,
+            timeline=timeline,
+            language=language
+        )
+        recordings[language] = {"status": "complete", "audio_url": local_url, "upload_job_id": upload_job_id, "timeline": timeline}
+
+    return {"status": "complete", "recordings": recordings}
+
+@app.post("/api/v1/analyze-position")
+async def analyze_position(position: PositionModel):
+    """
+    Evaluates a single position (for eval bars). Cached positions, including every
+    position of previously analyzed games, are answered without touching an engine.
+    """
+    service = ml_models.get("position_service")
+    if not service:
+        raise HTTPException(status_code=500, detail="Position service not loaded")
+
+    started = datetime.now()
+    result = service.lookup(position.fen, position.depth, position.movetime_ms, position.multipv)
+    if not result:
+        try:
+            result = await asyncio.to_thread(service.analyze, position.fen, position.depth, position.movetime_ms, position.multipv)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except EngineUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    result["elapsed_ms"] = round((datetime.now() - started).total_seconds() * 1000, 1)
+    return result
+
+@app.post("/api/v1/analyze-positions")
+async def analyze_positions(batch: PositionBatchModel):
+    """Evaluates many positions (e.g. a whole game for its eval graph) across the warm engine pool."""
+    service = ml_models.get("position_service")
+    if not service:
+        raise HTTPException(status_code=500, detail="Position service not loaded")
+    if not batch.fens or len(batch.fens) > POSITION_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {POSITION_BATCH_MAX} FENs")
+
+    started = datetime.now()
+    results = await asyncio.to_thread(service.analyze_batch, batch.fens, batch.depth, batch.movetime_ms, batch.multipv)
+    return {
+        "results": results,
+        "elapsed_ms": round((datetime.now() - started).total_seconds() * 1000, 1)
+    }
+
+@app.get("/api/v1/metrics")
+async def get_metrics():
+    """Returns scheduler, cache, store, engine, tablebase and Gemini client counters for monitoring."""
+    pipeline = ml_models.get("pipeline")
+    scheduler = ml_models.get("scheduler")
+    segment_cache = ml_models.get("segment_cache")
+    store = pipeline.analyzer.store if pipeline else None
+    return {
+        "scheduler": scheduler.stats() if scheduler else None,
+        "segment_cache": segment_cache.stats() if segment_cache else None,
+        "analysis_store": store.stats() if store else None,
+        "engine": pipeline.analyzer.supervisor.get_stats() if pipeline and pipeline.analyzer.supervisor else None,
+        "syzygy": pipeline.analyzer.get_tablebase_stats() if pipeline else None,
+        "gemini": pipeline.commentary_generator.client.get_stats() if pipeline and pipeline.commentary_generator.client else None,
+        "positions": ml_models["position_service"].get_stats() if "position_service" in ml_models else None,
+        "outbox": ml_models["outbox"].stats() if "outbox" in ml_models else None,
+        "prefetch": ml_models["prefetcher"].stats() if "prefetcher" in ml_models else None,
+        "active_jobs": len(active_jobs),
+        "live_sessions": len(live_sessions)
+    }
+
+@app.get("/api/v1/admin/resources")
+async def get_resources(request: Request):
+    """Detected CPUs and memory (with cgroup limits), the autotuned plan, and what the engines and torch actually use."""
+    require_admin(request)
+    pipeline = ml_models.get("pipeline")
+    supervisor = pipeline.analyzer.supervisor if pipeline else None
+    return {
+        "detected": detect_resources(),
+        "plan": ml_models.get("resource_plan"),
+        "applied": {
+            "torch_threads": torch.get_num_threads(),
+            "torch_interop_threads": torch.get_num_interop_threads(),
+            "analysis_engine": supervisor.parameters if supervisor else None,
+            "position_engines": [engine.parameters for engine in ml_models["position_service"].supervisors] if "position_service" in ml_models else None,
         }
+    }
+
+@app.get("/api/v1/admin/profiling")
+async def get_profiling(request: Request):
+    """Profiling settings, per-stage timings (mean / p95) over recent profiled runs, and the run list."""
+    require_admin(request)
+    return profiler.summary()
+
+@app.post("/api/v1/admin/profiling")
+async def set_profiling(settings: ProfilingModel, request: Request):
+    """Turns profiling on or off and sets the sampled fraction of pipeline runs."""
+    require_admin(request)
+    profiler.configure(settings.enabled, settings.sample_rate, settings.interval_ms)
+    return profiler.summary()
+
+@app.get("/api/v1/admin/profiling/{trace_id}")
+async def get_profile_stacks(trace_id: str, request: Request):
+    """
+    Downloads one run's collapsed stacks, e.g. for `flamegraph.pl profile.folded > profile.svg`
+    or drag-and-drop into speedscope.app.
+    """
+    require_admin(request)
+    path = profiler.folded_path(trace_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=os.path.basename(path))
+
+@app.get("/api/v1/uploads/{job_id}")
+async def get_upload_status(job_id: str):
+    """Reports whether a generated recording has reached Supabase yet, and its current audio URL."""
+    outbox = ml_models.get("outbox")
+    job = outbox.get(job_id) if outbox else None
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job
+
+@app.get("/api/v1/timeline/{filename}")
+async def get_timeline(filename: str):
+    """
+    Returns the per-move timeline index for a generated audio file.
+    Each move has start/end sample and byte offsets, so the player can seek
+    to a move and fetch just that slice of /audio/{filename} with a Range request.
+    """
+    safe_name = os.path.basename(filename)
+    timeline = load_timeline(os.path.join("../output/audio", safe_name))
+    if not timeline:
+        raise HTTPException(status_code=404, detail="Timeline not found")
+    return timeline
 
 
 @app.get("/api/v1/recordings/{user_id}")
@@ -179,4 +575,81 @@ def get_user_recordings_route(user_id: str):
 
     except Exception as e:
         print(f"❌ Error fetching recordings: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch recordings.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to fetch recordings.")
+
+# --- Live Games (WebSocket) ---
+@app.websocket("/api/v1/live")
+async def live_game(websocket: WebSocket, language: str = "English", fen: Optional[str] = None):
+    """
+    Narrates a game as it is played.
+    The client sends {"move": "e4"} (SAN or UCI) for each move. For every move the server
+    replies with a JSON message (analysis, commentary, timings, audio_url) followed by
+    the move's WAV audio as a binary message.
+    """
+    await websocket.accept()
+
+    pipeline = ml_models.get("pipeline")
+    if not pipeline:
+        await websocket.close(code=1011, reason="Pipeline not loaded")
+        return
+    if len(live_sessions) + len(live_pending) >= LIVE_MAX_SESSIONS:
+        await websocket.close(code=1013, reason="Too many live sessions, try again later")
+        return
+
+    # Reserve the slot before starting Stockfish, so concurrent connects can't all pass the check above
+    reservation = uuid.uuid4().hex
+    live_pending.add(reservation)
+    try:
+        # Each session gets its own warm Stockfish; Gemini and TTS are shared with the pipeline
+        analyzer = await asyncio.to_thread(ChessAnalyzer, STOCKFISH_PATH, **ml_models.get("analyzer_options", {}))
+        try:
+            session = LiveGameSession(
+                analyzer,
+                pipeline.commentary_generator,
+                pipeline.voice_generator,
+                language_choice=language,
+                starting_fen=fen,
+                context_moves=LIVE_CONTEXT_MOVES
+            )
+        except ValueError as e:
+            await asyncio.to_thread(analyzer.close)
+            await websocket.close(code=1003, reason=f"Invalid FEN: {e}")
+            return
+        live_sessions[session.session_id] = session
+    finally:
+        live_pending.discard(reservation)
+
+    try:
+        await websocket.send_json({"type": "session", "session_id": session.session_id, "fen": session.board.fen()})
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except (ValueError, KeyError): # Invalid JSON, or a binary frame
+                message = None
+            if not isinstance(message, dict):
+                await websocket.send_json({"type": "error", "detail": LIVE_MESSAGE_FORMAT})
+                continue
+            move_text = message.get("move")
+            if not move_text:
+                await websocket.send_json({"type": "error", "detail": "Expected a 'move' field"})
+                continue
+
+            try:
+                result = await asyncio.to_thread(session.push_move, move_text)
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+
+            audio_path = result.pop('audio_path', None)
+            if audio_path:
+                result['audio_url'] = f"/audio/live/{os.path.basename(audio_path)}"
+            await websocket.send_json({"type": "move", **result})
+
+            if audio_path:
+                with open(audio_path, 'rb') as f:
+                    await websocket.send_bytes(f.read())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_sessions.pop(session.session_id, None)
+        await asyncio.to_thread(session.close)
@@ -0,0 +1,9 @@
+-- Columns the backend writes to the recordings table on top of the original schema.
+-- Run once in the Supabase SQL editor. Until then the backend saves recordings without them.
+
+alter table recordings add column if not exists timeline jsonb;   -- per-move audio offsets
+alter table recordings add column if not exists language text;    -- commentary language
+alter table recordings add column if not exists client_key text;  -- idempotency key of an upload job
+
+-- save_recordings upserts on client_key, which needs a unique constraint (NULLs stay allowed)
+create unique index if not exists recordings_client_key_key on recordings (client_key);
@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import asyncio
+import threading
+from typing import Optional
+
+from database import upload_audio_to_supabase, save_recordings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_path TEXT NOT NULL,
+    local_url TEXT NOT NULL,
+    audio_url TEXT,
+    user_id TEXT,
+    pgn TEXT,
+    white_player TEXT,
+    black_player TEXT,
+    timeline TEXT,
+    language TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    record_id TEXT,
+    client_key TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+class UploadOutbox:
+    """
+    Durable hand-off between finished commentary jobs and Supabase.
+
+    The endpoint records each finished job in a local SQLite table and responds right
+    away with the local audio URL. A background task then works through the table:
+      pending  -> audio uploaded to Storage (several at once)  -> uploaded
+      uploaded -> recordings rows upserted, one request per batch -> done
+    Jobs without a user_id are done once uploaded. Failed steps are retried with
+    jittered exponential backoff; after max_attempts the job is marked failed.
+    Both steps are idempotent: uploads overwrite the same object, and recordings are
+    upserted on a client_key generated per job, so a retry after a lost response never
+    duplicates a row. A failed batch is retried row by row, so one bad row can't hold
+    back (or fail) the rest.
+    Rows survive restarts, so jobs interrupted by a shutdown are picked up again.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 20, upload_concurrency: int = 4, max_attempts: int = 8,
+                 poll_seconds: float = 2.0, retention_hours: float = 24.0, base_backoff: float = 2.0, max_backoff: float = 300.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.upload_concurrency = upload_concurrency
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_hours * 3600
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        # Outboxes created before client keys existed
+        if "client_key" not in {column[1] for column in self._db.execute("PRAGMA table_info(outbox)")}:
+            self._db.execute("ALTER TABLE outbox ADD COLUMN client_key TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_client_key ON outbox (client_key)")
+        self._lock = threading.Lock()
+
+        self._wake = None
+        self._task = None
+        self.uploads = 0
+        self.upload_failures = 0
+        self.batches = 0
+        self.recordings_saved = 0
+        self.save_failures = 0
+
+    # --- Request path ---
+    def enqueue(self, file_path: str, local_url: str, user_id: Optional[str] = None, pgn: Optional[str] = None,
+                white_player: Optional[str] = None, black_player: Optional[str] = None,
+                timeline: Optional[dict] = None, language: Optional[str] = None) -> str:
+        """
+        Records a finished job (one local insert) and wakes the uploader.
+        Returns the job's client_key, a random id that is also what clients poll with,
+        so one user can't enumerate another's uploads.
+        """
+        now = time.time()
+        client_key = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO outbox (file_path, local_url, user_id, pgn, white_player, black_player, timeline, language, client_key, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_path, local_url, user_id, pgn, white_player, black_player,
+                 json.dumps(timeline) if timeline is not None else None, language, client_key, now, now)
+            )
+        if self._wake:
+            self._wake.set()
+        return client_key
+
+    def get(self, job_key: str) -> Optional[dict]:
+        """Returns the public state of the outbox job with this client_key, or None if it doesn't exist (or was pruned)."""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM outbox WHERE client_key = ?", (job_key,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["client_key"],
+            "status": row["status"],
+            "audio_url": row["audio_url"] or row["local_url"],
+            "uploaded": row["audio_url"] is not None,
+            "attempts": row["attempts"],
+            "last_error": row["last_error"],
+            "record_id": row["record_id"],
+        }
+
+    # --- Background worker ---
+    def start(self):
+        """Starts the background task on the running event loop."""
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        print(f"✅ Upload outbox ready ({self.stats()['pending']} pending jobs).")
+
+    async def stop(self):
+        """Stops the background task. Unfinished jobs stay in the outbox for the next start."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                worked = await self.process_once()
+            except Exception as e:
+                print(f"❌ Upload outbox error: {e}")
+                worked = False
+            if not worked:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def process_once(self) -> bool:
+        """Runs one upload round and one insert round. Returns True if any job was due."""
+        now = time.time()
+        pending = self._due("pending", now)
+        if pending:
+            slots = asyncio.Semaphore(self.upload_concurrency)
+            await asyncio.gather(*(self._upload(row, slots) for row in pending))
+
+        uploaded = self._due("uploaded", time.time())
+        if uploaded:
+            await self._save_batch(uploaded)
+
+        self._prune(now)
+        return bool(pending or uploaded)
+
+    def _due(self, status: str, now: float) -> list:
+        with self._lock:
+            return self._db.execute(
+                "SELECT * FROM outbox WHERE status = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (status, now, self.batch_size)
+            ).fetchall()
+
+    async def _upload(self, row, slots: asyncio.Semaphore):
+        async with slots:
+            if not os.path.exists(row["file_path"]):
+                self._fail([row], "Audio file no longer exists", permanent=True)
+                self.upload_failures += 1
+                return
+            try:
+                # upsert: a retry after a lost response must not fail on the already-stored object
+                audio_url = await asyncio.to_thread(
+                    upload_audio_to_supabase, row["file_path"], os.path.basename(row["file_path"]), True
+                )
+            except Exception as e:
+                self.upload_failures += 1
+                self._fail([row], f"Upload failed: {e}")
+                return
+        self.uploads += 1
+        status = "uploaded" if row["user_id"] else "done"
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET status = ?, audio_url = ?, attempts = 0, next_attempt_at = 0, last_error = NULL, updated_at = ? WHERE id = ?",
+                (status, audio_url, time.time(), row["id"])
+            )
+
+    @staticmethod
+    def _client_key(row) -> str:
+        """Idempotency key of a job's recordings row (rows queued before client keys existed get one from their id)."""
+        return row["client_key"] or f"outbox-{row['id']}-{row['created_at']}"
+
+    async def _save_batch(self, rows: list):
+        """Upserts the recordings of a batch in one request; if that fails, retries each row on its own."""
+        recordings = [{
+            "user_id": row["user_id"],
+            "pgn": row["pgn"],
+            "audio_url": row["audio_url"],
+            "white_player": row["white_player"],
+            "black_player": row["black_player"],
+            "timeline": json.loads(row["timeline"]) if row["timeline"] else None,
+            "language": row["language"],
+            "client_key": self._client_key(row),
+        } for row in rows]
+        try:
+            saved = await asyncio.to_thread(save_recordings, recordings)
+        except Exception as e:
+            self.save_failures += 1
+            if len(rows) == 1:
+                self._fail(rows, f"Saving recordings failed: {e}")
+                return
+            # One bad row fails the whole statement; find it without holding back the others
+            print(f"🔁 Batch of {len(rows)} recordings failed ({e}); saving them one by one.")
+            for row, recording in zip(rows, recordings):
+                try:
+                    saved = await asyncio.to_thread(save_recordings, [recording])
+                except Exception as row_error:
+                    self._fail([row], f"Saving recording failed: {row_error}")
+                    continue
+                self._mark_saved([row], saved)
+            return
+
+        self.batches += 1
+        self._mark_saved(rows, saved)
+
+    def _mark_saved(self, rows: list, saved: list):
+        by_key = {record.get("client_key"): record for record in saved}
+        self.recordings_saved += len(rows)
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                record_id = by_key.get(self._client_key(row), {}).get("id")
+                self._db.execute(
+                    "UPDATE outbox SET status = 'done', record_id = ?, attempts = 0, last_error = NULL, updated_at = ? WHERE id = ?",
+                    (str(record_id) if record_id is not None else None, now, row["id"])
+                )
+
+    def _fail(self, rows: list, error: str, permanent: bool = False):
+        """Schedules a retry with full-jitter backoff, or marks the job failed once it is out of attempts."""
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                attempts = row["attempts"] + 1
+                if permanent or attempts >= self.max_attempts:
+                    print(f"❌ Outbox job {row['id']} failed permanently: {error}")
+                    self._db.execute(
+                        "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                        (attempts, error, now, row["id"])
+                    )
+                else:
+                    delay = random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempts)))
+                    print(f"🔁 Outbox job {row['id']}: {error}. Retry {attempts}/{self.max_attempts - 1} in {delay:.1f}s.")
+                    self._db.execute(
+                        "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                        (attempts, now + delay, error, now, row["id"])
+                    )
+
+    def _prune(self, now: float):
+        """Deletes finished jobs older than the retention period (failed ones are kept for inspection)."""
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE status = 'done' AND updated_at < ?", (now - self.retention_seconds,))
+
+    def stats(self) -> dict:
+        """Returns job counts by status, the age of the oldest unfinished job and upload/insert counters."""
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = self._db.execute(
+                "SELECT MIN(created_at) FROM outbox WHERE status IN ('pending', 'uploaded')"
+            ).fetchone()[0]
+        return {
+            'pending': counts.get('pending', 0),
+            'uploaded': counts.get('uploaded', 0),
+            'done': counts.get('done', 0),
+            'failed': counts.get('failed', 0),
+            'oldest_pending_seconds': round(time.time() - oldest, 1) if oldest else 0.0,
+            'uploads': self.uploads,
+            'upload_failures': self.upload_failures,
+            'batches': self.batches,
+            'recordings_saved': self.recordings_saved,
+            'save_failures': self.save_failures,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
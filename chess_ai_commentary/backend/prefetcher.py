@@ -0,0 +1,189 @@
+import time
+import asyncio
+import hashlib
+import threading
+from collections import deque, OrderedDict
+from typing import Optional
+
+
+class GamePrefetcher:
+    """
+    Speculative background analysis of users' newest chess.com games.
+
+    When the dashboard fetches a user's archives, the newest month is looked up and the
+    newest `games_per_user` games are queued. A single background task works through
+    the queue, one game at a time, only after the job scheduler has been idle for
+    `idle_seconds`: each game is analyzed (and, with commentary_language, commented) through
+    ChessCommentaryPipeline.warm_caches, which fills the analysis store. A later
+    "narrate this game" request then reuses every ply instead of searching again.
+
+    Interactive jobs always win: as soon as one is queued or running the current game is
+    stopped before its next engine search and put back at the front of the queue. The
+    plies already analyzed stay in the store, so the retry resumes where it stopped.
+    """
+
+    def __init__(self, pipeline, scheduler, fetch_json, games_per_user: int = 3, max_queue: int = 50,
+                 commentary_language: Optional[str] = None, idle_seconds: float = 2.0, poll_seconds: float = 0.5,
+                 remember: int = 2000):
+        """fetch_json(path) returns the chess.com API response for a path like /player/{username}/games/2025/01."""
+        self.pipeline = pipeline
+        self.scheduler = scheduler
+        self.fetch_json = fetch_json
+        self.games_per_user = games_per_user
+        self.max_queue = max_queue
+        self.commentary_language = commentary_language
+        self.idle_seconds = idle_seconds
+        self.poll_seconds = poll_seconds
+        self.remember = remember
+
+        self._lookups = deque()       # (username, archive URLs) waiting for their newest games to be fetched
+        self._games = deque()         # (username, game key, pgn), oldest request first
+        self._warmed = OrderedDict()  # game key -> None, most recent last
+        self._preempt = threading.Event()
+        self._last_busy = 0.0
+        self._wake = None
+        self._task = None
+        self.warmed = 0
+        self.preempted = 0
+        self.failed = 0
+        self.dropped = 0
+
+    # --- Request path ---
+    def on_archives(self, username: str, archives: list):
+        """Queues a lookup of the user's newest games (called after their archive list was fetched)."""
+        username = username.lower()
+        if not archives or any(queued == username for queued, _ in self._lookups):
+            return
+        if self._queued_for(username) >= self.games_per_user:
+            return
+        if len(self._lookups) + len(self._games) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._lookups.append((username, list(archives)))
+        if self._wake:
+            self._wake.set()
+
+    def _queued_for(self, username: str) -> int:
+        return sum(1 for queued, _, _ in self._games if queued == username)
+
+    # --- Background worker ---
+    def start(self):
+        """Starts the background task on the running event loop."""
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        print(f"✅ Game prefetcher ready ({self.games_per_user} games per user"
+              f"{', with ' + self.commentary_language + ' commentary' if self.commentary_language else ''}).")
+
+    async def stop(self):
+        """Stops the background task; a game being analyzed stops before its next engine search."""
+        self._preempt.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                worked = await self.process_once()
+            except Exception as e:
+                print(f"❌ Prefetcher error: {e}")
+                worked = False
+            if not worked:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def process_once(self) -> bool:
+        """Does one lookup or warms one game if the server has been idle long enough. Returns True if it did."""
+        if self._lookups:
+            username, archives = self._lookups.popleft()
+            await self._queue_newest_games(username, archives)
+            return True
+        if not self._games or not self._idle():
+            return False
+
+        username, key, pgn = self._games[0]
+        self._preempt.clear()
+        work = asyncio.ensure_future(asyncio.to_thread(
+            self.pipeline.warm_caches, pgn, self.commentary_language, self._preempt.is_set
+        ))
+        # Watch the scheduler while the game is analyzed and stop it as soon as a real job arrives
+        while not work.done():
+            if not self.scheduler.is_idle():
+                self._preempt.set()
+            await asyncio.wait({work}, timeout=self.poll_seconds)
+
+        try:
+            completed = work.result()
+        except Exception as e:
+            print(f"⚠️ Prefetch of {username}'s game failed: {e}")
+            completed = False
+
+        if self._preempt.is_set():
+            self.preempted += 1
+            self._last_busy = time.monotonic()
+            print(f"⏸️ Prefetch of {username}'s game paused for an interactive job.")
+            return True
+
+        self._games.popleft()
+        self._remember(key)
+        if completed:
+            self.warmed += 1
+            print(f"🔮 Prefetched {username}'s game ({len(self._games)} left in queue).")
+        else:
+            self.failed += 1
+        return True
+
+    def _idle(self) -> bool:
+        """True once the scheduler has had nothing queued or running for idle_seconds."""
+        if not self.scheduler.is_idle():
+            self._last_busy = time.monotonic()
+            return False
+        return time.monotonic() - self._last_busy >= self.idle_seconds
+
+    async def _queue_newest_games(self, username: str, archives: list):
+        """Fetches the newest monthly archives until games_per_user new standard games are queued."""
+        wanted = self.games_per_user - self._queued_for(username)
+        for archive_url in reversed(archives[-2:]): # A new month may only have a game or two
+            if wanted <= 0:
+                return
+            if "/player/" not in archive_url:
+                continue
+            try:
+                month = await asyncio.to_thread(self.fetch_json, archive_url[archive_url.index("/player/"):])
+            except Exception as e:
+                print(f"⚠️ Prefetcher could not fetch {archive_url}: {e}")
+                return
+
+            games = [game for game in month.get("games", []) if game.get("pgn") and game.get("rules", "chess") == "chess"]
+            for game in sorted(games, key=lambda game: game.get("end_time", 0), reverse=True):
+                if wanted <= 0 or len(self._games) >= self.max_queue:
+                    return
+                key = game.get("url") or hashlib.sha1(game["pgn"].encode("utf-8")).hexdigest()
+                if key in self._warmed or any(queued_key == key for _, queued_key, _ in self._games):
+                    continue
+                self._games.append((username, key, game["pgn"]))
+                wanted -= 1
+
+    def _remember(self, key: str):
+        self._warmed[key] = None
+        self._warmed.move_to_end(key)
+        while len(self._warmed) > self.remember:
+            self._warmed.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            'queued_lookups': len(self._lookups),
+            'queued_games': len(self._games),
+            'warmed': self.warmed,
+            'preempted': self.preempted,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'commentary_language': self.commentary_language,
+        }
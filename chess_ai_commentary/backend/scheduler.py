@@ -0,0 +1,218 @@
+import re
+import time
+import asyncio
+import itertools
+from collections import deque
+from typing import Optional
+
+# Move-number markers ("12." / "12..."), results, and bracketed header/comment text
+_PGN_NOISE = re.compile(r"\[[^\]]*\]|\{[^}]*\}|\d+\.(\.\.)?|1-0|0-1|1/2-1/2|\*")
+
+
+def estimate_plies(pgn: str) -> int:
+    """Cheap ply count used as the job cost, without building a python-chess game tree."""
+    return max(1, len(_PGN_NOISE.sub(" ", pgn).split()))
+
+
+class SchedulerFull(Exception):
+    """Raised when a job cannot be admitted. Carries a queue position and wait estimate for the 429 response."""
+
+    def __init__(self, detail: str, queue_position: int, retry_after: float):
+        super().__init__(detail)
+        self.detail = detail
+        self.queue_position = queue_position
+        self.retry_after = retry_after
+
+
+class _Job:
+    __slots__ = ("user", "cost", "finish_tag", "seq", "fn", "args", "future", "enqueued_at", "cancel_token", "previous_finish", "timed")
+
+    def __init__(self, user, cost, finish_tag, seq, fn, args, future, cancel_token=None, previous_finish=0.0, timed=True):
+        self.user = user
+        self.cost = cost
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.cancel_token = cancel_token
+        self.previous_finish = previous_finish # The user's last finish tag before this job was admitted
+        self.timed = timed
+
+
+class JobScheduler:
+    """
+    Admission control and weighted fair queuing in front of the commentary pipeline.
+
+    Each job has a cost (its ply count). Jobs get a virtual finish tag of
+    max(virtual_time, user's last finish tag) + cost / user weight, and the job with the
+    smallest tag among users below their concurrency cap runs next. Users with many
+    queued games therefore take turns with everyone else, and short games get ahead
+    of long ones. When a user's queue or the global queue is full, submit() raises
+    SchedulerFull immediately instead of letting the request wait.
+
+    Jobs may carry a cancellation token (src.cancellation.CancellationToken). A job
+    cancelled while queued is dropped without running; a running one stops at its
+    next check. Either way the estimated work not done is counted as freed capacity.
+    """
+
+    def __init__(self, workers: int = 1, per_user_concurrency: int = 1, per_user_queue_limit: int = 3,
+                 max_queue: int = 20, user_weights: Optional[dict] = None, seconds_per_ply: float = 0.5):
+        """Creates the scheduler. seconds_per_ply seeds the wait estimate until real jobs have been timed."""
+        self.workers = workers
+        self.per_user_concurrency = per_user_concurrency
+        self.per_user_queue_limit = per_user_queue_limit
+        self.max_queue = max_queue
+        self.user_weights = user_weights or {}
+        self.seconds_per_ply = seconds_per_ply
+
+        self._queue = []
+        self._running = {}       # user -> running job count
+        self._last_finish = {}   # user -> finish tag of their last admitted job
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=500)
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.cancelled_queued = 0
+        self.cancel_reasons = {}
+        self.freed_seconds = 0.0
+
+    def _running_total(self) -> int:
+        return sum(self._running.values())
+
+    def _queued_for(self, user: str) -> int:
+        return sum(1 for job in self._queue if job.user == user)
+
+    def is_idle(self) -> bool:
+        """True when no job is running or queued (background work may use the pipeline)."""
+        return not self._queue and not self._running_total()
+
+    def _estimate(self, finish_tag: float):
+        """Returns (queue position, estimated wait in seconds) for a job with this finish tag."""
+        ahead = [job for job in self._queue if job.finish_tag <= finish_tag]
+        position = len(ahead) + 1
+        work_ahead = sum(job.cost for job in ahead) * self.seconds_per_ply
+        return position, work_ahead / max(1, self.workers)
+
+    async def submit(self, user: str, cost: int, fn, *args, cancel_token=None, timed: bool = True):
+        """
+        Queues fn(*args) to run in a worker thread and waits for its result.
+        If cancel_token is cancelled before the job starts, it is dropped and the token's JobCancelled is raised.
+        timed=False keeps the job's run time out of the seconds_per_ply estimate (for non-commentary work such as video renders).
+        """
+        weight = self.user_weights.get(user, 1.0)
+        finish_tag = max(self._virtual_time, self._last_finish.get(user, 0.0)) + cost / weight
+
+        user_load = self._queued_for(user) + self._running.get(user, 0)
+        if user_load >= self.per_user_concurrency + self.per_user_queue_limit:
+            position, wait = self._estimate(finish_tag)
+            self.rejected += 1
+            raise SchedulerFull("Too many jobs queued for this user", position, wait)
+        if len(self._queue) >= self.max_queue:
+            position, wait = self._estimate(finish_tag)
+            self.rejected += 1
+            raise SchedulerFull("Server is at capacity", position, wait)
+
+        previous_finish = self._last_finish.get(user, 0.0)
+        self._last_finish[user] = finish_tag
+        position, wait = self._estimate(finish_tag)
+        loop = asyncio.get_running_loop()
+        job = _Job(user, cost, finish_tag, next(self._seq), fn, args, loop.create_future(), cancel_token, previous_finish, timed)
+        self._queue.append(job)
+        if cancel_token is not None:
+            # cancel() may be called from a worker thread (a deadline noticed mid-run)
+            cancel_token.add_callback(lambda token: loop.call_soon_threadsafe(self._drop_if_queued, job))
+        print(f"📥 Job queued for {user} ({cost} plies), position {position}, ~{wait:.0f}s wait.")
+        self._dispatch()
+        return await job.future
+
+    def _record_cancel(self, job: _Job, freed_seconds: float, queued: bool):
+        self.cancelled += 1
+        self.cancelled_queued += queued
+        reason = job.cancel_token.reason or "cancelled"
+        self.cancel_reasons[reason] = self.cancel_reasons.get(reason, 0) + 1
+        self.freed_seconds += max(0.0, freed_seconds)
+
+    def _refund(self, job: _Job):
+        """Gives back the virtual time a job that never ran was charged, so its user isn't penalised for it."""
+        charge = job.cost / self.user_weights.get(job.user, 1.0)
+        for queued in self._queue:
+            if queued.user == job.user and queued.seq > job.seq:
+                queued.finish_tag -= charge # Later jobs of the user were stacked on top of this one
+        self._last_finish[job.user] = max(job.previous_finish, self._last_finish[job.user] - charge)
+
+    def _drop_if_queued(self, job: _Job):
+        """Removes a cancelled job that hasn't started yet and fails its request with JobCancelled."""
+        if job not in self._queue:
+            return
+        self._queue.remove(job)
+        self._refund(job)
+        self._record_cancel(job, job.cost * self.seconds_per_ply, queued=True)
+        if not job.future.done():
+            job.future.set_exception(job.cancel_token.exception())
+        print(f"🛑 Queued job for {job.user} cancelled ({job.cancel_token.reason}).")
+
+    def _dispatch(self):
+        """Starts the eligible jobs with the smallest finish tags while workers are free."""
+        # Deadlines pass without anyone calling cancel(), so look for expired tokens too
+        for job in [job for job in self._queue if job.cancel_token is not None and job.cancel_token.cancelled]:
+            self._drop_if_queued(job)
+        while self._queue and self._running_total() < self.workers:
+            eligible = [job for job in self._queue if self._running.get(job.user, 0) < self.per_user_concurrency]
+            if not eligible:
+                return
+            job = min(eligible, key=lambda j: (j.finish_tag, j.seq))
+            self._queue.remove(job)
+            self._virtual_time = max(self._virtual_time, job.finish_tag - job.cost / self.user_weights.get(job.user, 1.0))
+            self._running[job.user] = self._running.get(job.user, 0) + 1
+            self._waits.append(time.monotonic() - job.enqueued_at)
+            asyncio.get_running_loop().create_task(self._run(job))
+
+    async def _run(self, job: _Job):
+        started = time.monotonic()
+        try:
+            result = await asyncio.to_thread(job.fn, *job.args)
+            if not job.future.done():
+                job.future.set_result(result)
+            self.completed += 1
+            # Smooth the per-ply cost so queue-position estimates track real throughput
+            if job.timed:
+                elapsed = time.monotonic() - started
+                self.seconds_per_ply = 0.8 * self.seconds_per_ply + 0.2 * (elapsed / max(1, job.cost))
+        except Exception as e:
+            if job.cancel_token is not None and job.cancel_token.cancelled:
+                self._record_cancel(job, job.cost * self.seconds_per_ply - (time.monotonic() - started), queued=False)
+            else:
+                self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._running[job.user] -= 1
+            if not self._running[job.user]:
+                del self._running[job.user]
+            self._dispatch()
+
+    def stats(self) -> dict:
+        """Returns queue depth, per-user load and queue wait percentiles."""
+        waits = sorted(self._waits)
+        percentile = lambda p: round(waits[min(len(waits) - 1, int(p * len(waits)))], 2) if waits else 0.0
+        return {
+            'queued': len(self._queue),
+            'running': self._running_total(),
+            'workers': self.workers,
+            'running_by_user': dict(self._running),
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'cancelled': self.cancelled,
+            'cancelled_while_queued': self.cancelled_queued,
+            'cancel_reasons': dict(self.cancel_reasons),
+            'freed_seconds': round(self.freed_seconds, 1),
+            'seconds_per_ply': round(self.seconds_per_ply, 3),
+            'queue_wait_p50': percentile(0.50),
+            'queue_wait_p95': percentile(0.95),
+        }
@@ -0,0 +1,126 @@
+"""
+Compares PGN ingestion speed: chess.pgn game trees (the old analyze_game path) vs src.pgn_fast.
+Only parsing and move replay are timed; no engine is involved.
+
+Usage (from the chess_ai_commentary folder):
+    python benchmarks/bench_pgn_ingest.py                  # replicates input/pgn_files to 5000 games
+    python benchmarks/bench_pgn_ingest.py games.pgn        # any multi-game PGN file
+    python benchmarks/bench_pgn_ingest.py --games 20000
+"""
+import os
+import io
+import re
+import sys
+import time
+import glob
+import argparse
+import chess.pgn
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import pgn_fast
+
+# Hand-written movetext that chess.com exports never contain: missing check/mate suffixes,
+# over-disambiguated moves, castling with zeros and promotions without "="
+NON_CANONICAL_GAMES = [
+    '[Event "Missing mate suffix"]\n\n1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7 1-0',
+    '[Event "Missing check suffix, over-disambiguation"]\n\n1. Ng1f3 d5 2. e4 dxe4 3. Bb5 c6 4. 0-0 cxb5 *',
+    '[Event "Promotion without ="]\n[SetUp "1"]\n[FEN "8/4P3/8/8/8/8/k7/4K3 w - - 0 1"]\n\n1. e8Q Ka1 2. Qa4 *',
+]
+
+def build_corpus(num_games: int) -> str:
+    """Repeats the sample games until the corpus has num_games games."""
+    sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "input", "pgn_files")
+    samples = []
+    for path in sorted(glob.glob(os.path.join(sample_dir, "*.pgn"))):
+        with open(path, "r", encoding="utf-8") as f:
+            samples.extend(_split_raw(f.read()))
+    if not samples:
+        raise SystemExit(f"No sample games found in {sample_dir}")
+    return "\n\n".join(samples[i % len(samples)] for i in range(num_games)) + "\n"
+
+def _split_raw(text: str):
+    """Splits a PGN file into raw game strings."""
+    offsets = [m.start() for m in re.finditer(r"(?m)^\[Event ", text)] or [0]
+    for start, end in zip(offsets, offsets[1:] + [len(text)]):
+        yield text[start:end].strip()
+
+def ingest_tree(text: str):
+    """The previous analyze_game path: read_game, then board.san() and board.fen() on every mainline ply."""
+    stream = io.StringIO(text)
+    games = plies = 0
+    while True:
+        game = chess.pgn.read_game(stream)
+        if game is None:
+            break
+        board = game.board()
+        sans, ucis, fens = [], [], []
+        for move in game.mainline_moves():
+            sans.append(board.san(move))
+            ucis.append(move.uci())
+            board.push(move)
+            fens.append(board.fen())
+        games += 1
+        plies += len(fens)
+    return games, plies
+
+def ingest_fast(text: str):
+    games = plies = 0
+    for mainline in pgn_fast.iter_mainlines(text):
+        games += 1
+        plies += len(mainline['fen'])
+    return games, plies
+
+def run(name, fn, text, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        games, plies = fn(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<22} {games:>7} games {plies:>9} plies {best:>8.2f}s {games / best:>9.0f} games/s {plies / best:>10.0f} plies/s")
+    return best, games, plies
+
+def check_equivalent(text: str, limit: int = 200):
+    """
+    Makes sure both paths produce identical SAN/UCI/FEN for the first games of the corpus,
+    and for NON_CANONICAL_GAMES (SAN must come out as board.san() writes it, not as typed).
+    """
+    text = "\n\n".join(NON_CANONICAL_GAMES) + "\n\n" + text
+    limit += len(NON_CANONICAL_GAMES)
+    stream = io.StringIO(text)
+    for i, mainline in enumerate(pgn_fast.iter_mainlines(text)):
+        if i >= limit:
+            break
+        game = chess.pgn.read_game(stream)
+        board = game.board()
+        moves = list(game.mainline_moves())
+        assert len(mainline['san']) == len(moves), f"game {i} has {len(mainline['san'])} plies instead of {len(moves)}"
+        for j, move in enumerate(moves):
+            san = board.san(move)
+            board.push(move)
+            assert (mainline['san'][j], mainline['uci'][j], mainline['fen'][j]) == (san, move.uci(), board.fen()), f"game {i}, ply {j + 1} differs"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PGN mainline ingestion.")
+    parser.add_argument("pgn_file", nargs="?", help="Multi-game PGN file (default: replicated sample games)")
+    parser.add_argument("--games", type=int, default=5000, help="Corpus size when no file is given")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per path (best time is reported)")
+    args = parser.parse_args()
+
+    if args.pgn_file:
+        with open(args.pgn_file, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+    else:
+        text = build_corpus(args.games)
+    print(f"📄 Corpus: {len(text) / 1e6:.1f} MB")
+
+    check_equivalent(text)
+    print("✅ Fast path output matches chess.pgn on the first games.")
+
+    tree_time, _, _ = run("chess.pgn (game tree)", ingest_tree, text, args.repeat)
+    fast_time, _, _ = run("pgn_fast (mainline)", ingest_fast, text, args.repeat)
+    print(f"🚀 Speedup: {tree_time / fast_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
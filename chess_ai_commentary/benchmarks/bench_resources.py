@@ -0,0 +1,135 @@
+"""
+Compares throughput of Stockfish analysis and torch inference running at the same time (as they do
+when one job is analyzed while another is synthesized), with default settings vs the resource
+plan from src/resources.py.
+
+    default    Stockfish python-library defaults (Threads=1, Hash=16) and torch's default thread
+               count (every core), so torch alone can oversubscribe the machine
+    autotuned  Threads/Hash and torch intra-op threads from plan_resources()
+
+The torch side is a GPT-2-sized stack of linear layers (the part of XTTS that dominates CPU time),
+so the benchmark runs without the XTTS model. Both workloads run for --duration seconds per mode.
+
+Usage (from the chess_ai_commentary folder):
+    python benchmarks/bench_resources.py
+    python benchmarks/bench_resources.py --duration 30 --depth 18 --stockfish engines/stockfish/stockfish
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import threading
+import torch
+import chess.pgn
+from stockfish import Stockfish
+
+# Add the project root to the Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+from src.config import STOCKFISH_PATH
+from src.resources import detect_resources, plan_resources, engine_parameters
+
+HIDDEN = 1024
+LAYERS = 8
+TOKENS = 32
+
+
+def sample_positions() -> list:
+    """Every position of the games in input/pgn_files, cycled through by the engine thread."""
+    fens = []
+    for path in sorted(glob.glob(os.path.join(PROJECT_ROOT, "input", "pgn_files", "*.pgn"))):
+        with open(path, encoding="utf-8") as f:
+            game = chess.pgn.read_game(f)
+        if game is None:
+            continue
+        board = game.board()
+        for move in game.mainline_moves():
+            board.push(move)
+            fens.append(board.fen())
+    return fens
+
+
+def engine_worker(stockfish_path: str, parameters: dict, depth: int, fens: list, stop: threading.Event, result: dict):
+    engine = Stockfish(path=stockfish_path, parameters=parameters)
+    positions = 0
+    while not stop.is_set():
+        engine.set_fen_position(fens[positions % len(fens)])
+        engine.set_depth(depth)
+        engine.get_evaluation()
+        positions += 1
+    result['positions'] = positions
+    engine.send_quit_command()
+
+
+def torch_worker(stop: threading.Event, result: dict):
+    model = torch.nn.Sequential(*[torch.nn.Linear(HIDDEN, HIDDEN) for _ in range(LAYERS)]).eval()
+    inputs = torch.randn(TOKENS, HIDDEN)
+    steps = 0
+    with torch.inference_mode():
+        while not stop.is_set():
+            model(inputs)
+            steps += 1
+    result['steps'] = steps
+
+
+def run_mode(name: str, stockfish_path: str, parameters: dict, torch_threads: int, depth: int, fens: list, duration: float) -> dict:
+    torch.set_num_threads(torch_threads)
+    stop = threading.Event()
+    engine_result, torch_result = {}, {}
+    threads = [
+        threading.Thread(target=engine_worker, args=(stockfish_path, parameters, depth, fens, stop, engine_result)),
+        threading.Thread(target=torch_worker, args=(stop, torch_result)),
+    ]
+    print(f"🔄 {name}: Stockfish {parameters or 'defaults'}, torch {torch_threads} threads, {duration:.0f}s...")
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'mode': name,
+        'positions_per_second': engine_result.get('positions', 0) / elapsed,
+        'torch_steps_per_second': torch_result.get('steps', 0) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stockfish + torch throughput with default vs autotuned resources.")
+    parser.add_argument("--stockfish", default=STOCKFISH_PATH)
+    parser.add_argument("--depth", type=int, default=15, help="Search depth per position (game analysis uses 15)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per mode")
+    parser.add_argument("--processes", type=int, default=1, help="Server processes sharing the machine")
+    args = parser.parse_args()
+
+    if not args.stockfish or not os.path.exists(args.stockfish):
+        raise SystemExit(f"❌ Stockfish not found at {args.stockfish}")
+
+    detected = detect_resources()
+    plan = plan_resources(detected, processes=args.processes)
+    print(f"🧮 Detected: {detected}")
+    print(f"🧮 Plan: {plan}\n")
+
+    fens = sample_positions()
+    default_threads = torch.get_num_threads()
+    rows = [
+        run_mode("default", args.stockfish, {}, default_threads, args.depth, fens, args.duration),
+        run_mode("autotuned", args.stockfish, engine_parameters(plan),
+                 plan['torch_threads'], args.depth, fens, args.duration),
+    ]
+
+    print("\n" + "=" * 60)
+    print(f"{'mode':<10} {'positions/s':>12} {'torch steps/s':>14}")
+    for row in rows:
+        print(f"{row['mode']:<10} {row['positions_per_second']:>12.2f} {row['torch_steps_per_second']:>14.2f}")
+    default, tuned = rows
+    if default['positions_per_second'] and default['torch_steps_per_second']:
+        print(f"📈 Autotuned vs default: Stockfish {tuned['positions_per_second'] / default['positions_per_second']:.2f}x, "
+              f"torch {tuned['torch_steps_per_second'] / default['torch_steps_per_second']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Measures XTTS real-time factor (synthesis time / audio duration) on CPU, before and after
+src.utils.optimize_tts_for_cpu, and runs a basic quality check of the fast output against the baseline.
+
+XTTS samples its output, so the two runs never produce identical waveforms (and int8 weights change
+them further). The check therefore compares coarse properties per sentence: duration, loudness,
+the long-term average spectrum, and that the audio has no NaNs, clipping or silence.
+
+Usage (from the chess_ai_commentary folder):
+    python benchmarks/bench_tts_cpu.py
+    python benchmarks/bench_tts_cpu.py --threads 4 --compile --speaker models/voice_samples/default_voice.wav
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import torch
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.config import TTS_MODEL_NAME
+from src.utils import initialize_tts_model, optimize_tts_for_cpu, DEFAULT_VOICE_PATH
+
+SENTENCES = [
+    "White opens with the king's pawn, claiming the center right away.",
+    "Black answers symmetrically, and the knights come out next.",
+    "A brilliant sacrifice! The bishop takes on f7 and the black king is exposed.",
+    "That was an inaccuracy; the engine preferred castling to bring the rook into play.",
+    "Checkmate. A beautiful finish to a sharp attacking game.",
+]
+
+# Quality thresholds (fast vs baseline, per sentence)
+MAX_DURATION_RATIO = 1.5
+MAX_LOUDNESS_DIFF_DB = 6.0
+MAX_SPECTRUM_DISTANCE_DB = 4.0
+
+def synthesize_all(tts, speaker_wav, language, seed=0):
+    """Synthesizes every sentence once. Returns (waveforms, total seconds spent)."""
+    waves, elapsed = [], 0.0
+    for i, sentence in enumerate(SENTENCES):
+        torch.manual_seed(seed + i)
+        started = time.perf_counter()
+        wav = tts.tts(text=sentence, speaker_wav=speaker_wav, language=language, split_sentences=False)
+        elapsed += time.perf_counter() - started
+        waves.append(np.asarray(wav, dtype=np.float32))
+    return waves, elapsed
+
+def loudness_db(wav):
+    return 20 * np.log10(np.sqrt(np.mean(wav ** 2)) + 1e-9)
+
+def average_spectrum_db(wav, n_fft=1024, hop=256):
+    """Long-term average magnitude spectrum in dB (a voice-timbre fingerprint that ignores timing)."""
+    if len(wav) < n_fft:
+        wav = np.pad(wav, (0, n_fft - len(wav)))
+    frames = np.lib.stride_tricks.sliding_window_view(wav, n_fft)[::hop] * np.hanning(n_fft)
+    spectrum = np.abs(np.fft.rfft(frames, axis=1)).mean(axis=0)
+    spectrum_db = 20 * np.log10(spectrum + 1e-9)
+    return spectrum_db - spectrum_db.max()
+
+def quality_report(baseline, fast):
+    """Compares fast vs baseline waveforms sentence by sentence. Returns (rows, passed)."""
+    rows, passed = [], True
+    for i, (ref, out) in enumerate(zip(baseline, fast)):
+        issues = []
+        if not np.all(np.isfinite(out)):
+            issues.append("non-finite samples")
+        if np.mean(np.abs(out) >= 0.999) > 0.001:
+            issues.append("clipping")
+        if np.max(np.abs(out)) < 0.01:
+            issues.append("silent")
+        duration_ratio = max(len(out), 1) / max(len(ref), 1)
+        if not (1 / MAX_DURATION_RATIO <= duration_ratio <= MAX_DURATION_RATIO):
+            issues.append("duration")
+        loudness_diff = abs(loudness_db(out) - loudness_db(ref))
+        if loudness_diff > MAX_LOUDNESS_DIFF_DB:
+            issues.append("loudness")
+        spectrum_distance = float(np.sqrt(np.mean((average_spectrum_db(out) - average_spectrum_db(ref)) ** 2)))
+        if spectrum_distance > MAX_SPECTRUM_DISTANCE_DB:
+            issues.append("spectrum")
+        passed = passed and not issues
+        rows.append((i + 1, duration_ratio, loudness_diff, spectrum_distance, ", ".join(issues) or "ok"))
+    return rows, passed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark XTTS fast CPU mode.")
+    parser.add_argument("--model", default=TTS_MODEL_NAME)
+    parser.add_argument("--speaker", default=DEFAULT_VOICE_PATH)
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads for fast mode (0 = PyTorch default)")
+    parser.add_argument("--interop-threads", type=int, default=1)
+    parser.add_argument("--no-quantize", action="store_true")
+    parser.add_argument("--compile", action="store_true")
+    args = parser.parse_args()
+
+    tts = initialize_tts_model(model_name=args.model, device="cpu", fast_cpu=False)
+    if tts is None:
+        raise SystemExit("❌ Could not load the TTS model.")
+    sample_rate = tts.synthesizer.output_sample_rate
+
+    print("\n🔥 Warming up...")
+    tts.tts(text="Warm up.", speaker_wav=args.speaker, language=args.language, split_sentences=False)
+
+    print("⏱️ Baseline run...")
+    baseline, baseline_time = synthesize_all(tts, args.speaker, args.language)
+    baseline_audio = sum(len(w) for w in baseline) / sample_rate
+
+    optimize_tts_for_cpu(tts, intra_op_threads=args.threads, inter_op_threads=args.interop_threads,
+                         quantize=not args.no_quantize, compile_model=args.compile)
+    tts.tts(text="Warm up.", speaker_wav=args.speaker, language=args.language, split_sentences=False)
+
+    print("⏱️ Fast CPU run...")
+    fast, fast_time = synthesize_all(tts, args.speaker, args.language)
+    fast_audio = sum(len(w) for w in fast) / sample_rate
+
+    baseline_rtf = baseline_time / baseline_audio
+    fast_rtf = fast_time / fast_audio
+    print("\n" + "=" * 60)
+    print(f"{'mode':<10} {'synth (s)':>10} {'audio (s)':>10} {'RTF':>8}")
+    print(f"{'baseline':<10} {baseline_time:>10.2f} {baseline_audio:>10.2f} {baseline_rtf:>8.3f}")
+    print(f"{'fast':<10} {fast_time:>10.2f} {fast_audio:>10.2f} {fast_rtf:>8.3f}")
+    print(f"🚀 Speedup (RTF): {baseline_rtf / fast_rtf:.2f}x")
+
+    rows, passed = quality_report(baseline, fast)
+    print("\n" + f"{'sentence':<9} {'dur ratio':>10} {'Δ loud dB':>10} {'spec dB':>8}  result")
+    for row in rows:
+        print(f"{row[0]:<9} {row[1]:>10.2f} {row[2]:>10.2f} {row[3]:>8.2f}  {row[4]}")
+    print("✅ Quality check passed." if passed else "❌ Quality check failed; listen to the output before enabling fast mode.")
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
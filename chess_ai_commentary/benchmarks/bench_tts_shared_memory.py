@@ -0,0 +1,132 @@
+"""
+Measures per-process memory of N worker processes that each load XTTS, with private weights
+(the normal TTS() load) vs memory-mapped shared weights (src/tts_shared.py).
+
+Every worker loads the model, synthesizes one sentence (so activations are counted too), and
+reports its memory while all workers are still alive:
+    RSS  resident memory, counting shared pages in full
+    PSS  shared pages divided among the processes that map them (sums to real usage)
+    USS  private memory only (what each extra worker really costs)
+Linux only (reads /proc/self/smaps_rollup).
+
+Usage (from the chess_ai_commentary folder):
+    python benchmarks/bench_tts_shared_memory.py --workers 3
+    python benchmarks/bench_tts_shared_memory.py --workers 4 --modes shared --threads 2
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing as mp
+
+# Add the project root to the Python path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+SENTENCE = "White castles early and the rook comes to the center."
+
+
+def process_memory_mb() -> dict:
+    """RSS / PSS / USS of the current process in MB, from /proc/self/smaps_rollup."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        'rss': round(fields.get('Rss', 0)),
+        'pss': round(fields.get('Pss', 0)),
+        'uss': round(fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)),
+    }
+
+
+def worker(mode: str, threads: int, speaker: str, results, done):
+    """Loads the model in one mode, synthesizes a sentence and reports memory until told to exit."""
+    os.chdir(os.path.join(PROJECT_ROOT, "backend")) # TTS_MODEL_NAME is relative to backend/
+    import torch
+    from src.utils import initialize_tts_model
+    torch.set_num_threads(threads)
+
+    started = time.perf_counter()
+    tts = initialize_tts_model(fast_cpu=False, shared_weights=(mode == "shared"))
+    if tts is None:
+        results.put((mode, os.getpid(), None))
+        return
+    load_seconds = time.perf_counter() - started
+    loaded = process_memory_mb()
+
+    started = time.perf_counter()
+    tts.tts(text=SENTENCE, speaker_wav=speaker, language="en", split_sentences=False)
+    synth_seconds = time.perf_counter() - started
+
+    results.put((mode, os.getpid(), {
+        'load_seconds': round(load_seconds, 1),
+        'synth_seconds': round(synth_seconds, 1),
+        'loaded': loaded,
+        'after_synthesis': process_memory_mb(),
+    }))
+    done.wait() # Stay alive so every worker's pages are mapped while the others measure
+
+
+def run_mode(mode: str, workers: int, threads: int, speaker: str) -> list:
+    context = mp.get_context("spawn") # Like uvicorn --workers: fresh interpreters, nothing inherited
+    results, done = context.Queue(), context.Event()
+    processes = [context.Process(target=worker, args=(mode, threads, speaker, results, done)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    done.set()
+    for process in processes:
+        process.join()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory of private vs memory-mapped shared XTTS weights.")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--modes", default="private,shared", help="Comma-separated: private, shared")
+    parser.add_argument("--threads", type=int, default=1, help="torch threads per worker")
+    parser.add_argument("--speaker", default=os.path.join(PROJECT_ROOT, "backend", "default_voice.wav"))
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        raise SystemExit("This benchmark reads /proc/self/smaps_rollup and only runs on Linux.")
+
+    if "shared" in args.modes:
+        # Export once up front so the workers don't all race to create the file
+        os.chdir(os.path.join(PROJECT_ROOT, "backend"))
+        from src.tts_shared import shared_weights_path, export_shared_weights
+        if not os.path.exists(shared_weights_path()):
+            export_shared_weights()
+
+    summary = {}
+    for mode in args.modes.split(","):
+        print(f"\n🔄 {args.workers} workers, {mode} weights...")
+        reports = run_mode(mode, args.workers, args.threads, args.speaker)
+        print(f"{'pid':>8} {'load s':>7} {'synth s':>8} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8}")
+        for _, pid, report in reports:
+            if report is None:
+                print(f"{pid:>8}  model failed to load")
+                continue
+            memory = report['after_synthesis']
+            print(f"{pid:>8} {report['load_seconds']:>7} {report['synth_seconds']:>8} {memory['rss']:>8} {memory['pss']:>8} {memory['uss']:>8}")
+        loaded = [report for _, _, report in reports if report]
+        if loaded:
+            summary[mode] = {
+                'total_pss': sum(r['after_synthesis']['pss'] for r in loaded),
+                'avg_uss': sum(r['after_synthesis']['uss'] for r in loaded) / len(loaded),
+            }
+
+    print("\n=== Summary ===")
+    for mode, values in summary.items():
+        print(f"{mode:>8}: {values['total_pss']:.0f} MB total (PSS) for {args.workers} workers, "
+              f"{values['avg_uss']:.0f} MB private per worker")
+    if "private" in summary and "shared" in summary:
+        saved = summary['private']['total_pss'] - summary['shared']['total_pss']
+        print(f"📉 Shared weights save {saved:.0f} MB across {args.workers} workers "
+              f"({saved / max(1, summary['private']['total_pss']):.0%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Closed-loop load test of the backend API with a mix of commentary generation,
+recordings listing and chess.com archive browsing.
+
+Each concurrency level runs that many simulated clients for --duration seconds; every
+client sends its next request as soon as the previous one finishes. The report shows
+throughput and latency percentiles per endpoint and level, and the level where
+throughput stops growing (saturation).
+
+Run the backend against the local fakes so no external service or quota is involved:
+    python mocks/run_fakes.py                              # prints the variables to export
+    (cd backend && uvicorn main:app)                       # with those variables exported
+    python benchmarks/load_test.py --levels 1,2,4,8,16 --duration 60
+    python benchmarks/load_test.py --mix generate=1,recordings=4,archives=2,month=2 --plies 20 --json results.json
+"""
+import os
+import csv
+import json
+import glob
+import time
+import random
+import argparse
+import threading
+import requests
+import chess.pgn
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Throughput gains below this fraction between levels mean the server is saturated
+SATURATION_GAIN = 0.10
+
+
+def load_sample_pgns(plies: int) -> list:
+    """Sample games from input/pgn_files, cut to the first `plies` half-moves to keep jobs short."""
+    pgns = []
+    for path in sorted(glob.glob(os.path.join(PROJECT_ROOT, "input", "pgn_files", "*.pgn"))):
+        with open(path, encoding="utf-8") as f:
+            game = chess.pgn.read_game(f)
+        if game is None:
+            continue
+        if plies:
+            short = chess.pgn.Game(headers=game.headers)
+            node = short
+            for move in list(game.mainline_moves())[:plies]:
+                node = node.add_variation(move)
+            game = short
+        pgns.append(str(game))
+    if not pgns:
+        raise SystemExit("No sample games found in input/pgn_files")
+    return pgns
+
+
+def parse_mix(text: str) -> dict:
+    """'generate=1,recordings=4' -> {'generate': 1.0, 'recordings': 4.0}"""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in REQUESTS:
+            raise SystemExit(f"Unknown request type '{name}'. Choose from: {', '.join(REQUESTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# --- Request types: each returns (method, path, json body or None) ---
+def _generate(client):
+    return "POST", "/api/v1/generate-commentary", {
+        "pgn": random.choice(client.pgns), "language": "English", "user_id": client.user_id,
+        "player_white": "white", "player_black": "black",
+    }
+
+def _recordings(client):
+    return "GET", f"/api/v1/recordings/{client.user_id}", None
+
+def _archives(client):
+    return "GET", f"/api/v1/games/archives/{client.username}", None
+
+def _month(client):
+    return "GET", f"/api/v1/games/by-month/{client.username}/2025/{random.randint(1, 12):02d}", None
+
+REQUESTS = {"generate": _generate, "recordings": _recordings, "archives": _archives, "month": _month}
+
+
+class Results:
+    """Latencies and outcomes per request type, shared by the client threads of one level."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.outcomes = {}
+
+    def record(self, name: str, seconds: float, outcome: str):
+        with self.lock:
+            if outcome == "ok":
+                self.latencies.setdefault(name, []).append(seconds)
+            counts = self.outcomes.setdefault(name, {"ok": 0, "rejected": 0, "errors": 0})
+            counts[outcome] += 1
+
+
+class Client(threading.Thread):
+    """One simulated user sending requests back to back until the stop event is set."""
+
+    def __init__(self, index: int, base_url: str, mix: dict, pgns: list, results: Results, stop: threading.Event, timeout: float):
+        super().__init__(daemon=True)
+        self.user_id = f"loadtest-user-{index}"
+        self.username = f"player{index}"
+        self.base_url = base_url
+        self.names, self.weights = list(mix), list(mix.values())
+        self.pgns = pgns
+        self.results = results
+        self.stop = stop
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def run(self):
+        while not self.stop.is_set():
+            name = random.choices(self.names, self.weights)[0]
+            method, path, body = REQUESTS[name](self)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, self.base_url + path, json=body, timeout=self.timeout)
+                if response.status_code in (429, 503):
+                    outcome = "rejected" # Admission control (queue full / too busy), not a failure
+                elif response.ok:
+                    payload = response.json()
+                    # The chess.com proxy endpoints report upstream failures as {"error": ...} with a 200
+                    outcome = "errors" if isinstance(payload, dict) and "error" in payload else "ok"
+                else:
+                    outcome = "errors"
+            except (requests.RequestException, ValueError):
+                outcome = "errors"
+            elapsed = time.perf_counter() - started
+            if not self.stop.is_set() or outcome == "ok":
+                self.results.record(name, elapsed, outcome)
+            if outcome == "rejected":
+                time.sleep(min(1.0, elapsed + 0.1)) # Back off a little, as the frontend would
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def run_level(base_url: str, concurrency: int, duration: float, mix: dict, pgns: list, timeout: float) -> list:
+    """Runs one concurrency level and returns a row per request type (plus an 'all' row)."""
+    results, stop = Results(), threading.Event()
+    clients = [Client(i, base_url, mix, pgns, results, stop, timeout) for i in range(concurrency)]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    time.sleep(duration)
+    stop.set()
+    for client in clients:
+        client.join(timeout)
+    elapsed = time.perf_counter() - started
+
+    rows = []
+    everything = []
+    for name in list(mix) + ["all"]:
+        if name == "all":
+            latencies = everything
+            counts = {key: sum(c[key] for c in results.outcomes.values()) for key in ("ok", "rejected", "errors")}
+        else:
+            latencies = results.latencies.get(name, [])
+            counts = results.outcomes.get(name, {"ok": 0, "rejected": 0, "errors": 0})
+            everything.extend(latencies)
+        rows.append({
+            "concurrency": concurrency, "endpoint": name, **counts,
+            "throughput_rps": round(counts["ok"] / elapsed, 3),
+            "p50_ms": round(1000 * percentile(latencies, 0.50), 1),
+            "p95_ms": round(1000 * percentile(latencies, 0.95), 1),
+            "p99_ms": round(1000 * percentile(latencies, 0.99), 1),
+        })
+    return rows
+
+
+def find_saturation(rows: list):
+    """The first level whose overall throughput grew less than SATURATION_GAIN over the previous level."""
+    totals = [row for row in rows if row["endpoint"] == "all"]
+    for previous, current in zip(totals, totals[1:]):
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 + SATURATION_GAIN):
+            return previous
+    return None
+
+
+def print_table(rows: list):
+    print(f"{'conc':>5} {'endpoint':<11} {'ok':>6} {'rej':>5} {'err':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for row in rows:
+        print(f"{row['concurrency']:>5} {row['endpoint']:<11} {row['ok']:>6} {row['rejected']:>5} {row['errors']:>5} "
+              f"{row['throughput_rps']:>8.2f} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Closed-loop load test of the commentary backend.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per level")
+    parser.add_argument("--mix", default="generate=1,recordings=3,archives=1,month=2", help="Request type weights")
+    parser.add_argument("--plies", type=int, default=16, help="Truncate sample games to this many half-moves (0 = full games)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-request timeout in seconds")
+    parser.add_argument("--json", help="Write all rows to this JSON file")
+    parser.add_argument("--csv", help="Write all rows to this CSV file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    pgns = load_sample_pgns(args.plies)
+    levels = [int(level) for level in args.levels.split(",")]
+    requests.get(args.base_url + "/", timeout=10).raise_for_status() # Fail fast if the backend isn't up
+
+    rows = []
+    for concurrency in levels:
+        print(f"🔄 {concurrency} clients for {args.duration:.0f}s...")
+        level_rows = run_level(args.base_url, concurrency, args.duration, mix, pgns, args.timeout)
+        print_table(level_rows)
+        rows.extend(level_rows)
+
+    print("\n=== Latency curve (all endpoints) ===")
+    print_table([row for row in rows if row["endpoint"] == "all"])
+    saturation = find_saturation(rows)
+    if saturation:
+        print(f"\n📈 Saturation at ~{saturation['concurrency']} clients: {saturation['throughput_rps']:.2f} req/s, "
+              f"p95 {saturation['p95_ms']:.0f} ms. More clients only add queueing delay.")
+    else:
+        print("\n📈 Throughput was still growing at the highest level; try more clients.")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"levels": levels, "duration": args.duration, "mix": mix, "rows": rows}, f, indent=2)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
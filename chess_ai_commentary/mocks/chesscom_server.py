@@ -0,0 +1,144 @@
+"""
+A local stand-in for the chess.com public API endpoints the backend proxies:
+    /pub/player/{username}/games/archives
+    /pub/player/{username}/games/{YYYY}/{MM}
+Every username has the same archives; games are built from the PGNs in input/pgn_files.
+
+Usage (from the chess_ai_commentary folder):
+    python mocks/chesscom_server.py --port 8767 --latency 0.1 --rate-limit-rate 0.05
+    CHESS_COM_API_BASE=http://127.0.0.1:8767/pub uvicorn main:app   (from backend/)
+"""
+import os
+import re
+import sys
+import glob
+import json
+import random
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from faults import Faults, add_fault_arguments, faults_from_args
+
+PGN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "input", "pgn_files")
+
+_ARCHIVES_PATH = re.compile(r"^/pub/player/(?P<username>[^/]+)/games/archives/?$")
+_MONTH_PATH = re.compile(r"^/pub/player/(?P<username>[^/]+)/games/(?P<year>\d{4})/(?P<month>\d{2})/?$")
+
+
+def load_pgns(pgn_dir: str = PGN_DIR) -> list:
+    pgns = []
+    for path in sorted(glob.glob(os.path.join(pgn_dir, "*.pgn"))):
+        with open(path, encoding="utf-8") as f:
+            pgns.append(f.read())
+    if not pgns:
+        pgns.append('[Event "Mock"]\n[White "white"]\n[Black "black"]\n[Result "1-0"]\n\n1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0\n')
+    return pgns
+
+
+class FakeChessCom:
+    """Archive months and per-month game lists for any username."""
+
+    def __init__(self, faults: Faults = None, months: int = 12, games_per_month: int = 20,
+                 rate_limit_rate: float = 0.0, pgns: list = None):
+        self.faults = faults or Faults()
+        self.months = [(2025 - i // 12, 12 - i % 12) for i in range(months)][::-1]
+        self.games_per_month = games_per_month
+        self.rate_limit_rate = rate_limit_rate # fraction answered with chess.com's 429
+        self.pgns = pgns or load_pgns()
+
+    def archives(self, base_url: str, username: str) -> dict:
+        return {"archives": [f"{base_url}/pub/player/{username}/games/{year}/{month:02d}" for year, month in self.months]}
+
+    def games(self, username: str, year: int, month: int) -> dict:
+        if (year, month) not in self.months:
+            return {"games": []}
+        games = []
+        for i in range(self.games_per_month):
+            white, black = (username, f"opponent{i}") if i % 2 == 0 else (f"opponent{i}", username)
+            games.append({
+                "url": f"https://www.chess.com/game/live/{year}{month:02d}{i:04d}",
+                "pgn": self.pgns[i % len(self.pgns)],
+                "time_control": "600",
+                "end_time": 1700000000 + i,
+                "rated": True,
+                "time_class": "rapid",
+                "rules": "chess",
+                "white": {"username": white, "rating": 1500, "result": "win"},
+                "black": {"username": black, "rating": 1500, "result": "resigned"},
+            })
+        return {"games": games}
+
+
+class ChessComHandler(BaseHTTPRequestHandler):
+    api: FakeChessCom = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass # Keep the console quiet under load
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        api = self.api
+        if self.path.startswith("/stats"):
+            self._send_json(200, api.faults.snapshot())
+            return
+        if api.faults.inject():
+            self._send_json(503, {"code": 0, "message": "Service unavailable (injected)"})
+            return
+        if random.random() < api.rate_limit_rate:
+            api.faults.count('rate_limited')
+            self._send_json(429, {"code": 0, "message": "Too many requests"})
+            return
+
+        match = _ARCHIVES_PATH.match(self.path)
+        if match:
+            api.faults.count('ok')
+            self._send_json(200, api.archives(f"http://{self.headers.get('Host', 'localhost')}", match.group("username")))
+            return
+        match = _MONTH_PATH.match(self.path)
+        if match:
+            api.faults.count('ok')
+            self._send_json(200, api.games(match.group("username"), int(match.group("year")), int(match.group("month"))))
+            return
+        self._send_json(404, {"code": 0, "message": "Data provider not found for key"})
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8767, api: FakeChessCom = None) -> ThreadingHTTPServer:
+    """Creates (but does not start) a fake chess.com server. Useful for starting it in a thread from scripts."""
+    handler = type("BoundChessComHandler", (ChessComHandler,), {"api": api or FakeChessCom()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake chess.com public API (archives and monthly games) with fault injection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8767)
+    add_fault_arguments(parser, latency=0.1, jitter=0.05)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of 429 responses")
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--games-per-month", type=int, default=20)
+    args = parser.parse_args()
+
+    api = FakeChessCom(faults_from_args(args), args.months, args.games_per_month, args.rate_limit_rate)
+    server = make_server(args.host, args.port, api)
+    print(f"🧪 Fake chess.com listening on http://{args.host}:{args.port}/pub")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
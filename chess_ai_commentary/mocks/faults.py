@@ -0,0 +1,57 @@
+"""
+Latency and error injection shared by the fake Supabase and chess.com servers
+(mocks/gemini_server.py has its own, Gemini-specific MockState).
+"""
+import time
+import random
+import threading
+
+
+class Faults:
+    """Per-request latency, jitter, error and hang injection, plus counters shared by all handler threads."""
+
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, hang_rate=0.0, hang_seconds=60.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate      # fraction answered with a 5xx
+        self.hang_rate = hang_rate        # fraction that stall for hang_seconds before answering
+        self.hang_seconds = hang_seconds
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'ok': 0, 'errors': 0, 'hangs': 0}
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def inject(self) -> bool:
+        """
+        Sleeps for the simulated latency (or a hang) and counts the request.
+        Returns True if the caller should answer with an error instead of the real response.
+        """
+        self.count('requests')
+        roll = random.random()
+        if roll < self.hang_rate:
+            self.count('hangs')
+            time.sleep(self.hang_seconds)
+        elif roll < self.hang_rate + self.error_rate:
+            self.count('errors')
+            return True
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        return False
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.counts)
+
+
+def add_fault_arguments(parser, latency=0.05, jitter=0.02):
+    """Adds the --latency/--jitter/--error-rate/--hang-rate/--hang-seconds options to an argparse parser."""
+    parser.add_argument("--latency", type=float, default=latency, help="Mean response time in seconds")
+    parser.add_argument("--jitter", type=float, default=jitter, help="Std. deviation of the response time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 5xx responses")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that stall")
+    parser.add_argument("--hang-seconds", type=float, default=60.0)
+
+
+def faults_from_args(args) -> Faults:
+    return Faults(args.latency, args.jitter, args.error_rate, args.hang_rate, args.hang_seconds)
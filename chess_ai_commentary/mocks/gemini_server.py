@@ -0,0 +1,201 @@
+"""
+A local stand-in for the Gemini REST API (generateContent only), for exercising the
+client's rate limiting, retries and deadlines without real quota.
+
+It answers commentary prompts with well-formed JSON (one entry per move in the batch,
+or a single object for live-move prompts) and can inject latency, errors and quota limits.
+
+Usage (from the chess_ai_commentary folder):
+    python mocks/gemini_server.py --port 8765 --latency 0.5 --error-rate 0.1 --rpm 30
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 uvicorn main:app   (from backend/)
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_GENERATE_PATH = re.compile(r"^/v1beta/models/(?P<model>[^:/]+):generateContent")
+
+
+class MockState:
+    """Fault-injection settings plus request counters, shared by all handler threads."""
+
+    def __init__(self, latency=0.2, jitter=0.1, error_rate=0.0, rate_limit_rate=0.0, hang_rate=0.0, hang_seconds=120.0, rpm=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate             # fraction answered with 500/503
+        self.rate_limit_rate = rate_limit_rate   # fraction answered with 429 regardless of quota
+        self.hang_rate = hang_rate               # fraction that stall for hang_seconds (client timeouts)
+        self.hang_seconds = hang_seconds
+        self.rpm = rpm                           # requests per rolling minute before 429s (0 = unlimited)
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.counts = {'requests': 0, 'ok': 0, 'rate_limited': 0, 'errors': 0, 'hangs': 0}
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def over_quota(self) -> bool:
+        """Sliding one-minute window, like the real per-minute quota."""
+        if not self.rpm:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            if len(self.recent) >= self.rpm:
+                return True
+            self.recent.append(now)
+            return False
+
+
+def _prompt_text(body: dict) -> str:
+    return "\n".join(
+        part.get("text", "")
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+    )
+
+
+def _json_after(text: str, marker: str, opener: str):
+    """Decodes the first JSON value starting with `opener` after `marker`, or None."""
+    position = text.find(marker)
+    if position == -1:
+        return None
+    start = text.find(opener, position)
+    if start == -1:
+        return None
+    try:
+        return json.JSONDecoder().raw_decode(text[start:])[0]
+    except ValueError:
+        return None
+
+
+def fake_commentary(prompt: str) -> str:
+    """Builds a response in the shape CommentaryGenerator expects for the given prompt."""
+    def entry(move):
+        return {
+            "commentary": f"{move.get('player', 'The player')} plays {move.get('move_san', 'a move')}. ({move.get('evaluation', 'N/A')})",
+            "move_quality": random.choice(["Good", "Good", "Good", "Inaccuracy", "Brilliant", "Blunder"]),
+        }
+
+    moves = _json_after(prompt, "INPUT GAME DATA:", "[")
+    if moves is not None:
+        return "```json\n" + json.dumps([entry(move) for move in moves], indent=2) + "\n```"
+    move = _json_after(prompt, "NEW MOVE:", "{")
+    if move is not None:
+        return json.dumps(entry(move))
+    return "This is a mock Gemini response."
+
+
+class GeminiHandler(BaseHTTPRequestHandler):
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass # Keep the console quiet under load
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, reason: str, message: str):
+        self._send_json(status, {"error": {"code": status, "message": message, "status": reason}})
+
+    def do_GET(self):
+        if self.path.startswith("/stats"):
+            with self.state.lock:
+                self._send_json(200, dict(self.state.counts))
+        else:
+            self._send_error(404, "NOT_FOUND", "Unknown path")
+
+    def do_POST(self):
+        state = self.state
+        match = _GENERATE_PATH.match(self.path)
+        if not match:
+            self._send_error(404, "NOT_FOUND", "Only generateContent is mocked")
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        state.count('requests')
+
+        if state.over_quota() or random.random() < state.rate_limit_rate:
+            state.count('rate_limited')
+            self._send_error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).")
+            return
+
+        roll = random.random()
+        if roll < state.hang_rate:
+            state.count('hangs')
+            time.sleep(state.hang_seconds)
+        elif roll < state.hang_rate + state.error_rate:
+            state.count('errors')
+            if random.random() < 0.5:
+                self._send_error(500, "INTERNAL", "An internal error has occurred.")
+            else:
+                self._send_error(503, "UNAVAILABLE", "The model is overloaded. Please try again later.")
+            return
+
+        time.sleep(max(0.0, random.gauss(state.latency, state.jitter)))
+
+        prompt = _prompt_text(body)
+        text = fake_commentary(prompt)
+        prompt_tokens, output_tokens = len(prompt) // 4, len(text) // 4
+        state.count('ok')
+        self._send_json(200, {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            },
+            "modelVersion": match.group("model"),
+        })
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, state: MockState = None) -> ThreadingHTTPServer:
+    """Creates (but does not start) a mock server. Useful for starting it in a thread from scripts."""
+    handler = type("BoundGeminiHandler", (GeminiHandler,), {"state": state or MockState()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Gemini generateContent endpoint with fault injection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Std. deviation of the response time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 500/503 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of random 429 responses")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that stall")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before 429s (0 = unlimited)")
+    args = parser.parse_args()
+
+    state = MockState(args.latency, args.jitter, args.error_rate, args.rate_limit_rate, args.hang_rate, args.hang_seconds, args.rpm)
+    server = make_server(args.host, args.port, state)
+    print(f"🧪 Mock Gemini listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Starts the fake Supabase, Gemini and chess.com servers together in one process and
+prints the environment to point the backend at them, for load tests without any
+external service or quota.
+
+Usage (from the chess_ai_commentary folder):
+    python mocks/run_fakes.py --gemini-latency 1.0 --error-rate 0.02
+    # then, in backend/, with the printed variables exported:
+    uvicorn main:app
+    # and drive it with benchmarks/load_test.py
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import gemini_server
+import supabase_server
+import chesscom_server
+from faults import Faults
+
+
+def start_fakes(host: str = "127.0.0.1", supabase_port: int = 8766, gemini_port: int = 8765, chesscom_port: int = 8767,
+                supabase_faults: Faults = None, gemini_state: gemini_server.MockState = None,
+                chesscom: chesscom_server.FakeChessCom = None):
+    """Starts the three servers on daemon threads. Returns (servers, environment variables for the backend)."""
+    servers = [
+        supabase_server.make_server(host, supabase_port, supabase_server.FakeSupabase(supabase_faults)),
+        gemini_server.make_server(host, gemini_port, gemini_state),
+        chesscom_server.make_server(host, chesscom_port, chesscom),
+    ]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = {
+        "SUPABASE_URL": f"http://{host}:{supabase_port}",
+        "SUPABASE_KEY": supabase_server.FAKE_SUPABASE_KEY,
+        "GEMINI_API_ENDPOINT": f"http://{host}:{gemini_port}",
+        "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY") or "fake-key",
+        "CHESS_COM_API_BASE": f"http://{host}:{chesscom_port}/pub",
+    }
+    return servers, env
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake Supabase, Gemini and chess.com servers together.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--supabase-port", type=int, default=8766)
+    parser.add_argument("--gemini-port", type=int, default=8765)
+    parser.add_argument("--chesscom-port", type=int, default=8767)
+    parser.add_argument("--supabase-latency", type=float, default=0.05)
+    parser.add_argument("--gemini-latency", type=float, default=0.8)
+    parser.add_argument("--chesscom-latency", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 5xx responses from every fake")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of stalled requests on every fake")
+    parser.add_argument("--gemini-rpm", type=int, default=0, help="Gemini requests per minute before 429s (0 = unlimited)")
+    parser.add_argument("--chesscom-rate-limit-rate", type=float, default=0.0, help="Fraction of chess.com 429 responses")
+    args = parser.parse_args()
+
+    def faults(latency):
+        return Faults(latency, latency / 2, args.error_rate, args.hang_rate)
+
+    servers, env = start_fakes(
+        args.host, args.supabase_port, args.gemini_port, args.chesscom_port,
+        supabase_faults=faults(args.supabase_latency),
+        gemini_state=gemini_server.MockState(args.gemini_latency, args.gemini_latency / 2, args.error_rate,
+                                             hang_rate=args.hang_rate, rpm=args.gemini_rpm),
+        chesscom=chesscom_server.FakeChessCom(faults(args.chesscom_latency), rate_limit_rate=args.chesscom_rate_limit_rate),
+    )
+    print("🧪 Fake Supabase, Gemini and chess.com servers are running. Start the backend with:")
+    for key, value in env.items():
+        print(f"export {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
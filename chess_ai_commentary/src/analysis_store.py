@@ -0,0 +1,96 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+class AnalysisStore:
+    """
+    A bounded, in-memory cache of per-ply results keyed by move-sequence prefix.
+    Each ply's key is a hash chained from the previous ply's key, so two
+    submissions of the same game share keys up to the ply where they diverge,
+    and a resubmitted game with a few extra moves only needs its new tail analyzed.
+    """
+
+    def __init__(self, max_plies: int = 200_000):
+        """Initializes an empty store holding at most max_plies analysis entries."""
+        self.max_plies = max_plies
+        self._lock = threading.Lock()
+        self._analysis = OrderedDict()   # prefix key -> analysis dict
+        self._commentary = OrderedDict() # (prefix key, language) -> {'commentary', 'move_quality'}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def root_key(start_fen: str, depth: int, variant: str = None) -> str:
+        """Key of the empty move sequence. A variant (e.g. "annotations") keeps differently-sourced results apart."""
+        label = f"{start_fen}|depth={depth}" + (f"|{variant}" if variant else "")
+        return hashlib.sha1(label.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def child_key(key: str, uci: str) -> str:
+        """Key of the sequence `key` extended by one move."""
+        return hashlib.sha1(f"{key}|{uci}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def prefix_keys(start_fen: str, moves_uci: list, depth: int) -> list:
+        """Returns one key per ply: keys[i] identifies the game up to and including moves_uci[i]."""
+        keys = []
+        key = AnalysisStore.root_key(start_fen, depth)
+        for uci in moves_uci:
+            key = AnalysisStore.child_key(key, uci)
+            keys.append(key)
+        return keys
+
+    def _touch(self, table: OrderedDict, key):
+        value = table.get(key)
+        if value is not None:
+            table.move_to_end(key)
+        return value
+
+    def _insert(self, table: OrderedDict, key, value):
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_plies:
+            table.popitem(last=False)
+
+    def get_analysis(self, key: str):
+        """Returns a copy of the cached analysis for a ply prefix, or None."""
+        with self._lock:
+            value = self._touch(self._analysis, key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(value)
+
+    def put_analysis(self, key: str, analysis: dict):
+        """Caches the engine analysis for a ply prefix (commentary fields are not stored here)."""
+        value = {k: v for k, v in analysis.items() if k not in ('commentary', 'move_quality')}
+        with self._lock:
+            self._insert(self._analysis, key, value)
+
+    def get_commentary(self, key: str, language: str):
+        """Returns cached {'commentary', 'move_quality'} for a ply prefix in a language, or None."""
+        with self._lock:
+            value = self._touch(self._commentary, (key, language))
+            return dict(value) if value is not None else None
+
+    def put_commentary(self, key: str, language: str, move_analysis: dict):
+        """Caches the commentary generated for a ply prefix in a language."""
+        value = {
+            'commentary': move_analysis.get('commentary'),
+            'move_quality': move_analysis.get('move_quality'),
+        }
+        with self._lock:
+            self._insert(self._commentary, (key, language), value)
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and entry counts."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'analysis_entries': len(self._analysis),
+                'commentary_entries': len(self._commentary),
+            }
@@ -0,0 +1,226 @@
+import numpy as np
+import chess
+
+# Sentinels for missing values in integer columns
+NO_MOVE = 0xFFFF
+NO_VALUE = np.iinfo(np.int32).min
+
+EVAL_TYPES = {'cp': 0, 'mate': 1}
+EVAL_TYPE_NAMES = {code: name for name, code in EVAL_TYPES.items()}
+
+MOVE_QUALITIES = {"Brilliant": 0, "Good": 1, "Inaccuracy": 2, "Blunder": 3, "Checkmate": 4}
+MOVE_QUALITY_NAMES = {code: name for name, code in MOVE_QUALITIES.items()}
+
+# Score used for "mate in N" when a single centipawn scale is needed (e.g. eval swings)
+MATE_SCORE = 100_000
+
+TOP_MOVES = 3
+
+
+def encode_move(uci):
+    """Packs a UCI move into 16 bits: from | to << 6 | promotion piece type << 12."""
+    if not uci:
+        return NO_MOVE
+    move = chess.Move.from_uci(uci)
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code):
+    """Inverse of encode_move. Returns a UCI string or None."""
+    code = int(code)
+    if code == NO_MOVE:
+        return None
+    return chess.Move(code & 63, (code >> 6) & 63, promotion=(code >> 12) or None).uci()
+
+
+class PlyRecord:
+    """
+    A lightweight view of one row of an AnalysisTable.
+    Supports the dict-style access used by the commentary stage (get, [], update),
+    but reads and writes the table's columns directly instead of holding a copy.
+    """
+    __slots__ = ('_table', '_i')
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def get(self, key, default=None):
+        value = self._table._field(self._i, key)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self._table._field(self._i, key)
+        if value is None and key not in self._table.FIELDS:
+            raise KeyError(key)
+        return value
+
+    def update(self, values: dict):
+        """Writes commentary fields back into the table (other keys are ignored)."""
+        if 'commentary' in values:
+            self._table.commentary[self._i] = values['commentary'] or ''
+        if 'move_quality' in values:
+            self._table.quality[self._i] = MOVE_QUALITIES.get(values['move_quality'], -1)
+
+    def to_dict(self) -> dict:
+        return {key: self.get(key) for key in self._table.FIELDS}
+
+    def __repr__(self):
+        return f"PlyRecord({self.to_dict()!r})"
+
+
+class AnalysisTable:
+    """
+    Column-oriented container for a game's per-ply analysis.
+    Holds the same information as the list of dicts returned by
+    ChessAnalyzer.analyze_game in a few small NumPy arrays. Slices are views
+    (no copies). The table saves to and loads from a .npz file without pickling.
+    It is the storage format of batch runs (src/corpus_runner.py); the interactive
+    pipeline keeps the list of dicts, since its stages attach per-request fields
+    (prefix keys, timings, audio paths) that the table has no columns for.
+    """
+
+    FIELDS = ('move_number', 'player', 'move_san', 'fen', 'evaluation', 'best_move', 'top_moves', 'commentary', 'move_quality')
+
+    def __init__(self, columns: dict):
+        """Wraps existing column arrays. Use from_results() or load() to build a table."""
+        self.ply = columns['ply']                 # int16, move_number
+        self.white = columns['white']             # bool, True if White made the move
+        self.san = columns['san']                 # bytes, SAN of the move
+        self.fen = columns['fen']                 # bytes, FEN after the move
+        self.eval_type = columns['eval_type']     # int8, EVAL_TYPES code or -1
+        self.eval_value = columns['eval_value']   # int32, centipawns or mate distance (White's view)
+        self.best_move = columns['best_move']     # uint16, encoded UCI
+        self.top_move = columns['top_move']       # uint16 (n, 3), encoded UCI
+        self.top_cp = columns['top_cp']           # int32 (n, 3), NO_VALUE if mate
+        self.top_mate = columns['top_mate']       # int32 (n, 3), NO_VALUE if centipawns
+        self.quality = columns['quality']         # int8, MOVE_QUALITIES code or -1
+        self.commentary = columns['commentary']   # object, str
+
+    # --- Construction ---
+    @classmethod
+    def from_results(cls, analysis_results: list):
+        """Builds a table from ChessAnalyzer's list-of-dicts output."""
+        n = len(analysis_results)
+        top_move = np.full((n, TOP_MOVES), NO_MOVE, dtype=np.uint16)
+        top_cp = np.full((n, TOP_MOVES), NO_VALUE, dtype=np.int32)
+        top_mate = np.full((n, TOP_MOVES), NO_VALUE, dtype=np.int32)
+        eval_type = np.full(n, -1, dtype=np.int8)
+        eval_value = np.zeros(n, dtype=np.int32)
+
+        for i, move in enumerate(analysis_results):
+            evaluation = move.get('evaluation')
+            if evaluation:
+                eval_type[i] = EVAL_TYPES.get(evaluation.get('type'), -1)
+                eval_value[i] = evaluation.get('value', 0)
+            for j, top in enumerate((move.get('top_moves') or [])[:TOP_MOVES]):
+                top_move[i, j] = encode_move(top.get('Move'))
+                if top.get('Centipawn') is not None:
+                    top_cp[i, j] = top['Centipawn']
+                if top.get('Mate') is not None:
+                    top_mate[i, j] = top['Mate']
+
+        commentary = np.empty(n, dtype=object)
+        commentary[:] = [move.get('commentary') or '' for move in analysis_results]
+
+        return cls({
+            'ply': np.array([move.get('move_number', i + 1) for i, move in enumerate(analysis_results)], dtype=np.int16),
+            'white': np.array([move.get('player') == 'White' for move in analysis_results], dtype=bool),
+            'san': np.array([(move.get('move_san') or '').encode('ascii') for move in analysis_results], dtype=bytes),
+            'fen': np.array([(move.get('fen') or '').encode('ascii') for move in analysis_results], dtype=bytes),
+            'eval_type': eval_type,
+            'eval_value': eval_value,
+            'best_move': np.array([encode_move(move.get('best_move')) for move in analysis_results], dtype=np.uint16),
+            'top_move': top_move,
+            'top_cp': top_cp,
+            'top_mate': top_mate,
+            'quality': np.array([MOVE_QUALITIES.get(move.get('move_quality'), -1) for move in analysis_results], dtype=np.int8),
+            'commentary': commentary,
+        })
+
+    def _columns(self) -> dict:
+        return {
+            'ply': self.ply, 'white': self.white, 'san': self.san, 'fen': self.fen,
+            'eval_type': self.eval_type, 'eval_value': self.eval_value, 'best_move': self.best_move,
+            'top_move': self.top_move, 'top_cp': self.top_cp, 'top_mate': self.top_mate,
+            'quality': self.quality, 'commentary': self.commentary,
+        }
+
+    # --- Row access (dict-compatible) ---
+    def __len__(self):
+        return len(self.ply)
+
+    def __iter__(self):
+        return (PlyRecord(self, i) for i in range(len(self)))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.view(index.start, index.stop, index.step)
+        return PlyRecord(self, index)
+
+    def view(self, start=None, stop=None, step=None):
+        """Returns a table over rows [start:stop:step] that shares memory with this one (strided for a step)."""
+        return AnalysisTable({name: column[start:stop:step] for name, column in self._columns().items()})
+
+    def _field(self, i, key):
+        if key == 'move_number':
+            return int(self.ply[i])
+        if key == 'player':
+            return 'White' if self.white[i] else 'Black'
+        if key == 'move_san':
+            return self.san[i].decode('ascii')
+        if key == 'fen':
+            return self.fen[i].decode('ascii')
+        if key == 'evaluation':
+            if self.eval_type[i] < 0:
+                return None
+            return {'type': EVAL_TYPE_NAMES[int(self.eval_type[i])], 'value': int(self.eval_value[i])}
+        if key == 'best_move':
+            return decode_move(self.best_move[i])
+        if key == 'top_moves':
+            return [
+                {
+                    'Move': decode_move(self.top_move[i, j]),
+                    'Centipawn': None if self.top_cp[i, j] == NO_VALUE else int(self.top_cp[i, j]),
+                    'Mate': None if self.top_mate[i, j] == NO_VALUE else int(self.top_mate[i, j]),
+                }
+                for j in range(TOP_MOVES) if self.top_move[i, j] != NO_MOVE
+            ]
+        if key == 'commentary':
+            return self.commentary[i] or None
+        if key == 'move_quality':
+            return MOVE_QUALITY_NAMES.get(int(self.quality[i]))
+        return None
+
+    def to_results(self) -> list:
+        """Converts back to the list-of-dicts format used by the rest of the pipeline."""
+        return [record.to_dict() for record in self]
+
+    # --- Vectorized helpers ---
+    def scores(self) -> np.ndarray:
+        """
+        Evaluations on one centipawn scale (White's view), with mate in N mapped to ±(MATE_SCORE - N).
+        Mate 0 (the side to move is checkmated) has no sign of its own: it is -MATE_SCORE when
+        White is to move, i.e. after a Black move, and +MATE_SCORE after a White move.
+        """
+        mate = self.eval_type == EVAL_TYPES['mate']
+        sign = np.where(self.eval_value != 0, np.sign(self.eval_value), np.where(self.white, 1, -1))
+        mate_scores = sign * (MATE_SCORE - np.abs(self.eval_value))
+        return np.where(mate, mate_scores, self.eval_value).astype(np.int32)
+
+    # --- On-disk format ---
+    def save(self, path: str, compress: bool = False):
+        """Writes the table to a .npz file (uncompressed by default, for fast loading)."""
+        columns = self._columns()
+        columns['commentary'] = np.array([str(c) for c in self.commentary], dtype=str)
+        (np.savez_compressed if compress else np.savez)(path, **columns)
+
+    @classmethod
+    def load(cls, path: str):
+        """Reads a table written by save()."""
+        with np.load(path, allow_pickle=False) as data:
+            columns = {name: data[name] for name in data.files}
+        commentary = np.empty(len(columns['commentary']), dtype=object)
+        commentary[:] = columns['commentary'].tolist()
+        columns['commentary'] = commentary
+        return cls(columns)
@@ -0,0 +1,78 @@
+import time
+import threading
+
+
+class JobCancelled(Exception):
+    """Raised inside a pipeline run once its CancellationToken has been cancelled."""
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(f"Job cancelled: {reason}")
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation for one job. Whoever wants the job stopped (a client disconnect,
+    the cancel endpoint, the scheduler) calls cancel(); the pipeline stages call check()
+    between units of work (plies, the Gemini call, TTS sentences) and the engine supervisor
+    polls `cancelled` while a search runs. An optional deadline cancels the job on its own
+    once it passes. Thread-safe.
+    """
+
+    def __init__(self, deadline_seconds: float = None):
+        self.deadline_at = time.monotonic() + deadline_seconds if deadline_seconds else None
+        self.reason = None
+        self.cancelled_at = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Cancels the job and runs the registered callbacks. Returns False if it was already cancelled."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"⚠️ Cancellation callback failed: {e}")
+        return True
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline_at is not None and time.monotonic() >= self.deadline_at:
+            self.cancel("deadline exceeded")
+        return self._event.is_set()
+
+    def check(self):
+        """Raises JobCancelled if the job has been cancelled (or its deadline passed)."""
+        if self.cancelled:
+            raise self.exception()
+
+    def exception(self) -> JobCancelled:
+        return JobCancelled(self.reason or "cancelled")
+
+    def remaining(self):
+        """Seconds until the deadline, or None without one."""
+        return None if self.deadline_at is None else max(0.0, self.deadline_at - time.monotonic())
+
+    def wait(self, seconds: float) -> bool:
+        """Sleeps up to `seconds` (less if the deadline comes first), waking early on cancellation. Returns True if cancelled."""
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        self._event.wait(seconds)
+        return self.cancelled
+
+    def add_callback(self, callback):
+        """Calls callback(token) on cancellation (right away if already cancelled)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
@@ -1,8 +1,22 @@
 import os
 import io
+import re
+import threading
 import chess
 import chess.pgn
-from stockfish import Stockfish
+import chess.syzygy
+from src import pgn_fast
+from src.analysis_store import AnalysisStore
+from src.engine_supervisor import EngineSupervisor
+from src.cancellation import JobCancelled
+from src.profiler import profiler
+from src.config import ENGINE_SEARCH_TIMEOUT, ENGINE_MAX_RETRIES, SYZYGY_PATH
+
+# Embedded commands such as [%eval 0.35] or [%clk 0:03:00] inside PGN comments
+_PGN_COMMAND = re.compile(r"\[%[^\]]*\]")
+
+# Centipawn score of a tablebase win (minus its distance to zeroing), far above any engine eval
+SYZYGY_WIN_CP = 10000
 
 class ChessAnalyzer:
     """
@@ -10,88 +24,451 @@ class ChessAnalyzer:
     It can analyze PGN strings, FEN strings, and PGN files.
     """
     
-    def __init__(self, stockfish_path):
-        """Initializes the chess analyzer with the Stockfish engine."""
+    def __init__(self, stockfish_path, store: AnalysisStore = None, position_cache=None, syzygy_path=SYZYGY_PATH,
+                 engine_parameters: dict = None):
+        """
+        Initializes the chess analyzer with the Stockfish engine.
+        If a store is given, per-ply results are cached by move-sequence prefix
+        and reused when a game is resubmitted, extended or varied.
+        If a position_cache (src.position_service.PositionCache) is given, every analyzed
+        position is shared with it, so eval-bar lookups on analyzed games are instant.
+        If syzygy_path points at Syzygy tablebase directories, positions they cover are
+        answered from the tables (source 'syzygy') without an engine search.
+        engine_parameters are Stockfish UCI options such as Threads and Hash (see src/resources.py).
+        """
         self.stockfish_path = stockfish_path
+        self.store = store
+        self.position_cache = position_cache
+        self.supervisor = None
+        self.tablebase = None
+        self.tablebase_max_pieces = 0
+        self.tablebase_hits = 0
+        self._tablebase_lock = threading.Lock()
+        if syzygy_path:
+            self._open_tablebase(syzygy_path)
         try:
             # Ensure the provided path exists before initializing
             if not self.stockfish_path or not os.path.exists(self.stockfish_path):
                 raise FileNotFoundError(f"Stockfish executable not found at: {self.stockfish_path}")
             
-            self.stockfish = Stockfish(path=self.stockfish_path)
-            print("✅ Stockfish engine initialized successfully!")
+            # The supervisor enforces per-search deadlines and respawns a hung or crashed engine
+            self.supervisor = EngineSupervisor(
+                self.stockfish_path,
+                parameters=engine_parameters,
+                search_timeout=ENGINE_SEARCH_TIMEOUT,
+                max_retries=ENGINE_MAX_RETRIES
+            )
+            if self.supervisor.engine:
+                print("✅ Stockfish engine initialized successfully!")
         except Exception as e:
             print(f"❌ Stockfish initialization failed: {e}")
-            self.stockfish = None
+            self.supervisor = None
+
+    @property
+    def stockfish(self):
+        """The current Stockfish instance (replaced whenever the supervisor restarts it)."""
+        return self.supervisor.engine if self.supervisor else None
+
+    def close(self):
+        """Stops the Stockfish process and closes the tablebase files."""
+        if self.supervisor:
+            self.supervisor.close()
+        if self.tablebase:
+            self.tablebase.close()
+            self.tablebase = None
+
+    def _open_tablebase(self, syzygy_path):
+        """Opens every Syzygy directory in syzygy_path (os.pathsep-separated). Leaves probing off if none load."""
+        try:
+            tablebase = chess.syzygy.Tablebase()
+            for directory in syzygy_path.split(os.pathsep):
+                if directory and os.path.isdir(directory):
+                    tablebase.add_directory(directory)
+                elif directory:
+                    print(f"⚠️ Syzygy directory not found: {directory}")
+            if not tablebase.wdl:
+                print(f"⚠️ No Syzygy tables found in {syzygy_path}; tablebase probing disabled.")
+                tablebase.close()
+                return
+            # Table names look like "KRPvKR": one letter per piece plus the "v"
+            self.tablebase_max_pieces = max(len(name) - 1 for name in tablebase.wdl)
+            self.tablebase = tablebase
+            print(f"✅ Syzygy tablebases loaded: {len(tablebase.wdl)} tables, up to {self.tablebase_max_pieces} pieces.")
+        except Exception as e:
+            print(f"❌ Syzygy tablebase initialization failed: {e}")
+
+    @staticmethod
+    def _tablebase_score(wdl, dtz):
+        """Centipawns for a tablebase result from the side to move's view; cursed wins and blessed losses are draws."""
+        if wdl == 2:
+            return SYZYGY_WIN_CP - abs(dtz)
+        if wdl == -2:
+            return -SYZYGY_WIN_CP + abs(dtz)
+        return 0
+
+    def probe_tablebase(self, fen):
+        """
+        Answers a position from the Syzygy tables, or returns None if it isn't covered
+        (too many pieces, castling rights, missing table files or no legal moves).
+        Scores are from White's point of view, like the other evaluations the commentary
+        reads. Moves are ranked by the result they lead to: the fastest conversion when
+        winning (preferring captures and pawn moves, which reset the 50-move counter),
+        the longest resistance when losing.
+        """
+        if not self.tablebase:
+            return None
+        board = chess.Board(fen)
+        if chess.popcount(board.occupied) > self.tablebase_max_pieces or board.castling_rights or board.is_game_over():
+            return None
+
+        try:
+            with self._tablebase_lock:
+                wdl = self.tablebase.probe_wdl(board)
+                dtz = self.tablebase.probe_dtz(board)
+                ranked = []
+                for move in board.legal_moves:
+                    zeroing = board.is_zeroing(move)
+                    board.push(move)
+                    try:
+                        # Results after the move are from the opponent's view
+                        if board.is_checkmate():
+                            move_wdl, move_dtz = -2, 0
+                        else:
+                            move_wdl = self.tablebase.probe_wdl(board)
+                            move_dtz = self.tablebase.probe_dtz(board)
+                    finally:
+                        board.pop()
+                    ranked.append((move, -move_wdl, -move_dtz, zeroing))
+        except (KeyError, chess.syzygy.MissingTableError):
+            return None
+
+        def rank(entry):
+            _, result, move_dtz, zeroing = entry
+            if result > 0:
+                return (-result, not zeroing, abs(move_dtz))  # Win: zeroing moves first, then the shortest DTZ
+            if result < 0:
+                return (-result, zeroing, -abs(move_dtz))     # Loss: the longest DTZ
+            return (0, False, 0)
+        ranked.sort(key=rank)
+
+        sign = 1 if board.turn == chess.WHITE else -1
+        top_moves = []
+        for move, move_wdl, move_dtz, _ in ranked[:3]:
+            top_moves.append({'Move': move.uci(), 'Centipawn': sign * self._tablebase_score(move_wdl, move_dtz), 'Mate': None})
+
+        self.tablebase_hits += 1
+        return {
+            'fen': fen,
+            'evaluation': {'type': 'cp', 'value': sign * self._tablebase_score(wdl, dtz), 'wdl': sign * wdl, 'dtz': sign * dtz},
+            'best_move': ranked[0][0].uci(),
+            'top_moves': top_moves,
+            'source': 'syzygy',
+        }
 
-    def analyze_position(self, fen, depth=15):
-        """Analyzes a single chess position from a FEN string."""
-        if not self.stockfish:
+    def get_tablebase_stats(self) -> dict:
+        return {
+            'enabled': self.tablebase is not None,
+            'tables': len(self.tablebase.wdl) if self.tablebase else 0,
+            'max_pieces': self.tablebase_max_pieces,
+            'hits': self.tablebase_hits,
+        }
+
+    def analyze_position(self, fen, depth=15, cancel_token=None):
+        """
+        Analyzes a single chess position from a FEN string.
+        Endgames covered by the Syzygy tables (if configured) skip the engine search.
+        If cancel_token is cancelled mid-search, the search is stopped and JobCancelled raised.
+        """
+        if self.tablebase:
+            tablebase_result = self.probe_tablebase(fen)
+            if tablebase_result:
+                return tablebase_result
+
+        # Cached results are served even when the engine is down
+        if self.position_cache:
+            cached = self.position_cache.get(fen, depth=depth, multipv=3)
+            if cached:
+                return {key: cached[key] for key in ('fen', 'evaluation', 'best_move', 'top_moves')}
+
+        if not self.supervisor:
             print("⚠️ Stockfish not available for analysis.")
             return None
+
+        def search(stockfish):
+            stockfish.set_depth(depth)
+            stockfish.set_fen_position(fen)
+            evaluation = stockfish.get_evaluation()
+            best_move = stockfish.get_best_move()
+            top_moves = stockfish.get_top_moves(3)
+            return evaluation, best_move, top_moves
+
         try:
-            self.stockfish.set_depth(depth)
-            self.stockfish.set_fen_position(fen)
-            evaluation = self.stockfish.get_evaluation()
-            best_move = self.stockfish.get_best_move()
-            top_moves = self.stockfish.get_top_moves(3)
+            with profiler.span("stockfish"):
+                evaluation, best_move, top_moves = self.supervisor.run(search, cancel_token=cancel_token)
             
+            if self.position_cache:
+                self.position_cache.put(fen, {
+                    'fen': fen, 'evaluation': evaluation, 'best_move': best_move, 'top_moves': top_moves,
+                    'depth': depth, 'nodes': None, 'legal_moves': chess.Board(fen).legal_moves.count()
+                })
             return {
                 'fen': fen, 
                 'evaluation': evaluation,
                 'best_move': best_move, 
                 'top_moves': top_moves,
             }
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"⚠️ Position analysis error: {e}")
             return None
 
-    def analyze_game(self, pgn_string):
-        """Analyzes a complete game from a PGN string, move by move."""
-        if not self.stockfish: 
+    def analyze_move(self, board, move, move_number, depth=15):
+        """
+        Plays a move on the given board (in place) and analyzes the resulting position.
+        Used by analyze_game and by live sessions that keep one board per game.
+        """
+        # Get the move in Standard Algebraic Notation (e.g., "Nf3") *before* pushing
+        move_san = board.san(move) 
+        
+        # Make the move
+        board.push(move)
+        
+        # Analyze the position *after* the move
+        position_data = self.analyze_position(board.fen(), depth=depth)
+        
+        if position_data:
+            position_data.update({
+                'move_number': move_number,
+                'move_san': move_san, 
+                'player': 'White' if board.turn == chess.BLACK else 'Black' # Player who *just* moved
+            })
+        return position_data
+
+    @staticmethod
+    def _read_mainline(pgn_string):
+        """
+        Returns the game's mainline as {'start_fen', 'san', 'uci', 'fen'} lists (one entry per ply),
+        or None if the PGN has no game. Uses the fast tokenizer and falls back to a full
+        python-chess parse for movetext it can't play out.
+        """
+        try:
+            plies = pgn_fast.read_mainline(pgn_string)
+            if plies:
+                return plies
+        except pgn_fast.FastPgnError as e:
+            print(f"⚠️ Fast PGN parse failed ({e}), falling back to python-chess.")
+
+        game = chess.pgn.read_game(io.StringIO(pgn_string))
+        if not game:
+            return None
+        board = game.board()
+        plies = {'start_fen': board.fen(), 'san': [], 'uci': [], 'fen': []}
+        for move in game.mainline_moves():
+            plies['san'].append(board.san(move))
+            plies['uci'].append(move.uci())
+            board.push(move)
+            plies['fen'].append(board.fen())
+        return plies
+
+    def analyze_game(self, pgn_string, should_stop=None, cancel_token=None):
+        """
+        Analyzes a complete game from a PGN string, move by move.
+        should_stop is checked before each ply; when it returns True the analysis stops early
+        and the plies done so far are returned (and stay in the store for the next run).
+        A cancelled cancel_token instead aborts the analysis with JobCancelled.
+        """
+        if not self.supervisor: 
             print("⚠️ Stockfish not available for game analysis.")
             return []
             
         try:
-            game = chess.pgn.read_game(io.StringIO(pgn_string))
-            if not game:
+            with profiler.span("pgn_parse"):
+                plies = self._read_mainline(pgn_string)
+            if not plies:
                 print("❌ Invalid PGN format.")
                 return []
                 
-            board = game.board()
             analysis_results = []
-            mainline_moves = list(game.mainline_moves())
-            total_moves = len(mainline_moves)
+            total_moves = len(plies['uci'])
             print(f"🔄 Analyzing game with {total_moves} moves...")
 
-            for i, move in enumerate(mainline_moves):
-                # Get the move in Standard Algebraic Notation (e.g., "Nf3") *before* pushing
-                move_san = board.san(move) 
-                
-                # Make the move
-                board.push(move)
-                
-                # Analyze the position *after* the move
-                position_data = self.analyze_position(board.fen())
+            # One key per ply prefix, so a resubmitted game reuses everything up to where it diverges
+            prefix_keys = []
+            if self.store:
+                prefix_keys = AnalysisStore.prefix_keys(plies['start_fen'], plies['uci'], depth=15)
+            reused = 0
+
+            for i, fen in enumerate(plies['fen']):
+                if should_stop and should_stop():
+                    print(f"   ⏸️ Analysis stopped at move {i}/{total_moves}.")
+                    return analysis_results
+                if cancel_token:
+                    cancel_token.check()
+
+                position_data = None
+                if self.store:
+                    position_data = self.store.get_analysis(prefix_keys[i])
+                    
+                if position_data:
+                    reused += 1
+                else:
+                    position_data = self.analyze_position(fen, depth=15, cancel_token=cancel_token)
+                    if position_data:
+                        position_data.update({
+                            'move_number': i + 1,
+                            'move_san': plies['san'][i],
+                            'player': 'White' if fen.split(' ')[1] == 'b' else 'Black' # Player who *just* moved
+                        })
+                        if self.store:
+                            position_data['prefix_key'] = prefix_keys[i]
+                            self.store.put_analysis(prefix_keys[i], position_data)
                 
                 if position_data:
-                    position_data.update({
-                        'move_number': i + 1,
-                        'move_san': move_san, 
-                        'player': 'White' if board.turn == chess.BLACK else 'Black' # Player who *just* moved
-                    })
                     analysis_results.append(position_data)
                     
                 if (i + 1) % 10 == 0 or (i + 1) == total_moves:
-                    print(f"   📊 Analyzed move {i + 1}/{total_moves} ({move_san})...")
+                    print(f"   📊 Analyzed move {i + 1}/{total_moves} ({plies['san'][i]})...")
                     
+            if reused:
+                print(f"   ♻️ Reused cached analysis for {reused}/{total_moves} plies.")
+            tablebase_plies = sum(1 for result in analysis_results if result.get('source') == 'syzygy')
+            if tablebase_plies:
+                print(f"   📚 {tablebase_plies}/{total_moves} plies answered from Syzygy tablebases.")
             print("✅ Game analysis complete.")
             return analysis_results
             
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"❌ Game analysis failed: {e}")
             return []
 
+    def _annotation_evaluation(self, node):
+        """Converts a node's [%eval] annotation into the Stockfish evaluation format (White's point of view)."""
+        pov_score = node.eval()
+        if pov_score is None:
+            return None
+        score = pov_score.white()
+        if score.is_mate():
+            return {'type': 'mate', 'value': score.mate()}
+        return {'type': 'cp', 'value': score.score()}
+
+    def analyze_game_tree(self, pgn_string, include_variations=True, use_annotations=True, depth=15, cancel_token=None,
+                          grade_moves=False):
+        """
+        Analyzes every move in a PGN, including sidelines, in depth-first order.
+        Positions reached more than once (transpositions) are analyzed once via a
+        FEN-keyed table, and [%eval] annotations from chess.com/Lichess exports are
+        used in place of an engine search when present.
+        Annotations carry no best move, so with grade_moves (needed to judge move quality in
+        the commentary) annotated plies still get best_move/top_moves from the position cache
+        or the engine; the evaluation is the annotation's.
+        With a store, every ply gets a 'prefix_key' for its path from the start, and results
+        are reused from it on resubmission (annotation-sourced results are kept apart).
+
+        Each result has the usual analysis fields plus 'source' ('engine', 'syzygy',
+        'annotation' or 'transposition'), 'node_index', 'parent_index', 'is_mainline', 'nags',
+        'clock' (seconds left, from [%clk]) and 'comment' (with embedded commands removed).
+        """
+        try:
+            game = chess.pgn.read_game(io.StringIO(pgn_string))
+            if not game:
+                print("❌ Invalid PGN format.")
+                return []
+
+            board = game.board()
+            analysis_results = []
+            position_table = {} # EPD (FEN without move clocks) -> analysis
+            sources = {'engine': 0, 'syzygy': 0, 'annotation': 0, 'transposition': 0}
+            reused = 0
+            root_key = None
+            if self.store:
+                root_key = AnalysisStore.root_key(board.fen(), depth, variant="annotations" if use_annotations else None)
+            print(f"🔄 Analyzing game tree ({'with' if include_variations else 'without'} variations)...")
+
+            # Iterative depth-first walk; 'exit' entries undo the move when a subtree is done
+            stack = [('enter', child, None, 1, root_key) for child in reversed(game.variations if include_variations else game.variations[:1])]
+            while stack:
+                if cancel_token:
+                    cancel_token.check()
+                entry = stack.pop()
+                if entry[0] == 'exit':
+                    board.pop()
+                    continue
+
+                _, node, parent_index, ply, parent_key = entry
+                prefix_key = AnalysisStore.child_key(parent_key, node.move.uci()) if parent_key else None
+                move_san = board.san(node.move)
+                board.push(node.move)
+                key = board.epd()
+
+                position_data = self.store.get_analysis(prefix_key) if prefix_key else None
+                if position_data and grade_moves and not position_data.get('best_move') and not board.is_game_over():
+                    position_data = None # Cached from an ungraded run: fill in the best move below
+                if position_data:
+                    position_data.setdefault('source', 'engine') # Entries shared with analyze_game have no source
+                    reused += 1
+                elif key in position_table:
+                    position_data = dict(position_table[key], source='transposition')
+                elif use_annotations and self._annotation_evaluation(node) is not None:
+                    position_data = {
+                        'fen': board.fen(),
+                        'evaluation': self._annotation_evaluation(node),
+                        'best_move': None,
+                        'top_moves': [],
+                        'source': 'annotation',
+                    }
+                    if grade_moves and not board.is_game_over():
+                        engine_data = self.analyze_position(board.fen(), depth=depth, cancel_token=cancel_token)
+                        if engine_data:
+                            position_data['best_move'] = engine_data['best_move']
+                            position_data['top_moves'] = engine_data['top_moves']
+                else:
+                    position_data = self.analyze_position(board.fen(), depth=depth, cancel_token=cancel_token)
+                    if position_data:
+                        position_data.setdefault('source', 'engine')
+
+                node_index = None
+                if position_data:
+                    position_table.setdefault(key, dict(position_data))
+                    sources[position_data['source']] += 1
+                    node_index = len(analysis_results)
+                    position_data.update({
+                        'fen': board.fen(),
+                        'move_number': ply,
+                        'move_san': move_san,
+                        'player': 'White' if board.turn == chess.BLACK else 'Black', # Player who *just* moved
+                        'node_index': node_index,
+                        'parent_index': parent_index,
+                        'is_mainline': node.is_mainline(),
+                        'nags': sorted(node.nags),
+                        'clock': node.clock(),
+                        'comment': _PGN_COMMAND.sub('', node.comment).strip(),
+                    })
+                    if prefix_key:
+                        position_data['prefix_key'] = prefix_key
+                        self.store.put_analysis(prefix_key, position_data)
+                    analysis_results.append(position_data)
+
+                stack.append(('exit',))
+                children = node.variations if include_variations else node.variations[:1]
+                for child in reversed(children):
+                    stack.append(('enter', child, node_index, ply + 1, prefix_key))
+
+            print(f"✅ Game tree analysis complete: {len(analysis_results)} moves "
+                  f"({sources['engine']} engine searches, {sources['syzygy']} from tablebases, {sources['annotation']} from annotations, "
+                  f"{sources['transposition']} transpositions).")
+            if reused:
+                print(f"   ♻️ Reused cached analysis for {reused}/{len(analysis_results)} moves.")
+            return analysis_results
+
+        except JobCancelled:
+            raise
+        except Exception as e:
+            print(f"❌ Game tree analysis failed: {e}")
+            return []
+
     def load_pgn_from_file(self, file_path):
         """Loads PGN content from a specified file path."""
         try:
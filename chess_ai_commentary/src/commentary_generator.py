@@ -1,11 +1,20 @@
 import google.generativeai as genai
 import json
-from src.config import GEMINI_API_KEY
+from src.config import GEMINI_API_KEY, GEMINI_API_ENDPOINT
+from src.llm_client import GeminiClient
+from src.cancellation import JobCancelled
+
+# Rough response size per commented move, used for token budgeting
+OUTPUT_TOKENS_PER_MOVE = 60
 
 # --- Configure the Gemini API ---
 # We do this once when the module is loaded.
 try:
-    genai.configure(api_key=GEMINI_API_KEY)
+    if GEMINI_API_ENDPOINT:
+        # e.g. the local mock server; plain REST so http:// endpoints work
+        genai.configure(api_key=GEMINI_API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+    else:
+        genai.configure(api_key=GEMINI_API_KEY)
     print("✅ Google Gemini API configured successfully.")
 except Exception as e:
     print(f"❌ Gemini API configuration failed: {e}")
@@ -14,9 +23,11 @@ class CommentaryGenerator:
     """Uses a single, batched API call to generate commentary for a full game."""
     
     def __init__(self, model_name="gemini-2.5-flash"):
-        """Initializes the commentary generator model."""
+        """Initializes the commentary generator model and its rate-limited client."""
+        self.client = None
         try:
             self.model = genai.GenerativeModel(model_name)
+            self.client = GeminiClient(self.model)
             print(f"✅ Gemini model '{model_name}' loaded.")
         except Exception as e:
             print(f"❌ Failed to load Gemini model: {e}")
@@ -26,6 +37,12 @@ class CommentaryGenerator:
         """Converts Stockfish evaluation into a readable string."""
         if not eval_data: 
             return "N/A"
+
+        if 'wdl' in eval_data:
+            # Syzygy tablebase result: the exact outcome with best play, not an engine estimate
+            if eval_data['wdl'] == 0 or abs(eval_data['wdl']) == 1:
+                return "Tablebase draw"
+            return f"Tablebase win for {'White' if eval_data['wdl'] > 0 else 'Black'}"
             
         if eval_data['type'] == 'cp':
             # Convert centipawns to pawn advantage
@@ -41,9 +58,18 @@ class CommentaryGenerator:
         return "Unknown"
 
     # --- THIS FUNCTION IS UPDATED ---
-    def _create_batch_prompt(self, game_data_json: str, language: str) -> str: # <-- CHANGED (added language)
+    def _create_batch_prompt(self, game_data_json: str, language: str, context_json: str = None) -> str: # <-- CHANGED (added language)
         """Creates a single, powerful prompt for analyzing an entire game."""
         
+        # When only the tail of a game is regenerated, show the already-commented moves before it
+        context_section = ""
+        if context_json:
+            context_section = f"""
+        The game continues from earlier moves you have ALREADY commented on (oldest first).
+        Do not comment on these again; continue the narrative from them:
+        {context_json}
+        """
+
         return f"""
         You are an expert, charismatic chess commentator. I will provide a JSON array 
         of move-by-move analysis for an entire chess game.
@@ -59,7 +85,7 @@ class CommentaryGenerator:
         4.  A move is "Good" or "Inaccuracy" otherwise.
         5.  Your commentary should be 1-2 sentences long.
         6.  The 'move_quality' field must be one of: "Brilliant", "Good", "Inaccuracy", "Blunder", "Checkmate".
-
+        {context_section}
         INPUT GAME DATA:
         {game_data_json}
 
@@ -81,8 +107,94 @@ class CommentaryGenerator:
         ]
         """
 
-    def generate_commentary_for_game(self, analysis_results: list, language: str = "English"): # <-- CHANGED (added language)
-        """Generates commentary for all moves in a single API call."""
+    def _create_move_prompt(self, move_data_json: str, context_json: str, language: str) -> str:
+        """Creates a prompt for commenting on a single, just-played move of a live game."""
+        
+        return f"""
+        You are an expert, charismatic chess commentator covering a LIVE game.
+        I will provide the most recent moves with the commentary you already gave,
+        followed by the move that was just played.
+
+        Your task is to generate a concise, engaging commentary for the NEW move only,
+        in the following language: {language}.
+        Continue the narrative naturally and do not repeat earlier commentary.
+        
+        RULES:
+        1.  Analyze the 'evaluation' and 'best_engine_move' to determine the move quality.
+        2.  A move is a "Blunder" if it significantly worsens the evaluation.
+        3.  A move is "Brilliant" if it's the best move and not obvious.
+        4.  A move is "Good" or "Inaccuracy" otherwise.
+        5.  Your commentary should be 1-2 sentences long.
+        6.  The 'move_quality' field must be one of: "Brilliant", "Good", "Inaccuracy", "Blunder", "Checkmate".
+
+        RECENT MOVES (oldest first):
+        {context_json}
+
+        NEW MOVE:
+        {move_data_json}
+
+        Respond with ONLY a valid JSON object containing ONLY two keys: "commentary" and "move_quality".
+        
+        EXAMPLE RESPONSE:
+        {{
+          "commentary": "Black responds in kind with e5, challenging the center.",
+          "move_quality": "Good"
+        }}
+        """
+
+    def generate_commentary_for_move(self, move_analysis: dict, context: list, language: str = "English"):
+        """
+        Generates commentary for a single move, using the last few commented moves as context.
+        Used by live sessions where moves arrive one at a time.
+        """
+        if not self.model:
+            print("❌ Cannot generate commentary, Gemini model not loaded.")
+            return None
+            
+        try:
+            move_data = {
+                'move_number': move_analysis.get('move_number'),
+                'player': move_analysis.get('player'),
+                'move_san': move_analysis.get('move_san'),
+                'evaluation': self._format_evaluation(move_analysis.get('evaluation')),
+                'best_engine_move': move_analysis.get('best_move')
+            }
+            context_data = [
+                {
+                    'move_number': move.get('move_number'),
+                    'player': move.get('player'),
+                    'move_san': move.get('move_san'),
+                    'commentary': move.get('commentary')
+                } for move in context
+            ]
+
+            prompt = self._create_move_prompt(json.dumps(move_data), json.dumps(context_data, indent=2), language)
+            response = self.client.generate(prompt, expected_output_tokens=OUTPUT_TOKENS_PER_MOVE)
+
+            cleaned_response = response.text.strip().replace("`", "").replace("json", "")
+            json_start = cleaned_response.find('{')
+            json_end = cleaned_response.rfind('}') + 1
+            if json_start == -1 or json_end == 0:
+                raise ValueError("No valid JSON object found in API response.")
+
+            commentary_data = json.loads(cleaned_response[json_start:json_end])
+            move_analysis.update({
+                'commentary': commentary_data.get('commentary', ''),
+                'move_quality': commentary_data.get('move_quality')
+            })
+            return move_analysis
+
+        except Exception as e:
+            print(f"❌ Move commentary generation failed: {e}")
+            return None
+
+    def generate_commentary_for_game(self, analysis_results: list, language: str = "English", context: list = None,
+                                     cancel_token=None): # <-- CHANGED (added language)
+        """
+        Generates commentary for all moves in a single API call.
+        `context` optionally holds earlier, already-commented moves when only the tail of a game is being regenerated.
+        A cancelled cancel_token (src.cancellation) raises JobCancelled instead of calling or retrying Gemini.
+        """
         if not self.model:
             print("❌ Cannot generate commentary, Gemini model not loaded.")
             return None
@@ -101,9 +213,21 @@ class CommentaryGenerator:
             ]
             game_data_json = json.dumps(prompt_data, indent=2)
 
+            context_json = None
+            if context:
+                context_json = json.dumps([
+                    {
+                        'move_number': move.get('move_number'),
+                        'player': move.get('player'),
+                        'move_san': move.get('move_san'),
+                        'commentary': move.get('commentary')
+                    } for move in context
+                ], indent=2)
+
             # 2. Create the prompt and make the single API call
-            prompt = self._create_batch_prompt(game_data_json, language) # <-- CHANGED (passed language)
-            response = self.model.generate_content(prompt)
+            prompt = self._create_batch_prompt(game_data_json, language, context_json) # <-- CHANGED (passed language)
+            response = self.client.generate(prompt, expected_output_tokens=OUTPUT_TOKENS_PER_MOVE * len(analysis_results),
+                                            cancel_token=cancel_token)
             
             # 3. Clean and parse the JSON array from the response
             cleaned_response = response.text.strip().replace("`", "").replace("json", "")
@@ -125,6 +249,103 @@ class CommentaryGenerator:
                 print(f"❌ API Error: Input had {len(analysis_results)} moves, but output had {len(commentary_data_list)} commentaries.")
                 return None
                 
+        except JobCancelled:
+            raise
         except Exception as e:
+            if cancel_token is not None and cancel_token.cancelled: # e.g. the job deadline passed during the call
+                raise cancel_token.exception() from e
             print(f"❌ Batch commentary generation failed: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def _create_highlights_prompt(self, moments_json: str, facts_json: str, language: str) -> str:
+        """Creates the prompt for a highlights reel: a short game summary plus commentary on selected moments only."""
+
+        return f"""
+        You are an expert, charismatic chess commentator presenting a HIGHLIGHTS reel of a finished game.
+        I will provide facts about the whole game and a JSON array of its most important moments
+        (in game order, with many quiet moves in between left out).
+
+        Your task, in the following language: {language}:
+        - Write a 2-3 sentence "summary" that introduces the game and its turning points.
+        - Write commentary for EACH moment, bridging naturally over the moves that were skipped.
+
+        RULES:
+        1.  'highlight_reasons' says why a moment was picked (e.g. a big evaluation swing, a check, a capture).
+        2.  Analyze the 'evaluation' and 'best_engine_move' to determine the move quality.
+        3.  A move is a "Blunder" if it significantly worsens the evaluation.
+        4.  A move is "Brilliant" if it's the best move and not obvious.
+        5.  A move is "Good" or "Inaccuracy" otherwise.
+        6.  Commentary for each moment should be 1-2 sentences long.
+        7.  The 'move_quality' field must be one of: "Brilliant", "Good", "Inaccuracy", "Blunder", "Checkmate".
+
+        GAME FACTS:
+        {facts_json}
+
+        MOMENTS:
+        {moments_json}
+
+        Respond with ONLY a valid JSON object with two keys: "summary" (a string) and "moments"
+        (an array with exactly one object per input moment, each containing ONLY "commentary" and "move_quality").
+
+        EXAMPLE RESPONSE:
+        {{
+          "summary": "A sharp Sicilian that turned on a single tactical oversight in the middlegame.",
+          "moments": [
+            {{
+              "commentary": "Black grabs the pawn on e4, but it leaves the king dangerously exposed.",
+              "move_quality": "Inaccuracy"
+            }}
+          ]
+        }}
+        """
+
+    def generate_highlights_commentary(self, moments: list, facts: dict, language: str = "English", cancel_token=None):
+        """
+        Generates a game summary and commentary for the selected highlight moments (see src/highlights.py)
+        in one API call. Returns (moments with commentary, summary), or (None, None) on failure.
+        """
+        if not self.model:
+            print("❌ Cannot generate commentary, Gemini model not loaded.")
+            return None, None
+
+        print(f"🔄 Generating highlights commentary for {len(moments)} moments in {language}...")
+        try:
+            moments_json = json.dumps([
+                {
+                    'move_number': move.get('move_number'),
+                    'player': move.get('player'),
+                    'move_san': move.get('move_san'),
+                    'evaluation': self._format_evaluation(move.get('evaluation')),
+                    'best_engine_move': move.get('best_move'),
+                    'highlight_reasons': move.get('highlight_reasons', [])
+                } for move in moments
+            ], indent=2)
+
+            prompt = self._create_highlights_prompt(moments_json, json.dumps(facts, indent=2), language)
+            # The summary costs about as much as two moments
+            response = self.client.generate(prompt, expected_output_tokens=OUTPUT_TOKENS_PER_MOVE * (len(moments) + 2),
+                                            cancel_token=cancel_token)
+
+            cleaned_response = response.text.strip().replace("`", "").replace("json", "")
+            json_start = cleaned_response.find('{')
+            json_end = cleaned_response.rfind('}') + 1
+            if json_start == -1 or json_end == 0:
+                raise ValueError("No valid JSON object found in API response.")
+            result = json.loads(cleaned_response[json_start:json_end])
+
+            commentary_data_list = result.get('moments', [])
+            if len(commentary_data_list) != len(moments):
+                print(f"❌ API Error: Input had {len(moments)} moments, but output had {len(commentary_data_list)} commentaries.")
+                return None, None
+            for move_analysis, commentary_data in zip(moments, commentary_data_list):
+                move_analysis.update(commentary_data)
+            print("✅ Highlights commentary generated.")
+            return moments, (result.get('summary') or '').strip()
+
+        except JobCancelled:
+            raise
+        except Exception as e:
+            if cancel_token is not None and cancel_token.cancelled:
+                raise cancel_token.exception() from e
+            print(f"❌ Highlights commentary generation failed: {e}")
+            return None, None
@@ -19,6 +19,13 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     print("⚠️  WARNING: GEMINI_API_KEY is not set.")
 
+# Optional override of the Gemini API host, e.g. http://127.0.0.1:8765 for the mock in mocks/gemini_server.py
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+# chess.com public API base URL; override with the mock in mocks/chesscom_server.py for load tests
+CHESS_COM_API_BASE = os.getenv("CHESS_COM_API_BASE", "https://api.chess.com/pub").rstrip("/")
+CHESS_COM_TIMEOUT = float(os.getenv("CHESS_COM_TIMEOUT", "15"))
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
@@ -49,12 +56,148 @@ else:
     if system_os != "Windows":
         os.chmod(STOCKFISH_PATH, 0o755)
 
+# --- Engine Supervision ---
+# Wall-clock deadline per Stockfish search; a hung engine is killed and respawned.
+ENGINE_SEARCH_TIMEOUT = float(os.getenv("ENGINE_SEARCH_TIMEOUT", "30"))
+ENGINE_MAX_RETRIES = int(os.getenv("ENGINE_MAX_RETRIES", "1"))
+
+# --- Endgame Tablebases ---
+# Directories with Syzygy .rtbw/.rtbz files (separated by os.pathsep). Positions with few enough
+# pieces are answered from the tables instead of a Stockfish search. Unset = disabled.
+SYZYGY_PATH = os.getenv("SYZYGY_PATH")
+
+# --- Gemini Client ---
+# Per-process quota (the free tier allows ~10 requests and 250k tokens per minute for flash models),
+# concurrent calls, retries with jittered exponential backoff, and per-call / overall deadlines.
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "10"))
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "250000"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_CALL_TIMEOUT = float(os.getenv("GEMINI_CALL_TIMEOUT", "60"))
+GEMINI_DEADLINE = float(os.getenv("GEMINI_DEADLINE", "180"))
+
+# --- Position Analysis ---
+# Warm engines behind /api/v1/analyze-position, and the position cache they share with game analysis.
+POSITION_ENGINES = int(os.getenv("POSITION_ENGINES", "2"))
+POSITION_ENGINE_HASH_MB = int(os.getenv("POSITION_ENGINE_HASH_MB", "64"))
+POSITION_CACHE_SIZE = int(os.getenv("POSITION_CACHE_SIZE", "100000"))
+POSITION_DEFAULT_DEPTH = int(os.getenv("POSITION_DEFAULT_DEPTH", "15")) # Same as game analysis, so those results are reused
+POSITION_MAX_DEPTH = int(os.getenv("POSITION_MAX_DEPTH", "24"))
+POSITION_MAX_TIME_MS = int(os.getenv("POSITION_MAX_TIME_MS", "3000"))
+POSITION_BATCH_MAX = int(os.getenv("POSITION_BATCH_MAX", "64"))
+
 # --- Model Names ---
 TTS_MODEL_NAME = "./tts_cache/tts_models--multilingual--multi-dataset--xtts_v2"
 
+# --- TTS Segment Cache ---
+# Synthesized sentences are cached on disk and reused across jobs (bounded LRU).
+TTS_SEGMENT_CACHE_DIR = os.getenv("TTS_SEGMENT_CACHE_DIR", str(BACKEND_ROOT / "output" / "tts_segments"))
+TTS_SEGMENT_CACHE_MAX_MB = int(os.getenv("TTS_SEGMENT_CACHE_MAX_MB", "512"))
+
+# --- Analysis Store ---
+# Per-ply analysis and commentary are cached by move-sequence prefix (in memory, LRU).
+ANALYSIS_STORE_MAX_PLIES = int(os.getenv("ANALYSIS_STORE_MAX_PLIES", "200000"))
+
+# --- Commentary Languages ---
+# Full language name (sent to Gemini) -> language code (used by XTTS)
+LANGUAGE_CODES = {"English": "en", "Spanish": "es", "French": "fr", "German": "de"}
+
+# --- Highlights Mode ---
+# Moments narrated by highlights jobs (plus a short game summary), instead of every ply
+HIGHLIGHTS_TOP_K = int(os.getenv("HIGHLIGHTS_TOP_K", "8"))
+
+# --- Multi-language Jobs ---
+# XTTS model instances used to synthesize several languages at once (each one costs ~2 GB of RAM)
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "1"))
+
+# --- Video Rendering ---
+# Board-animation videos muxed with the commentary audio (needs ffmpeg on the PATH).
+VIDEO_TEMPLATE_DIR = os.getenv("VIDEO_TEMPLATE_DIR", str(BACKEND_ROOT / "input" / "templates"))
+VIDEO_OUTPUT_DIR = os.getenv("VIDEO_OUTPUT_DIR", str(BACKEND_ROOT / "output" / "combined" / "final_videos"))
+VIDEO_BOARD_SIZE = int(os.getenv("VIDEO_BOARD_SIZE", "720"))
+VIDEO_FPS = int(os.getenv("VIDEO_FPS", "25"))
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+VIDEO_FRAME_CACHE_SIZE = int(os.getenv("VIDEO_FRAME_CACHE_SIZE", "256"))
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+
+# --- Live Games ---
+# Each live session keeps its own warm Stockfish process, so cap how many can run at once.
+LIVE_MAX_SESSIONS = int(os.getenv("LIVE_MAX_SESSIONS", "4"))
+LIVE_CONTEXT_MOVES = int(os.getenv("LIVE_CONTEXT_MOVES", "6"))
+
+# --- Job Scheduling ---
+# There is a single pipeline, so by default one job runs at a time.
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "1"))
+SCHEDULER_PER_USER_CONCURRENCY = int(os.getenv("SCHEDULER_PER_USER_CONCURRENCY", "1"))
+SCHEDULER_PER_USER_QUEUE = int(os.getenv("SCHEDULER_PER_USER_QUEUE", "3"))
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "20"))
+# Jobs still unfinished this long after they were submitted (queue time included) are cancelled; 0 = no deadline
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "900"))
+
+# --- Game Prefetching ---
+# When a user's chess.com archives are fetched, their newest games are analyzed in the background
+# while no interactive job is running, so clicking one of them reuses the cached analysis.
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_GAMES_PER_USER = int(os.getenv("PREFETCH_GAMES_PER_USER", "3"))
+PREFETCH_MAX_QUEUE = int(os.getenv("PREFETCH_MAX_QUEUE", "50"))
+PREFETCH_COMMENTARY = os.getenv("PREFETCH_COMMENTARY", "0") == "1"  # Also pre-generate commentary (uses Gemini quota)
+PREFETCH_LANGUAGE = os.getenv("PREFETCH_LANGUAGE", "English")
+PREFETCH_IDLE_SECONDS = float(os.getenv("PREFETCH_IDLE_SECONDS", "2"))  # Quiet time required before starting a game
+
+# --- Upload Outbox ---
+# Finished jobs are recorded in a local SQLite outbox; a background task uploads the audio
+# to Supabase Storage and inserts the recordings rows in batches, with retries.
+OUTBOX_DB_PATH = os.getenv("OUTBOX_DB_PATH", str(BACKEND_ROOT / "output" / "outbox.sqlite3"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_UPLOAD_CONCURRENCY = int(os.getenv("OUTBOX_UPLOAD_CONCURRENCY", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+OUTBOX_RETENTION_HOURS = float(os.getenv("OUTBOX_RETENTION_HOURS", "24"))
+
+# --- Profiling ---
+# Off by default; toggled at runtime via /api/v1/admin/profiling. When on, PROFILING_SAMPLE_RATE of
+# pipeline runs get per-stage spans and stack samples written to PROFILE_OUTPUT_DIR.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.05"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", str(BACKEND_ROOT / "output" / "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+
+# Required in the X-Admin-Token header of /api/v1/admin/* requests. If unset, only local clients are allowed.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
 # --- System Settings ---
 DEVICE = os.getenv("TTS_DEVICE", "cpu")
 
+# --- TTS CPU Optimization ---
+# Opt-in fast CPU mode: inference_mode, explicit thread counts, int8 dynamic quantization
+# of the GPT's linear layers, and (optionally) torch.compile of the vocoder.
+# Thread counts of 0 keep PyTorch's defaults.
+TTS_FAST_CPU = os.getenv("TTS_FAST_CPU", "0") == "1"
+TTS_INTRA_OP_THREADS = int(os.getenv("TTS_INTRA_OP_THREADS", "0"))
+TTS_INTER_OP_THREADS = int(os.getenv("TTS_INTER_OP_THREADS", "1"))
+TTS_QUANTIZE = os.getenv("TTS_QUANTIZE", "1") == "1"
+TTS_COMPILE = os.getenv("TTS_COMPILE", "0") == "1"
+
+# --- Resource Autotuning ---
+# Splits the CPUs and memory available to this process (cgroup limits included) between the
+# analysis Stockfish and torch, so the two don't oversubscribe the cores (see src/resources.py).
+# Explicit STOCKFISH_THREADS / STOCKFISH_HASH_MB / TTS_INTRA_OP_THREADS values win over the plan.
+RESOURCE_AUTOTUNE = os.getenv("RESOURCE_AUTOTUNE", "1") == "1"
+RESOURCE_PROCESSES = int(os.getenv("WEB_CONCURRENCY", "1"))  # Server processes sharing the machine
+RESOURCE_RESERVED_CPUS = int(os.getenv("RESOURCE_RESERVED_CPUS", "1"))  # Left for the event loop, ffmpeg, etc.
+RESOURCE_ENGINE_SHARE = float(os.getenv("RESOURCE_ENGINE_SHARE", "0.5"))  # Fraction of the usable CPUs for Stockfish
+RESOURCE_HASH_FRACTION = float(os.getenv("RESOURCE_HASH_FRACTION", "0.25"))  # Of the memory left after the TTS models
+STOCKFISH_THREADS = int(os.getenv("STOCKFISH_THREADS", "0"))  # 0 = from the plan
+STOCKFISH_HASH_MB = int(os.getenv("STOCKFISH_HASH_MB", "0"))  # 0 = from the plan
+
+# --- Shared TTS Weights ---
+# Opt-in: load XTTS weights memory-mapped from an exported state_dict (created on first use),
+# so several uvicorn workers (and TTS_WORKERS models) share one copy in the page cache.
+# Int8 quantization is skipped in this mode, since it would make private copies of the weights.
+TTS_SHARED_WEIGHTS = os.getenv("TTS_SHARED_WEIGHTS", "0") == "1"
+TTS_SHARED_WEIGHTS_PATH = os.getenv("TTS_SHARED_WEIGHTS_PATH") # Defaults to model_mmap.pt in the model folder
+
 print("✅ Configuration loaded.")
 print(f"   - OS Detected: {system_os}")
 print(f"   - Stockfish Path: {STOCKFISH_PATH}")
\ No newline at end of file
@@ -0,0 +1,280 @@
+"""
+Sharded, resumable engine analysis for large PGN corpora.
+
+The work queue is a SQLite file in a shared directory. Any number of worker
+processes, on one machine or several, claim shards from it, checkpoint after
+every game, and write one .npz AnalysisTable per game under
+<out>/shard=NNNNNN/. A worker that crashes loses at most the game in progress:
+its lease expires and another worker resumes the shard from its checkpoint.
+
+Usage (from the chess_ai_commentary folder):
+    python -m src.corpus_runner plan   --queue corpus.sqlite --games-per-shard 500 games/*.pgn
+    python -m src.corpus_runner work   --queue corpus.sqlite --out analysis/ --processes 4
+    python -m src.corpus_runner status --queue corpus.sqlite
+"""
+import os
+import io
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import multiprocessing
+import chess.pgn
+from src.analysis_table import AnalysisTable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER NOT NULL,
+    num_games INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    heartbeat REAL,
+    games_done INTEGER NOT NULL DEFAULT 0,
+    games_failed INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+)
+"""
+
+def connect(queue_path: str) -> sqlite3.Connection:
+    """Opens the work queue. Uses the default rollback journal, which works on network filesystems (WAL does not)."""
+    conn = sqlite3.connect(queue_path, timeout=60, isolation_level=None)
+    conn.execute(SCHEMA)
+    return conn
+
+def scan_game_offsets(data: bytes) -> list:
+    """Returns the byte offset of every game in a PGN buffer (a game starts at its first header line)."""
+    offsets = []
+    in_headers = False
+    position = 0
+    for line in data.splitlines(keepends=True):
+        if line.startswith(b"[") and not line.startswith(b"[%"):
+            if not in_headers:
+                offsets.append(position)
+                in_headers = True
+        elif line.strip():
+            in_headers = False
+        position += len(line)
+    return offsets
+
+def plan_shards(queue_path: str, pgn_paths: list, games_per_shard: int = 500) -> int:
+    """Splits PGN files into shards of consecutive games and adds them to the queue. Returns the shard count."""
+    conn = connect(queue_path)
+    total = 0
+    for path in pgn_paths:
+        path = os.path.abspath(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        offsets = scan_game_offsets(data)
+        rows = []
+        for first in range(0, len(offsets), games_per_shard):
+            chunk = offsets[first:first + games_per_shard]
+            end = offsets[first + games_per_shard] if first + games_per_shard < len(offsets) else len(data)
+            rows.append((path, chunk[0], end, len(chunk)))
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("INSERT INTO shards (path, start_offset, end_offset, num_games) VALUES (?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+        print(f"✅ Planned {len(rows)} shards ({len(offsets)} games) from {os.path.basename(path)}")
+        total += len(rows)
+    conn.close()
+    return total
+
+class LeaseLost(Exception):
+    """Raised when a worker finds its shard was reclaimed by another worker after its lease expired."""
+
+def claim_shard(conn: sqlite3.Connection, worker_id: str, lease_seconds: float, max_attempts: int):
+    """
+    Atomically claims a pending shard, or one whose worker stopped heartbeating. Returns its row or None.
+    An expired shard whose attempts are used up (its last worker died without reporting) is marked 'failed'.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            """UPDATE shards SET status = 'failed', error = COALESCE(error, 'lease expired on the last attempt')
+               WHERE status = 'running' AND heartbeat < ? AND attempts >= ?""",
+            (now - lease_seconds, max_attempts)
+        )
+        row = conn.execute(
+            """SELECT id, path, start_offset, end_offset, num_games, games_done, games_failed FROM shards
+               WHERE (status = 'pending' OR (status = 'running' AND heartbeat < ?)) AND attempts < ?
+               ORDER BY id LIMIT 1""",
+            (now - lease_seconds, max_attempts)
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE shards SET status = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker_id, now, row[0])
+            )
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def _write_atomic(path: str, write):
+    """Writes via a temp file and rename, so readers and resumed workers never see partial output."""
+    base, ext = os.path.splitext(path)
+    tmp_path = f"{base}.{os.getpid()}.tmp{ext}" # Keep the extension: np.savez appends ".npz" otherwise
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def _write_json(path: str, value):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+
+def _renew_lease(conn: sqlite3.Connection, shard_id: int, worker_id: str):
+    """Refreshes the shard's heartbeat, or raises LeaseLost if another worker has taken it over."""
+    updated = conn.execute(
+        "UPDATE shards SET heartbeat = ? WHERE id = ? AND worker = ? AND status = 'running'",
+        (time.time(), shard_id, worker_id)
+    ).rowcount
+    if not updated:
+        raise LeaseLost(f"shard {shard_id} was reclaimed by another worker")
+
+def process_shard(conn, analyzer, shard, out_dir: str, worker_id: str):
+    """
+    Analyzes the games of one shard, resuming after the last checkpointed game.
+    The lease is renewed right before each game's output is written, so a worker whose
+    shard was reclaimed while it was analyzing stops instead of writing over the new owner.
+    """
+    shard_id, path, start, end, num_games, games_done, games_failed = shard
+    shard_dir = os.path.join(out_dir, f"shard={shard_id:06d}")
+    os.makedirs(shard_dir, exist_ok=True)
+
+    manifest_path = os.path.join(shard_dir, "manifest.json")
+    manifest = []
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = [entry for entry in json.load(f) if entry["game"] < games_done]
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    offsets = scan_game_offsets(data) + [len(data)]
+
+    if games_done:
+        print(f"   ↩️ Resuming shard {shard_id} at game {games_done + 1}/{num_games}")
+
+    for game_index in range(games_done, num_games):
+        pgn_text = data[offsets[game_index]:offsets[game_index + 1]].decode("utf-8", errors="replace")
+        headers = chess.pgn.read_headers(io.StringIO(pgn_text))
+        results = analyzer.analyze_game(pgn_text)
+        _renew_lease(conn, shard_id, worker_id)
+
+        entry = {
+            "game": game_index,
+            "white": headers.get("White") if headers else None,
+            "black": headers.get("Black") if headers else None,
+            "result": headers.get("Result") if headers else None,
+            "plies": len(results),
+        }
+        if results:
+            table = AnalysisTable.from_results(results)
+            game_path = os.path.join(shard_dir, f"game={game_index:06d}.npz")
+            _write_atomic(game_path, table.save)
+            entry["file"] = os.path.basename(game_path)
+        else:
+            games_failed += 1
+            entry["error"] = "analysis failed"
+        manifest.append(entry)
+        _write_atomic(manifest_path, lambda tmp: _write_json(tmp, manifest))
+
+        # Checkpoint: this game is done, and we are still alive
+        checkpointed = conn.execute(
+            "UPDATE shards SET games_done = ?, games_failed = ?, heartbeat = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (game_index + 1, games_failed, time.time(), shard_id, worker_id)
+        ).rowcount
+        if not checkpointed:
+            raise LeaseLost(f"shard {shard_id} was reclaimed by another worker")
+
+    done = conn.execute(
+        "UPDATE shards SET status = 'done', heartbeat = ? WHERE id = ? AND worker = ? AND status = 'running'",
+        (time.time(), shard_id, worker_id)
+    ).rowcount
+    if not done:
+        raise LeaseLost(f"shard {shard_id} was reclaimed by another worker")
+    print(f"✅ Shard {shard_id} done ({num_games} games, {games_failed} failed)")
+
+def run_worker(queue_path: str, out_dir: str, worker_id: str = None, lease_seconds: float = 900, max_attempts: int = 3):
+    """Claims and processes shards until none are left."""
+    # Imported here so planning and status checks don't need Stockfish configured
+    from src.config import STOCKFISH_PATH
+    from src.chess_analyzer import ChessAnalyzer
+
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    conn = connect(queue_path)
+    analyzer = ChessAnalyzer(STOCKFISH_PATH)
+    print(f"👷 Worker {worker_id} started.")
+    try:
+        while True:
+            shard = claim_shard(conn, worker_id, lease_seconds, max_attempts)
+            if not shard:
+                break
+            try:
+                process_shard(conn, analyzer, shard, out_dir, worker_id)
+            except LeaseLost as e:
+                print(f"⚠️ Worker {worker_id} lost its lease: {e}; leaving the shard to its new owner.")
+            except Exception as e:
+                print(f"❌ Shard {shard[0]} failed on {worker_id}: {e}")
+                conn.execute(
+                    "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, error = ? WHERE id = ? AND worker = ?",
+                    (max_attempts, str(e), shard[0], worker_id)
+                )
+    finally:
+        analyzer.close()
+        conn.close()
+    print(f"🏁 Worker {worker_id} found no more shards.")
+
+def queue_status(queue_path: str) -> dict:
+    """Returns shard counts by status and overall game progress."""
+    conn = connect(queue_path)
+    by_status = dict(conn.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall())
+    games_total, games_done, games_failed = conn.execute(
+        "SELECT COALESCE(SUM(num_games), 0), COALESCE(SUM(games_done), 0), COALESCE(SUM(games_failed), 0) FROM shards"
+    ).fetchone()
+    conn.close()
+    return {"shards": by_status, "games_total": games_total, "games_done": games_done, "games_failed": games_failed}
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded, resumable Stockfish analysis of PGN corpora.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="Split PGN files into shards and add them to the queue.")
+    plan.add_argument("--queue", required=True)
+    plan.add_argument("--games-per-shard", type=int, default=500)
+    plan.add_argument("pgn_files", nargs="+")
+
+    work = commands.add_parser("work", help="Process shards until the queue is empty.")
+    work.add_argument("--queue", required=True)
+    work.add_argument("--out", required=True)
+    work.add_argument("--processes", type=int, default=1, help="Local worker processes (each stands in for a node).")
+    work.add_argument("--lease-seconds", type=float, default=900)
+    work.add_argument("--max-attempts", type=int, default=3)
+
+    status = commands.add_parser("status", help="Show queue progress.")
+    status.add_argument("--queue", required=True)
+
+    args = parser.parse_args()
+    if args.command == "plan":
+        plan_shards(args.queue, args.pgn_files, args.games_per_shard)
+    elif args.command == "work":
+        os.makedirs(args.out, exist_ok=True)
+        worker_args = (args.queue, args.out, None, args.lease_seconds, args.max_attempts)
+        if args.processes == 1:
+            run_worker(*worker_args)
+        else:
+            processes = [multiprocessing.Process(target=run_worker, args=worker_args) for _ in range(args.processes)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+    else:
+        print(json.dumps(queue_status(args.queue), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from stockfish import Stockfish
+
+# How often a running search checks its cancellation token, and how long a stopped search
+# may take to return its (discarded) result before the engine is killed instead
+CANCEL_POLL_SECONDS = 0.05
+STOP_GRACE_SECONDS = 1.0
+
+class EngineUnavailable(Exception):
+    """Raised when a search could not be completed even after restarting the engine."""
+
+class EngineSupervisor:
+    """
+    Owns one Stockfish process and runs every search against a wall-clock deadline.
+    A search that hangs gets its process killed. A process that dies is detected
+    before the next search. In both cases a fresh engine is spawned with the same
+    parameters and the search is retried. Counters are kept for monitoring.
+    """
+
+    def __init__(self, stockfish_path: str, parameters: dict = None, search_timeout: float = 30.0, max_retries: int = 1):
+        """Spawns the engine. If spawning fails, the supervisor retries on the next search."""
+        self.stockfish_path = stockfish_path
+        self.parameters = parameters or {}
+        self.search_timeout = search_timeout
+        self.max_retries = max_retries
+        self.engine = None
+
+        self._lock = threading.Lock() # One search at a time per engine
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stockfish")
+        self.stats = {'searches': 0, 'timeouts': 0, 'crashes': 0, 'retries': 0, 'restarts': 0, 'failures': 0, 'cancelled': 0}
+
+        self._spawn()
+
+    def _spawn(self) -> bool:
+        """Starts a fresh engine process (resetting all engine state). Returns True on success."""
+        self._kill()
+        future = self._executor.submit(self._start_engine)
+        try:
+            self.engine = future.result(timeout=self.search_timeout)
+            return True
+        except FutureTimeout:
+            print(f"❌ Stockfish did not start within {self.search_timeout:.0f}s.")
+            self._replace_executor()
+        except Exception as e:
+            print(f"❌ Stockfish failed to start: {e}")
+        self.engine = None
+        return False
+
+    def _start_engine(self) -> Stockfish:
+        engine = Stockfish(path=self.stockfish_path, parameters=self.parameters)
+        # Newer versions of the stockfish package report evaluations from the side to move's view;
+        # everything downstream (commentary, highlights, the eval bar) expects White's
+        if hasattr(engine, 'set_turn_perspective'):
+            engine.set_turn_perspective(False)
+        return engine
+
+    def _kill(self):
+        """Kills the current engine process without waiting for it to respond."""
+        if self.engine is None:
+            return
+        process = getattr(self.engine, '_stockfish', None)
+        if process is not None and process.poll() is None:
+            try:
+                process.kill()
+                process.wait(timeout=5)
+            except Exception as e:
+                print(f"⚠️ Could not kill Stockfish process: {e}")
+        self.engine = None
+
+    def _replace_executor(self):
+        """Abandons a worker thread that may still be blocked on a dead pipe."""
+        self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stockfish")
+
+    def is_alive(self) -> bool:
+        """Cheap health check: the process exists and has not exited."""
+        process = getattr(self.engine, '_stockfish', None)
+        return process is not None and process.poll() is None
+
+    def _restart(self, reason: str):
+        print(f"🔁 Restarting Stockfish ({reason})...")
+        self.stats['restarts'] += 1
+        self._spawn()
+
+    def _stop_search(self, future):
+        """
+        Interrupts a search that is no longer wanted: sends UCI "stop" (repeatedly, since one search
+        function may issue several "go" commands) until it returns, and kills the engine if it doesn't.
+        "stop" is written straight to the engine's stdin: the package's _put() first sends "isready"
+        and reads stdout, which would race the search thread for the engine's output.
+        """
+        process = getattr(self.engine, '_stockfish', None) if self.engine else None
+        stop_by = time.monotonic() + STOP_GRACE_SECONDS
+        while process is not None and not future.done() and time.monotonic() < stop_by:
+            try:
+                process.stdin.write("stop\n")
+                process.stdin.flush()
+            except Exception:
+                break
+            time.sleep(CANCEL_POLL_SECONDS)
+        try:
+            future.result(timeout=CANCEL_POLL_SECONDS)
+        except Exception:
+            self._kill()
+            self._replace_executor()
+            self._restart("cancelled search did not stop")
+
+    def _wait(self, future, timeout: float, cancel_token=None):
+        """future.result(timeout), polling cancel_token meanwhile. Raises the token's JobCancelled after stopping the search."""
+        if cancel_token is None:
+            return future.result(timeout=timeout)
+        deadline = time.monotonic() + timeout
+        while True:
+            if cancel_token.cancelled:
+                self.stats['cancelled'] += 1
+                self._stop_search(future)
+                raise cancel_token.exception()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise FutureTimeout()
+            try:
+                return future.result(timeout=min(CANCEL_POLL_SECONDS, remaining))
+            except FutureTimeout:
+                continue
+
+    def run(self, search, timeout: float = None, cancel_token=None):
+        """
+        Runs search(engine) with a deadline and returns its result.
+        With a cancel_token (src.cancellation), a cancelled job's search is stopped within
+        about CANCEL_POLL_SECONDS and the token's JobCancelled is raised.
+        ValueErrors (e.g. an invalid FEN) are the caller's fault and are re-raised as is.
+        Raises EngineUnavailable if every attempt timed out or crashed.
+        """
+        timeout = timeout or self.search_timeout
+        with self._lock:
+            self.stats['searches'] += 1
+            for attempt in range(self.max_retries + 1):
+                if cancel_token is not None:
+                    cancel_token.check()
+                if attempt > 0:
+                    self.stats['retries'] += 1
+                if not self.is_alive():
+                    self._restart("engine not running")
+                    if not self.engine:
+                        continue
+
+                future = self._executor.submit(search, self.engine)
+                try:
+                    return self._wait(future, timeout, cancel_token)
+                except FutureTimeout:
+                    self.stats['timeouts'] += 1
+                    print(f"⏱️ Stockfish search exceeded {timeout:.0f}s deadline.")
+                    self._kill() # Unblocks the worker thread's pending read
+                    self._replace_executor()
+                    self._restart("search timeout")
+                except ValueError:
+                    raise
+                except Exception as e:
+                    if cancel_token is not None and cancel_token.cancelled:
+                        raise
+                    self.stats['crashes'] += 1
+                    print(f"⚠️ Stockfish search failed: {e}")
+                    self._restart("engine error")
+
+            self.stats['failures'] += 1
+            raise EngineUnavailable(f"Search failed after {self.max_retries + 1} attempts")
+
+    def get_stats(self) -> dict:
+        """Returns search/timeout/restart counters and whether the engine is currently up."""
+        return dict(self.stats, alive=self.is_alive())
+
+    def close(self):
+        """Stops the engine and its worker thread."""
+        with self._lock:
+            if self.engine is not None and self.is_alive():
+                try:
+                    self._executor.submit(self.engine.send_quit_command).result(timeout=5)
+                except Exception:
+                    pass
+            self._kill()
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,137 @@
+import math
+import chess
+from src.config import HIGHLIGHTS_TOP_K
+
+# Win probability from centipawns (White's point of view), the logistic curve Lichess fits to game results.
+# A 300cp swing in a level position moves it a lot; the same swing at +900 barely moves it.
+WIN_PROBABILITY_SCALE = 0.00368208
+
+# Score bonuses on top of the win-probability swing (0-100 points for a swing from certain loss to certain win)
+BONUS_MATE = 60
+BONUS_PROMOTION = 15
+BONUS_PHASE_CHANGE = 12
+BONUS_CHECK = 8
+BONUS_CAPTURE = 6
+
+# Non-pawn material (N/B = 3, R = 5, Q = 9, both sides; 62 at the start) that marks the phase boundaries
+MIDDLEGAME_MATERIAL = 54   # Below this, pieces have started coming off
+ENDGAME_MATERIAL = 26      # At or below this, it's an endgame
+OPENING_PLIES = 24         # The opening is over by this ply at the latest
+
+_PIECE_VALUES = {chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9}
+
+
+def win_probability(evaluation: dict, fen: str = None) -> float:
+    """
+    White's chance of winning (0-1) for an evaluation dict ({'type': 'cp'|'mate', 'value': ...}, White's view).
+    Mate 0 means the side to move is checkmated, so its sign comes from the position's FEN.
+    """
+    if not evaluation:
+        return 0.5
+    if 'wdl' in evaluation:
+        # Tablebase result; cursed wins and blessed losses are draws under the 50-move rule
+        return 1.0 if evaluation['wdl'] == 2 else 0.0 if evaluation['wdl'] == -2 else 0.5
+    if evaluation['type'] == 'mate':
+        value = evaluation['value']
+        if value == 0:
+            return 0.5 if not fen else 0.0 if fen.split(' ')[1] == 'w' else 1.0
+        return 1.0 if value > 0 else 0.0
+    return 1 / (1 + math.exp(-WIN_PROBABILITY_SCALE * evaluation['value']))
+
+
+def game_phase(board: chess.Board, ply: int) -> str:
+    """'opening', 'middlegame' or 'endgame' from the material left on the board."""
+    material = sum(value * len(board.pieces(piece, color))
+                   for piece, value in _PIECE_VALUES.items() for color in chess.COLORS)
+    if material <= ENDGAME_MATERIAL:
+        return 'endgame'
+    if material < MIDDLEGAME_MATERIAL or ply > OPENING_PLIES:
+        return 'middlegame'
+    return 'opening'
+
+
+def score_moves(analysis_results: list) -> list:
+    """
+    Scores every ply of an analyze_game / analyze_game_tree result for how much it is worth narrating.
+    Returns one {'index', 'score', 'reasons', 'swing', 'phase'} dict per ply, in game order.
+    Evaluations are White's view (as ChessAnalyzer returns them); checks and mates are read
+    from the position after the move, not from the SAN suffix.
+    """
+    scored = []
+    previous_probability = 0.5
+    previous_phase = 'opening'
+    for index, move in enumerate(analysis_results):
+        board = chess.Board(move['fen']) if move.get('fen') else None
+        probability = win_probability(move.get('evaluation'), move.get('fen'))
+        swing = abs(probability - previous_probability)
+        san = move.get('move_san') or ''
+        phase = game_phase(board, move.get('move_number') or index + 1) if board else previous_phase
+
+        score = 100 * swing
+        reasons = []
+        if swing >= 0.15:
+            reasons.append('swing')
+        if board and board.is_checkmate():
+            score += BONUS_MATE
+            reasons.append('checkmate')
+        elif board and board.is_check():
+            score += BONUS_CHECK
+            reasons.append('check')
+        if 'x' in san:
+            score += BONUS_CAPTURE
+            reasons.append('capture')
+        if '=' in san:
+            score += BONUS_PROMOTION
+            reasons.append('promotion')
+        if phase != previous_phase:
+            score += BONUS_PHASE_CHANGE
+            reasons.append(f'{phase} begins')
+
+        scored.append({'index': index, 'score': round(score, 2), 'reasons': reasons, 'swing': round(swing, 3), 'phase': phase})
+        previous_probability = probability
+        previous_phase = phase
+    return scored
+
+
+def select_highlights(analysis_results: list, top_k: int = HIGHLIGHTS_TOP_K) -> dict:
+    """
+    Picks the top_k most important plies of a game for highlights narration.
+    The last move is always kept so the narration reaches the result. Returns
+    {'moments': [...], 'facts': {...}}: the chosen analysis dicts in game order (copies, with
+    'highlight_score' and 'highlight_reasons' added) and facts for the game summary.
+    """
+    if not analysis_results:
+        return {'moments': [], 'facts': {}}
+
+    scored = score_moves(analysis_results)
+    last = scored[-1]
+    chosen = sorted(scored[:-1], key=lambda entry: entry['score'], reverse=True)[:max(0, top_k - 1)]
+    chosen = sorted(chosen + [last], key=lambda entry: entry['index'])
+
+    moments = []
+    for entry in chosen:
+        moment = dict(analysis_results[entry['index']])
+        moment['highlight_score'] = entry['score']
+        moment['highlight_reasons'] = entry['reasons'] or (['final position'] if entry is last else [])
+        moments.append(moment)
+
+    biggest = max(scored, key=lambda entry: entry['swing'])
+    phase_starts = {}
+    for entry in scored:
+        phase_starts.setdefault(entry['phase'], analysis_results[entry['index']].get('move_number'))
+    final = analysis_results[-1]
+    facts = {
+        'total_plies': len(analysis_results),
+        'final_move': final.get('move_san'),
+        'ended_in_checkmate': 'checkmate' in scored[-1]['reasons'],
+        'final_win_probability_white': round(win_probability(final.get('evaluation'), final.get('fen')), 2),
+        'phase_starts': phase_starts,
+        'biggest_swing': {
+            'move_number': analysis_results[biggest['index']].get('move_number'),
+            'player': analysis_results[biggest['index']].get('player'),
+            'move_san': analysis_results[biggest['index']].get('move_san'),
+            'swing': biggest['swing'],
+        },
+    }
+    print(f"✨ Selected {len(moments)}/{len(analysis_results)} moments for highlights.")
+    return {'moments': moments, 'facts': facts}
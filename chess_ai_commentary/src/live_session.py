@@ -0,0 +1,113 @@
+import os
+import time
+import uuid
+from collections import deque
+import chess
+from src.chess_analyzer import ChessAnalyzer
+from src.commentary_generator import CommentaryGenerator
+from src.voice_generator import VoiceGenerator
+from src.config import LANGUAGE_CODES
+
+class LiveGameSession:
+    """
+    Narrates a game while it is being played, one move at a time.
+    Keeps a persistent board and its own warm Stockfish process for the
+    whole session, so each new move only costs one position search,
+    one short Gemini call and one short TTS segment.
+    """
+
+    def __init__(self, analyzer: ChessAnalyzer, commentary_gen: CommentaryGenerator, voice_gen: VoiceGenerator,
+                 language_choice: str = "English", speaker_wav_path: str = None,
+                 starting_fen: str = None, context_moves: int = 6, output_dir: str = "../output/audio/live"):
+        """Initializes a live session. The analyzer is owned by the session and closed with it."""
+        self.session_id = uuid.uuid4().hex
+        self.analyzer = analyzer
+        self.commentary_generator = commentary_gen
+        self.voice_generator = voice_gen
+        self.language_choice = language_choice
+        self.language_code = LANGUAGE_CODES.get(language_choice, "en")
+        self.speaker_wav_path = speaker_wav_path or os.path.join(os.getcwd(), "default_voice.wav")
+        self.output_dir = output_dir
+
+        self.board = chess.Board(starting_fen) if starting_fen else chess.Board()
+        self.context = deque(maxlen=context_moves) # Rolling window of recent commented moves
+        self.moves_played = 0
+        self.last_activity = time.time()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        print(f"✅ Live session {self.session_id[:8]} started.")
+
+    def _parse_move(self, move_text: str) -> chess.Move:
+        """Accepts SAN ('Nf3') or UCI ('g1f3'). Raises ValueError for illegal or unparsable moves."""
+        move_text = move_text.strip()
+        try:
+            return self.board.parse_san(move_text)
+        except ValueError:
+            pass
+        try:
+            move = chess.Move.from_uci(move_text)
+        except ValueError:
+            raise ValueError(f"Could not parse move: {move_text}")
+        if move not in self.board.legal_moves:
+            raise ValueError(f"Illegal move in current position: {move_text}")
+        return move
+
+    def push_move(self, move_text: str) -> dict:
+        """
+        Plays one move, analyzes the new position, narrates it and synthesizes its audio.
+        Returns the move analysis with 'commentary', 'audio_path' and per-stage 'timings' (ms).
+        Raises ValueError if the move is not legal; stages that fail leave their fields empty.
+        """
+        self.last_activity = time.time()
+        move = self._parse_move(move_text)
+        timings = {}
+        start_time = time.perf_counter()
+
+        # 1. Analyze only the new position (the engine's hash stays warm between moves)
+        move_analysis = self.analyzer.analyze_move(self.board, move, move_number=self.moves_played + 1)
+        self.moves_played += 1
+        timings['analysis_ms'] = round((time.perf_counter() - start_time) * 1000, 1)
+        if not move_analysis:
+            # Keep narrating even if the engine failed for this move
+            move_analysis = {
+                'fen': self.board.fen(),
+                'move_number': self.moves_played,
+                'move_san': self.board.peek().uci(),
+                'player': 'White' if self.board.turn == chess.BLACK else 'Black',
+            }
+
+        # 2. Comment on this move with a rolling context window
+        stage_start = time.perf_counter()
+        commented = self.commentary_generator.generate_commentary_for_move(
+            move_analysis, list(self.context), language=self.language_choice
+        )
+        timings['commentary_ms'] = round((time.perf_counter() - stage_start) * 1000, 1)
+
+        # 3. Synthesize just this move's audio
+        move_analysis['audio_path'] = None
+        if commented and commented.get('commentary'):
+            self.context.append(commented)
+            stage_start = time.perf_counter()
+            output_path = os.path.join(self.output_dir, f"live_{self.session_id[:12]}_{self.moves_played:03d}.wav")
+            audio_path, _ = self.voice_generator.generate_timed_audio(
+                [commented['commentary']],
+                speaker_wav_path=self.speaker_wav_path,
+                language=self.language_code,
+                output_path=output_path
+            )
+            move_analysis['audio_path'] = audio_path
+            timings['tts_ms'] = round((time.perf_counter() - stage_start) * 1000, 1)
+
+        timings['total_ms'] = round((time.perf_counter() - start_time) * 1000, 1)
+        move_analysis['timings'] = timings
+        move_analysis['game_over'] = self.board.is_game_over()
+        print(f"   ⏱️ Live move {self.moves_played} ({move_analysis.get('move_san')}) narrated in {timings['total_ms']:.0f} ms.")
+        return move_analysis
+
+    def close(self):
+        """Stops the session's Stockfish process."""
+        try:
+            self.analyzer.close()
+        except Exception as e:
+            print(f"⚠️ Could not stop live session engine: {e}")
+        print(f"🛑 Live session {self.session_id[:8]} closed after {self.moves_played} moves.")
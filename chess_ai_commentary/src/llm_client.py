@@ -0,0 +1,219 @@
+import time
+import random
+import threading
+from collections import deque
+import requests
+from google.api_core import exceptions as google_exceptions
+from src.profiler import profiler
+from src.config import (
+    GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE, GEMINI_MAX_CONCURRENCY,
+    GEMINI_MAX_RETRIES, GEMINI_CALL_TIMEOUT, GEMINI_DEADLINE
+)
+
+# Errors worth another attempt: quota (429), overload (500/503), slow responses and dropped connections
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    requests.exceptions.Timeout,
+    requests.exceptions.ConnectionError,
+    TimeoutError,
+)
+RATE_LIMIT_ERRORS = (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted)
+TIMEOUT_ERRORS = (google_exceptions.DeadlineExceeded, requests.exceptions.Timeout, TimeoutError)
+
+
+class LLMDeadlineExceeded(Exception):
+    """Raised when a call could not complete (including waits and retries) before its deadline."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute` units per minute.
+    Used twice per client: once for requests and once for (estimated) prompt + response tokens.
+    """
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float, deadline: float) -> float:
+        """
+        Blocks until `amount` units are available and takes them. Returns the seconds spent waiting.
+        Requests larger than the bucket are capped to its capacity so they can't wait forever.
+        Raises LLMDeadlineExceeded if the wait would run past the deadline (time.monotonic() value).
+        """
+        amount = min(amount, self.capacity)
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    return time.monotonic() - started
+                wait = (amount - self.available) / self.rate
+            if time.monotonic() + wait > deadline:
+                raise LLMDeadlineExceeded("Rate limit wait would exceed the deadline")
+            time.sleep(min(wait, 1.0))
+
+    def debit(self, amount: float):
+        """Takes units without waiting (may go negative), e.g. when actual usage exceeded the estimate."""
+        with self._lock:
+            self._refill()
+            self.available -= amount
+
+
+class GeminiClient:
+    """
+    Wraps a google.generativeai GenerativeModel with the quota handling a shared server needs:
+    - a per-process token bucket for requests per minute and one for tokens per minute
+    - a cap on concurrent in-flight calls
+    - a timeout on each HTTP call and an overall deadline across waits and retries
+    - retries of 429 / 5xx / timeouts with full-jitter exponential backoff
+    - counters and latency percentiles for /api/v1/metrics
+    """
+
+    def __init__(self, model, requests_per_minute: int = GEMINI_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = GEMINI_TOKENS_PER_MINUTE, max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+                 max_retries: int = GEMINI_MAX_RETRIES, call_timeout: float = GEMINI_CALL_TIMEOUT,
+                 deadline: float = GEMINI_DEADLINE, base_backoff: float = 1.0, max_backoff: float = 30.0):
+        self.model = model
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.call_timeout = call_timeout
+        self.deadline = deadline
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=500)
+        self.stats = {
+            'calls': 0, 'attempts': 0, 'succeeded': 0, 'failed': 0, 'retries': 0,
+            'rate_limited': 0, 'timeouts': 0, 'deadline_exceeded': 0, 'throttle_wait_seconds': 0.0,
+            'tokens_estimated': 0, 'tokens_used': 0,
+        }
+
+    @staticmethod
+    def estimate_tokens(prompt: str, expected_output_tokens: int = 0) -> int:
+        """Rough token count (~4 characters per token), good enough for budgeting."""
+        return len(prompt) // 4 + expected_output_tokens
+
+    def _count(self, key: str, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max_backoff, base * 2^attempt)]."""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def generate(self, prompt: str, expected_output_tokens: int = 0, deadline: float = None, cancel_token=None):
+        """
+        Calls generate_content and returns its response.
+        Retryable errors are retried until max_retries or the deadline (seconds from now);
+        other errors are raised immediately. Raises LLMDeadlineExceeded when time runs out.
+        With a cancel_token (src.cancellation), its JobCancelled is raised before each attempt
+        and during backoff; an HTTP call already in flight is left to finish. If the token's
+        deadline is the nearer one and the call runs out of time, the token is cancelled and
+        its JobCancelled raised instead of LLMDeadlineExceeded, since the job can't finish either.
+        """
+        deadline = deadline or self.deadline
+        job_deadline = cancel_token.remaining() if cancel_token is not None else None
+        job_bound = job_deadline is not None and job_deadline < deadline
+        if job_bound:
+            deadline = job_deadline
+        deadline_at = time.monotonic() + deadline
+        estimated_tokens = self.estimate_tokens(prompt, expected_output_tokens)
+        self._count('calls')
+        self._count('tokens_estimated', estimated_tokens)
+
+        attempt = 0
+        while True:
+            if cancel_token is not None:
+                cancel_token.check()
+            try:
+                # Budget first, then a concurrency slot, so queued callers don't hold slots while throttled
+                with profiler.span("gemini_throttle"):
+                    waited = self.request_bucket.acquire(1, deadline_at)
+                    waited += self.token_bucket.acquire(estimated_tokens, deadline_at)
+                self._count('throttle_wait_seconds', waited)
+
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0 or not self._slots.acquire(timeout=remaining):
+                    raise LLMDeadlineExceeded("No free Gemini slot before the deadline")
+                try:
+                    self._count('attempts')
+                    timeout = max(1.0, min(self.call_timeout, deadline_at - time.monotonic()))
+                    started = time.monotonic()
+                    with profiler.span("gemini_call"):
+                        response = self.model.generate_content(prompt, request_options={"timeout": timeout})
+                    with self._stats_lock:
+                        self._latencies.append(time.monotonic() - started)
+                finally:
+                    self._slots.release()
+
+                self._record_usage(response, estimated_tokens)
+                self._count('succeeded')
+                return response
+
+            except LLMDeadlineExceeded:
+                self._count('deadline_exceeded')
+                self._count('failed')
+                if job_bound:
+                    cancel_token.cancel("deadline exceeded")
+                    raise cancel_token.exception()
+                raise
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, RATE_LIMIT_ERRORS):
+                    self._count('rate_limited')
+                elif isinstance(e, TIMEOUT_ERRORS):
+                    self._count('timeouts')
+
+                delay = self._backoff(attempt)
+                if attempt >= self.max_retries or time.monotonic() + delay >= deadline_at:
+                    self._count('failed')
+                    print(f"❌ Gemini call failed after {attempt + 1} attempts: {e}")
+                    if job_bound and time.monotonic() + delay >= deadline_at:
+                        cancel_token.cancel("deadline exceeded")
+                        raise cancel_token.exception() from e
+                    raise
+                attempt += 1
+                self._count('retries')
+                print(f"🔁 Gemini call failed ({type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s...")
+                if cancel_token is not None:
+                    cancel_token.wait(delay)
+                else:
+                    time.sleep(delay)
+            except Exception:
+                self._count('failed')
+                raise
+
+    def _record_usage(self, response, estimated_tokens: int):
+        """Charges the token bucket for any usage above the estimate, using the response's usage metadata."""
+        usage = getattr(response, 'usage_metadata', None)
+        used = getattr(usage, 'total_token_count', 0) or estimated_tokens
+        self._count('tokens_used', used)
+        if used > estimated_tokens:
+            self.token_bucket.debit(used - estimated_tokens)
+
+    def get_stats(self) -> dict:
+        """Returns call/retry counters and latency percentiles (seconds) of successful HTTP calls."""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self.stats)
+        percentile = lambda p: round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else 0.0
+        stats['throttle_wait_seconds'] = round(stats['throttle_wait_seconds'], 2)
+        stats['latency_p50'] = percentile(0.50)
+        stats['latency_p95'] = percentile(0.95)
+        return stats
@@ -0,0 +1,151 @@
+import re
+import chess
+
+# One alternative per PGN movetext token; only the last group (a SAN move) is kept
+_MOVETEXT_TOKEN = re.compile(r"""
+      \{[^}]*\}                 # {comment}
+    | ;[^\n]*                   # ; rest-of-line comment
+    | (?P<open>\()              # start of variation
+    | (?P<close>\))             # end of variation
+    | \$\d+                     # NAG
+    | \d+\.(?:\.\.)?            # move number: "12." or "12..."
+    | 1-0 | 0-1 | 1/2-1/2 | \*  # result
+    | (?P<san>[^\s{}();$]+)     # SAN move (possibly with !/? suffixes)
+""", re.VERBOSE)
+
+_HEADER = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]\s*$')
+
+
+class _IncrementalFen:
+    """
+    Builds board.fen() after each move by re-rendering only the ranks the move touched.
+    board.fen() walks all 64 squares every ply, which dominates replay time otherwise.
+    """
+    __slots__ = ('board', 'ranks', 'castling')
+
+    def __init__(self, board: chess.Board):
+        self.board = board
+        self.ranks = [self._render_rank(rank) for rank in range(8)]
+        self.castling = {} # castling_rights bitmask -> FEN field
+
+    def _render_rank(self, rank: int) -> str:
+        board = self.board
+        occupied = board.occupied
+        text, empty = [], 0
+        for square in range(rank * 8, rank * 8 + 8):
+            if occupied & chess.BB_SQUARES[square]:
+                if empty:
+                    text.append(str(empty))
+                    empty = 0
+                text.append(board.piece_at(square).symbol())
+            else:
+                empty += 1
+        if empty:
+            text.append(str(empty))
+        return "".join(text)
+
+    def push(self, move: chess.Move):
+        """
+        Plays the move on the board and returns (san, fen): the move's canonical SAN (identical to
+        board.san(move), whatever the PGN wrote) and the new FEN (identical to board.fen()).
+        """
+        board = self.board
+        san = board.san_and_push(move) # The check/mate suffix needs the position after the move anyway
+        from_rank, to_rank = move.from_square >> 3, move.to_square >> 3
+        self.ranks[from_rank] = self._render_rank(from_rank) # Also covers castling rooks and en passant captures
+        if to_rank != from_rank:
+            self.ranks[to_rank] = self._render_rank(to_rank)
+
+        rights = board.castling_rights
+        castling = self.castling.get(rights)
+        if castling is None:
+            castling = self.castling[rights] = board.castling_xfen()
+        ep_square = board.ep_square
+        ep = chess.SQUARE_NAMES[ep_square] if ep_square is not None and board.has_legal_en_passant() else "-"
+
+        placement = "/".join(reversed(self.ranks))
+        return san, f"{placement} {'w' if board.turn else 'b'} {castling} {ep} {board.halfmove_clock} {board.fullmove_number}"
+
+
+class FastPgnError(ValueError):
+    """Raised when movetext can't be played out (the caller should fall back to chess.pgn)."""
+
+
+def split_games(pgn_text: str):
+    """Yields (headers, movetext) for every game in a PGN string, without building game trees."""
+    headers, movetext = {}, []
+    in_headers = False
+    for line in pgn_text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("[") and not stripped.startswith("[%"):
+            if not in_headers and (headers or movetext):
+                yield headers, "\n".join(movetext)
+                headers, movetext = {}, []
+            in_headers = True
+            match = _HEADER.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2)
+        elif stripped:
+            in_headers = False
+            movetext.append(line)
+    if headers or movetext:
+        yield headers, "\n".join(movetext)
+
+
+def mainline_sans(movetext: str) -> list:
+    """Returns the mainline SAN tokens of a game's movetext, skipping comments, NAGs and variations."""
+    sans = []
+    depth = 0
+    for match in _MOVETEXT_TOKEN.finditer(movetext):
+        if match.group("open"):
+            depth += 1
+        elif match.group("close"):
+            depth = max(0, depth - 1)
+        elif depth == 0 and match.group("san"):
+            san = match.group("san").rstrip("!?")
+            if san.startswith("0-0"):
+                san = san.replace("0", "O") # Castling written with zeros
+            if san and san != "--":
+                sans.append(san)
+    return sans
+
+
+def play_mainline(headers: dict, movetext: str) -> dict:
+    """
+    Plays a game's mainline and returns its plies in bulk:
+    {'start_fen', 'san': [...], 'uci': [...], 'fen': [...]} where fen[i] is the position after ply i
+    and san[i] is the move in canonical SAN, as board.san() writes it, whatever the movetext had:
+    hand-written "Qxf7" (no mate suffix), "Ng1f3" or "e8Q" come out as "Qxf7#", "Nf3" and "e8=Q".
+    Raises FastPgnError on an illegal or unparsable move.
+    """
+    start_fen = headers.get("FEN") if headers.get("SetUp", "1") == "1" else None
+    board = chess.Board(start_fen) if start_fen else chess.Board()
+    start_fen = board.fen()
+
+    sans, ucis, fens = [], [], []
+    fen_builder = _IncrementalFen(board)
+    parse_san = board.parse_san
+    for written in mainline_sans(movetext):
+        try:
+            move = parse_san(written)
+        except ValueError as e:
+            raise FastPgnError(f"Could not play {written!r} at ply {len(ucis) + 1}: {e}")
+        san, fen = fen_builder.push(move)
+        sans.append(san)
+        ucis.append(move.uci())
+        fens.append(fen)
+
+    return {'start_fen': start_fen, 'san': sans, 'uci': ucis, 'fen': fens}
+
+
+def read_mainline(pgn_string: str):
+    """Fast equivalent of chess.pgn.read_game + mainline_moves for the first game in a PGN string. Returns None if empty."""
+    for headers, movetext in split_games(pgn_string):
+        return dict(play_mainline(headers, movetext), headers=headers)
+    return None
+
+
+def iter_mainlines(pgn_text: str):
+    """Yields the mainline plies (as returned by play_mainline, plus 'headers') of every game in a PGN string."""
+    for headers, movetext in split_games(pgn_text):
+        yield dict(play_mainline(headers, movetext), headers=headers)
@@ -1,15 +1,28 @@
 import os
+import queue
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from src.chess_analyzer import ChessAnalyzer
 from src.commentary_generator import CommentaryGenerator
 from src.voice_generator import VoiceGenerator
+from src.timeline import build_timeline, save_timeline
+from src.highlights import select_highlights
+from src.profiler import profiler
+from src.cancellation import JobCancelled
+from src.config import LANGUAGE_CODES, HIGHLIGHTS_TOP_K
+
+# How many already-commented moves to show Gemini when only a game's tail is regenerated
+COMMENTARY_CONTEXT_MOVES = 6
 
 class ChessCommentaryPipeline:
     """Orchestrates the entire process from PGN to audio commentary."""
 
-    def __init__(self, analyzer: ChessAnalyzer, commentary_gen: CommentaryGenerator, voice_gen: VoiceGenerator):
+    def __init__(self, analyzer: ChessAnalyzer, commentary_gen: CommentaryGenerator, voice_gen: VoiceGenerator,
+                 extra_voice_gens: list = None):
         """
         Initializes the pipeline with all the necessary components.
+        extra_voice_gens are additional VoiceGenerators (each with its own TTS model) that
+        multi-language jobs use to synthesize several languages at the same time.
         """
         self.analyzer = analyzer
         self.commentary_generator = commentary_gen
@@ -17,32 +30,129 @@ class ChessCommentaryPipeline:
         
         if not all([analyzer, commentary_gen, voice_gen]):
             raise ValueError("All components (analyzer, commentary_gen, voice_gen) must be provided.")
+
+        # Multi-language jobs borrow a generator from this pool for each language they synthesize
+        self.voice_generators = [voice_gen] + list(extra_voice_gens or [])
+        self._voice_pool = queue.Queue()
+        for generator in self.voice_generators:
+            self._voice_pool.put(generator)
             
         print("\n🚀 Complete chess commentary pipeline is ready!")
 
-    def _run_common_steps(self, pgn_string: str, language_choice: str = "English"):
-        """Internal method for analysis and commentary generation."""
-        
-        # --- Step 1: Analyze the game moves with Stockfish ---
+    def _analyze(self, pgn_string: str, use_pgn_annotations: bool = False, cancel_token=None):
+        """
+        Runs the Stockfish step. Returns the per-move results, or None on failure.
+        With use_pgn_annotations, [%eval] comments in the PGN supply the evaluations where present;
+        the engine still finds each position's best move, which the commentary grades moves against.
+        """
         print("\n[Step 1/2] 📊 Analyzing game moves...")
-        analysis_results = self.analyzer.analyze_game(pgn_string)
+        with profiler.span("analysis"):
+            if use_pgn_annotations:
+                analysis_results = self.analyzer.analyze_game_tree(
+                    pgn_string, include_variations=False, grade_moves=True, cancel_token=cancel_token
+                )
+            else:
+                analysis_results = self.analyzer.analyze_game(pgn_string, cancel_token=cancel_token)
         if not analysis_results:
             print("❌ Analysis step failed.")
+            return None
+        return analysis_results
+
+    def _comment(self, analysis_results: list, language_choice: str = "English", cancel_token=None):
+        """
+        Runs the Gemini step on analysis results (updated in place). Returns them, or None on failure.
+        Commentary cached for the unchanged prefix of a resubmitted game is reused.
+        """
+        print(f"\n[Step 2/2] ✍️ Generating AI commentary ({language_choice})...")
+
+        # Reuse cached commentary for the unchanged prefix of a resubmitted game
+        store = self.analyzer.store
+        cached_count = 0
+        if store:
+            for move in analysis_results:
+                cached = store.get_commentary(move['prefix_key'], language_choice) if move.get('prefix_key') else None
+                if not cached:
+                    break
+                move.update(cached)
+                cached_count += 1
+
+        tail = analysis_results[cached_count:]
+        if cached_count:
+            print(f"   ♻️ Reused cached commentary for {cached_count}/{len(analysis_results)} moves.")
+
+        if tail:
+            with profiler.span("commentary"):
+                commented_tail = self.commentary_generator.generate_commentary_for_game(
+                    tail, 
+                    language=language_choice, # Pass full name to Gemini
+                    context=analysis_results[max(0, cached_count - COMMENTARY_CONTEXT_MOVES):cached_count],
+                    cancel_token=cancel_token
+                )
+            if not commented_tail:
+                print("❌ Commentary step failed.")
+                return None
+            if store:
+                for move in commented_tail:
+                    if move.get('prefix_key'):
+                        store.put_commentary(move['prefix_key'], language_choice, move)
+            
+        return analysis_results
+
+    def _analyze_and_comment(self, pgn_string: str, language_choice: str = "English", use_pgn_annotations: bool = False,
+                             cancel_token=None):
+        """
+        Internal method for analysis and commentary generation.
+        Returns (per-move results, TTS language code), or (None, None) on failure.
+        """
+        analysis_results = self._analyze(pgn_string, use_pgn_annotations, cancel_token)
+        if not analysis_results:
             return None, None
 
-        # --- Step 2: Generate commentary for each move using the Gemini model ---
-        print("\n[Step 2/2] ✍️ Generating AI commentary...")
-        
         # Map full language name to language code for TTS
-        language_map = {"English": "en", "Spanish": "es", "French": "fr", "German": "de"}
-        language_code = language_map.get(language_choice, "en") # Default to 'en'
+        language_code = LANGUAGE_CODES.get(language_choice, "en") # Default to 'en'
+        if not self._comment(analysis_results, language_choice, cancel_token):
+            return None, None
+        return analysis_results, language_code
 
-        analysis_with_commentary = self.commentary_generator.generate_commentary_for_game(
-            analysis_results, 
-            language=language_choice # Pass full name to Gemini
-        )
-        if not analysis_with_commentary:
+    def _comment_highlights(self, analysis_results: list, language_choice: str = "English", top_k: int = HIGHLIGHTS_TOP_K,
+                            cancel_token=None):
+        """
+        Runs the Gemini step in highlights mode: only the top_k most important moments plus a
+        short game summary are commented. Returns the segments to narrate (the summary first,
+        as an entry without a move, then the moments), or None on failure.
+        """
+        print(f"\n[Step 2/2] ✍️ Generating highlights commentary ({language_choice})...")
+        highlights = select_highlights(analysis_results, top_k)
+        with profiler.span("commentary"):
+            moments, summary = self.commentary_generator.generate_highlights_commentary(
+                highlights['moments'], highlights['facts'], language=language_choice, cancel_token=cancel_token
+            )
+        if not moments:
             print("❌ Commentary step failed.")
+            return None
+
+        narrated = [{'move_number': None, 'move_san': None, 'player': None, 'commentary': summary}] if summary else []
+        return narrated + moments
+
+    def warm_caches(self, pgn_string: str, language_choice: str = None, should_stop=None) -> bool:
+        """
+        Analyzes a game (and comments it, if language_choice is given) only to fill the analysis
+        store, so a later request for the same game reuses the results. Used by the backend's
+        prefetcher. Returns False if should_stop interrupted it or a step failed.
+        """
+        if not self.analyzer.store:
+            return False
+        analysis_results = self.analyzer.analyze_game(pgn_string, should_stop=should_stop)
+        if not analysis_results or (should_stop and should_stop()):
+            return False
+        if language_choice:
+            return bool(self._comment(analysis_results, language_choice))
+        return True
+
+    def _run_common_steps(self, pgn_string: str, language_choice: str = "English"):
+        """Internal method for analysis and commentary generation."""
+        analysis_with_commentary, language_code = self._analyze_and_comment(pgn_string, language_choice)
+        if not analysis_with_commentary:
             return None, None
             
         # Combine all commentary strings into a single text block
@@ -57,21 +167,67 @@ class ChessCommentaryPipeline:
         return full_commentary, language_code
 
     # --- THIS IS THE MISSING METHOD ---
-    def run_pipeline_for_backend(self, pgn_string: str, language_choice: str = "English"):
+    def run_pipeline_for_backend(self, pgn_string: str, language_choice: str = "English", use_pgn_annotations: bool = False,
+                                 highlights: bool = False, highlights_count: int = None, cancel_token=None):
         """
         Runs the full pipeline, saves the file, and returns the path.
+        A per-move timeline index is saved next to the audio (see src/timeline.py).
+        With highlights, only the most important moments (highlights_count, default HIGHLIGHTS_TOP_K)
+        and a short summary are commented and narrated; the summary's timeline entry has no move.
+        A cancel_token (src.cancellation) is checked between plies, before the Gemini call and between
+        TTS sentences; once it is cancelled the run stops and raises JobCancelled.
         Does NOT play audio. Used by the FastAPI backend.
         """
         print(f"--- Backend Pipeline Started for PGN: {pgn_string[:30]}... ---")
         
-        # 1. Run common analysis and commentary steps
-        full_commentary, language_code = self._run_common_steps(pgn_string, language_choice)
-        
-        if not full_commentary:
-            print("❌ Backend Pipeline: Failed at common steps.")
+        # Only a sampled fraction of runs is profiled, and only while profiling is switched on
+        with profiler.trace("run_pipeline_for_backend", language=language_choice, pgn_chars=len(pgn_string), highlights=highlights):
+            # 1. Run common analysis and commentary steps
+            try:
+                if highlights:
+                    analysis_results = self._analyze(pgn_string, use_pgn_annotations, cancel_token)
+                    analysis_with_commentary = analysis_results and self._comment_highlights(
+                        analysis_results, language_choice, highlights_count or HIGHLIGHTS_TOP_K, cancel_token
+                    )
+                    language_code = LANGUAGE_CODES.get(language_choice, "en")
+                else:
+                    analysis_with_commentary, language_code = self._analyze_and_comment(
+                        pgn_string, language_choice, use_pgn_annotations, cancel_token
+                    )
+                
+                if not analysis_with_commentary:
+                    print("❌ Backend Pipeline: Failed at common steps.")
+                    profiler.annotate("result", "analysis/commentary failed")
+                    return None
+
+                profiler.annotate("moves", len(analysis_with_commentary))
+                audio_file_path = self._synthesize_pooled(analysis_with_commentary, language_code, cancel_token=cancel_token)
+            except JobCancelled as e:
+                print(f"🛑 Backend Pipeline cancelled: {e.reason}.")
+                profiler.annotate("result", f"cancelled ({e.reason})")
+                raise
+
+            if not audio_file_path:
+                print("❌ Backend Pipeline: Voice generation failed.")
+                profiler.annotate("result", "voice generation failed")
+                return None
+                
+            profiler.annotate("audio_file", os.path.basename(audio_file_path))
+            print(f"✅ Backend Pipeline Finished. File saved to: {audio_file_path}")
+            return audio_file_path
+
+    def _synthesize_with_timeline(self, voice_generator: VoiceGenerator, analysis_with_commentary: list, language_code: str, suffix: str = "",
+                                  cancel_token=None):
+        """
+        Synthesizes the commented moves into one WAV with the given generator and saves
+        its per-move timeline index next to it. Returns the audio path, or None on failure.
+        """
+        # Keep one text chunk per move so we can map moves to audio offsets
+        narrated_moves = [move for move in analysis_with_commentary if (move.get('commentary') or '').strip()]
+        if not narrated_moves:
+            print("⚠️ No commentary text was generated to synthesize.")
             return None
 
-        # 2. Synthesize voice
         print("   Synthesizing voice...")
         
         # Create a unique output path
@@ -79,7 +235,7 @@ class ChessCommentaryPipeline:
         output_dir = "../output/audio"
         os.makedirs(output_dir, exist_ok=True)
         
-        output_filename = f"{output_dir}/commentary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
+        output_filename = f"{output_dir}/commentary_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}.wav"
         
         default_voice_path = os.path.join(os.getcwd(), "default_voice.wav")
         
@@ -87,20 +243,79 @@ class ChessCommentaryPipeline:
              print(f"⚠️ Default voice not found at {default_voice_path}, trying to download or use fallback...")
              # You might want to call your setup_default_voice() here if you imported it
         
-        audio_file_path = self.voice_generator.generate_audio_with_clone(
-            text=full_commentary,
-            speaker_wav_path=default_voice_path, 
-            language=language_code,
-            output_path=output_filename
-        )
-        
+        with profiler.span("tts"):
+            audio_file_path, spans = voice_generator.generate_timed_audio(
+                chunks=[move['commentary'] for move in narrated_moves],
+                speaker_wav_path=default_voice_path, 
+                language=language_code,
+                output_path=output_filename,
+                cancel_token=cancel_token
+            )
         if not audio_file_path:
-            print("❌ Backend Pipeline: Voice generation failed.")
             return None
-            
-        print(f"✅ Backend Pipeline Finished. File saved to: {audio_file_path}")
+
+        # Save the per-move timeline index alongside the audio
+        timeline = build_timeline(
+            narrated_moves, spans,
+            sample_rate=voice_generator.get_sample_rate(),
+            audio_filename=os.path.basename(audio_file_path)
+        )
+        timeline_path = save_timeline(timeline, audio_file_path)
+        print(f"   🧭 Timeline index saved to: {timeline_path}")
         return audio_file_path
 
+    def _synthesize_pooled(self, analysis_with_commentary: list, language_code: str, suffix: str = "", cancel_token=None):
+        """Borrows a voice generator from the pool (waiting if all are busy) and synthesizes with it."""
+        with profiler.span("tts_pool_wait"):
+            voice_generator = self._voice_pool.get()
+        try:
+            if cancel_token:
+                cancel_token.check()
+            return self._synthesize_with_timeline(voice_generator, analysis_with_commentary, language_code, suffix, cancel_token)
+        finally:
+            self._voice_pool.put(voice_generator)
+
+    def run_multilang_pipeline_for_backend(self, pgn_string: str, languages: list, use_pgn_annotations: bool = False):
+        """
+        Produces commentary audio for several languages from a single Stockfish analysis.
+        Commentary for each language is requested in parallel, then the languages are
+        synthesized concurrently, one per voice generator in the pool.
+        Returns {language: audio_path or None}; None if the analysis itself failed.
+        """
+        languages = list(dict.fromkeys(languages)) # Drop duplicates, keep order
+        unknown = [language for language in languages if language not in LANGUAGE_CODES]
+        if unknown:
+            raise ValueError(f"Unsupported languages: {', '.join(unknown)}")
+
+        print(f"--- Multi-language Pipeline Started ({', '.join(languages)}) for PGN: {pgn_string[:30]}... ---")
+        analysis_results = self._analyze(pgn_string, use_pgn_annotations)
+        if not analysis_results:
+            print("❌ Multi-language Pipeline: Analysis failed.")
+            return None
+
+        # Each language gets its own copy of the per-move dicts to write commentary into
+        copies = {language: [dict(move) for move in analysis_results] for language in languages}
+        with ThreadPoolExecutor(max_workers=len(languages), thread_name_prefix="commentary") as executor:
+            commented = dict(zip(languages, executor.map(lambda language: self._comment(copies[language], language), languages)))
+
+        results = {language: None for language in languages}
+        ready = [language for language in languages if commented[language]]
+        workers = min(len(ready), len(self.voice_generators)) or 1
+        print(f"   🔊 Synthesizing {len(ready)} languages on {workers} TTS workers...")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts") as executor:
+            futures = {language: executor.submit(
+                    self._synthesize_pooled, commented[language], LANGUAGE_CODES[language], f"_{LANGUAGE_CODES[language]}"
+                ) for language in ready}
+            for language, future in futures.items():
+                try:
+                    results[language] = future.result()
+                except Exception as e:
+                    print(f"❌ Voice generation failed for {language}: {e}")
+
+        done = sum(1 for path in results.values() if path)
+        print(f"✅ Multi-language Pipeline Finished ({done}/{len(languages)} languages).")
+        return results
+
     def process_pgn_for_app(self, pgn_string: str, language_choice: str, speaker_wav_path: str):
         """Runs the full pipeline using a cloned voice for the Gradio app."""
         print("\n" + "="*50)
@@ -138,8 +353,8 @@ class ChessCommentaryPipeline:
         print("🎯 Starting Notebook Pipeline (with Built-in Speaker)...")
         print("="*50)
 
-        language_map_rev = {"en": "English", "es": "Spanish", "fr": "French", "de": "German"}
-        language_choice = language_map_rev.get(language, "English")
+        language_names = {code: name for name, code in LANGUAGE_CODES.items()}
+        language_choice = language_names.get(language, "English")
         
         full_commentary, language_code = self._run_common_steps(pgn_string, language_choice)
         
@@ -0,0 +1,214 @@
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import chess
+from src.engine_supervisor import EngineSupervisor, EngineUnavailable
+from src.config import (
+    POSITION_ENGINES, POSITION_CACHE_SIZE, POSITION_DEFAULT_DEPTH, POSITION_MAX_DEPTH,
+    POSITION_MAX_TIME_MS, POSITION_ENGINE_HASH_MB, ENGINE_SEARCH_TIMEOUT, ENGINE_MAX_RETRIES
+)
+
+# Used to turn a time budget into a node budget until the engines have reported their real speed
+DEFAULT_NODES_PER_SECOND = 500_000
+MAX_MULTIPV = 5
+
+
+class PositionCache:
+    """
+    Thread-safe LRU of engine results keyed by position (FEN without the move counters).
+    A cached search satisfies any request that asks for less: a depth-20 result answers a
+    depth-15 request, a 3-line result answers a 1-line request. Depth-limited and
+    node-limited (time budget) results are kept separately.
+    """
+
+    def __init__(self, max_positions: int = POSITION_CACHE_SIZE):
+        self.max_positions = max_positions
+        self._entries = OrderedDict() # position key -> {'depth': result, 'nodes': result}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def position_key(fen: str) -> str:
+        return " ".join(fen.split(" ")[:4])
+
+    def get(self, fen: str, depth: int = None, nodes: int = None, multipv: int = 1):
+        """Returns a copy of a cached result at least as deep as requested, or None."""
+        key = self.position_key(fen)
+        kind, limit = ('nodes', nodes) if nodes else ('depth', depth)
+        with self._lock:
+            result = self._entries.get(key, {}).get(kind)
+            if result and result[kind] >= limit and len(result['top_moves']) >= min(multipv, result['legal_moves']):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(result, fen=fen, top_moves=result['top_moves'][:multipv])
+            self.misses += 1
+            return None
+
+    def put(self, fen: str, result: dict):
+        """Stores a result (with a 'depth' or 'nodes' limit) unless a deeper one is already cached."""
+        key = self.position_key(fen)
+        kind = 'nodes' if result.get('nodes') else 'depth'
+        with self._lock:
+            entry = self._entries.setdefault(key, {})
+            current = entry.get(kind)
+            if not current or (result[kind], len(result['top_moves'])) >= (current[kind], len(current['top_moves'])):
+                entry[kind] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_positions:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'positions': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class PositionService:
+    """
+    Answers single-position evaluation requests from a pool of warm Stockfish processes
+    (each behind its own EngineSupervisor), with a shared PositionCache in front.
+    Each search is one MultiPV run that yields the evaluation, best move and top lines
+    together. Requests are limited either by depth or by a time budget, which is
+    converted to a node budget so results are reproducible and cacheable.
+    """
+
+    def __init__(self, stockfish_path: str, engines: int = POSITION_ENGINES, cache: PositionCache = None,
+                 hash_mb: int = POSITION_ENGINE_HASH_MB):
+        self.cache = cache or PositionCache()
+        self.nodes_per_second = DEFAULT_NODES_PER_SECOND
+        self._pool = queue.Queue()
+        self.supervisors = []
+        for _ in range(engines):
+            supervisor = EngineSupervisor(
+                stockfish_path,
+                parameters={"Threads": 1, "Hash": hash_mb},
+                search_timeout=ENGINE_SEARCH_TIMEOUT,
+                max_retries=ENGINE_MAX_RETRIES
+            )
+            self.supervisors.append(supervisor)
+            self._pool.put(supervisor)
+        self._stats_lock = threading.Lock()
+        self.searches = 0
+        self.search_seconds = 0.0
+        print(f"✅ Position service ready with {engines} warm engines.")
+
+    def _limits(self, depth: int = None, movetime_ms: int = None):
+        """Clamps the request to the configured maximums. Returns (depth, nodes); exactly one is set."""
+        if movetime_ms:
+            movetime_ms = max(10, min(int(movetime_ms), POSITION_MAX_TIME_MS))
+            return None, max(1000, int(self.nodes_per_second * movetime_ms / 1000))
+        return max(1, min(int(depth or POSITION_DEFAULT_DEPTH), POSITION_MAX_DEPTH)), None
+
+    def _search(self, board: chess.Board, depth: int, nodes: int, multipv: int) -> dict:
+        """Runs one MultiPV search on a pooled engine."""
+        fen = board.fen()
+        legal_moves = board.legal_moves.count()
+        if legal_moves == 0:
+            # Checkmate or stalemate: nothing to search
+            evaluation = {'type': 'mate', 'value': 0} if board.is_checkmate() else {'type': 'cp', 'value': 0}
+            return {'fen': fen, 'evaluation': evaluation, 'best_move': None, 'top_moves': [],
+                    'depth': depth, 'nodes': nodes, 'legal_moves': 0}
+
+        def search(stockfish):
+            if depth:
+                stockfish.set_depth(depth)
+            stockfish.set_fen_position(fen)
+            lines = stockfish.get_top_moves(min(multipv, legal_moves), verbose=True, num_nodes=nodes or 0)
+            if lines:
+                return lines
+            # The last info lines didn't match the requested limit (e.g. the engine stopped early); evaluate directly
+            evaluation = stockfish.get_evaluation()
+            return [{
+                'Move': stockfish.get_best_move(),
+                'Centipawn': evaluation['value'] if evaluation['type'] == 'cp' else None,
+                'Mate': evaluation['value'] if evaluation['type'] == 'mate' else None,
+            }]
+
+        supervisor = self._pool.get()
+        try:
+            started = time.perf_counter()
+            lines = supervisor.run(search)
+            elapsed = time.perf_counter() - started
+        finally:
+            self._pool.put(supervisor)
+
+        with self._stats_lock:
+            self.searches += 1
+            self.search_seconds += elapsed
+            speed = lines[0].get('NodesPerSecond')
+            if speed:
+                self.nodes_per_second = int(0.8 * self.nodes_per_second + 0.2 * speed)
+
+        top_moves = [{'Move': line['Move'], 'Centipawn': line['Centipawn'], 'Mate': line['Mate']} for line in lines]
+        best = top_moves[0]
+        evaluation = {'type': 'mate', 'value': best['Mate']} if best['Mate'] is not None else {'type': 'cp', 'value': best['Centipawn']}
+        return {'fen': fen, 'evaluation': evaluation, 'best_move': best['Move'], 'top_moves': top_moves,
+                'depth': depth, 'nodes': nodes, 'legal_moves': legal_moves}
+
+    def lookup(self, fen: str, depth: int = None, movetime_ms: int = None, multipv: int = 3):
+        """Cache-only lookup (cheap enough to call from the event loop). Returns a result or None."""
+        multipv = max(1, min(int(multipv), MAX_MULTIPV))
+        depth, nodes = self._limits(depth, movetime_ms)
+        result = self.cache.get(fen, depth=depth, nodes=nodes, multipv=multipv)
+        if result:
+            result['cached'] = True
+        return result
+
+    def analyze(self, fen: str, depth: int = None, movetime_ms: int = None, multipv: int = 3) -> dict:
+        """
+        Evaluates one position. Raises ValueError for an invalid FEN and
+        EngineUnavailable if no engine could complete the search.
+        """
+        board = chess.Board(fen) # Raises ValueError for malformed FENs
+        if not board.is_valid():
+            raise ValueError(f"Illegal position: {fen}")
+        multipv = max(1, min(int(multipv), MAX_MULTIPV))
+
+        cached = self.lookup(fen, depth, movetime_ms, multipv)
+        if cached:
+            return cached
+
+        depth, nodes = self._limits(depth, movetime_ms)
+        result = self._search(board, depth, nodes, multipv)
+        self.cache.put(fen, result)
+        return dict(result, cached=False)
+
+    def analyze_batch(self, fens: list, depth: int = None, movetime_ms: int = None, multipv: int = 3) -> list:
+        """
+        Evaluates many positions across the engine pool. Results are in input order;
+        a position that fails gets {'fen', 'error'} instead of failing the whole batch.
+        """
+        def analyze_one(fen):
+            try:
+                return self.analyze(fen, depth, movetime_ms, multipv)
+            except (ValueError, EngineUnavailable) as e:
+                return {'fen': fen, 'error': str(e)}
+
+        unique = list(dict.fromkeys(fens)) # Duplicate positions are searched once
+        with ThreadPoolExecutor(max_workers=max(1, len(self.supervisors))) as executor:
+            results = dict(zip(unique, executor.map(analyze_one, unique)))
+        return [results[fen] for fen in fens]
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            searches, seconds = self.searches, self.search_seconds
+        return {
+            'engines': len(self.supervisors),
+            'engines_alive': sum(1 for supervisor in self.supervisors if supervisor.is_alive()),
+            'searches': searches,
+            'avg_search_ms': round(1000 * seconds / searches, 1) if searches else 0.0,
+            'nodes_per_second': self.nodes_per_second,
+            'cache': self.cache.stats(),
+        }
+
+    def close(self):
+        for supervisor in self.supervisors:
+            supervisor.close()
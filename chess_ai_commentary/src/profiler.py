@@ -0,0 +1,267 @@
+import os
+import sys
+import time
+import json
+import random
+import itertools
+import threading
+from collections import deque
+from datetime import datetime
+from src.config import (
+    PROFILING_ENABLED, PROFILING_SAMPLE_RATE, PROFILING_INTERVAL_MS, PROFILE_OUTPUT_DIR, PROFILE_KEEP
+)
+
+
+class _NullSpan:
+    """Returned by span() when the current thread isn't being profiled: entering it costs nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.trace.stack.append(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        path = ";".join(self.trace.stack)
+        self.trace.stack.pop()
+        totals = self.trace.spans.setdefault(path, [0, 0.0])
+        totals[0] += 1
+        totals[1] += elapsed
+        return False
+
+
+class _Trace:
+    """One profiled call: its span timings and the collapsed stacks sampled from its thread."""
+
+    def __init__(self, trace_id: str, name: str, meta: dict):
+        self.trace_id = trace_id
+        self.name = name
+        self.meta = dict(meta)
+        self.thread_id = threading.get_ident()
+        self.stack = [name]     # current span path, read by the sampler thread
+        self.spans = {}         # "name;span;..." -> [count, seconds]
+        self.samples = {}       # collapsed stack -> sample count
+        self.started = time.perf_counter()
+
+
+def _frame_label(code) -> str:
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """
+    On-demand profiling of pipeline runs.
+
+    While enabled, trace() profiles a random `sample_rate` fraction of calls. A profiled
+    call records wall time per span (span() blocks nest, e.g. analysis;stockfish) and a
+    background thread samples its Python stack every `interval_ms`. Each sample is
+    prefixed with the span path it was taken in, so time blocked on Stockfish, Gemini or
+    XTTS shows up under the right stage. Every trace is written to PROFILE_OUTPUT_DIR as
+    <id>.folded (collapsed stacks for flamegraph.pl or speedscope) and <id>.json (span
+    summary).
+
+    When profiling is off, or the current call wasn't sampled, span() returns a shared
+    no-op context manager, so instrumented code pays one thread-local lookup.
+    """
+
+    def __init__(self, enabled: bool = PROFILING_ENABLED, sample_rate: float = PROFILING_SAMPLE_RATE,
+                 interval_ms: float = PROFILING_INTERVAL_MS, output_dir: str = PROFILE_OUTPUT_DIR, keep: int = PROFILE_KEEP):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.interval_ms = interval_ms
+        self.output_dir = output_dir
+        self.keep = keep
+        self._local = threading.local()
+        self._active = {}            # thread id -> _Trace
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._ids = itertools.count(1)
+        self.recent = deque(maxlen=keep)  # summaries of finished traces, newest last
+        self.calls = 0
+        self.profiled = 0
+
+    def configure(self, enabled: bool = None, sample_rate: float = None, interval_ms: float = None):
+        """Changes settings at runtime (the admin toggle). Traces already running are unaffected."""
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        if interval_ms is not None:
+            self.interval_ms = max(1.0, float(interval_ms))
+        print(f"🔬 Profiling {'on' if self.enabled else 'off'} (sample rate {self.sample_rate:.0%}, every {self.interval_ms:.0f}ms)")
+
+    # --- Instrumentation API ---
+    def trace(self, name: str, force: bool = False, **meta):
+        """Context manager around one call to profile. Sampled calls get a trace; others get a no-op."""
+        self.calls += 1
+        if getattr(self._local, 'trace', None) is not None:
+            return _NULL_SPAN # Already inside a trace on this thread
+        if not force and not (self.enabled and random.random() < self.sample_rate):
+            return _NULL_SPAN
+        return _TraceContext(self, name, meta)
+
+    def span(self, name: str):
+        """Times a stage of the current trace. A no-op unless this thread is being profiled."""
+        trace = getattr(self._local, 'trace', None)
+        if trace is None:
+            return _NULL_SPAN
+        return _Span(trace, name)
+
+    def annotate(self, key: str, value):
+        """Adds metadata (e.g. the output file) to the current trace, if any."""
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace.meta[key] = value
+
+    # --- Trace lifecycle ---
+    def _begin(self, name: str, meta: dict) -> _Trace:
+        trace_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{next(self._ids)}"
+        trace = _Trace(trace_id, name, meta)
+        self._local.trace = trace
+        with self._lock:
+            self._active[trace.thread_id] = trace
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+                self._sampler.start()
+        self.profiled += 1
+        return trace
+
+    def _end(self, trace: _Trace, failed: bool):
+        self._local.trace = None
+        with self._lock:
+            self._active.pop(trace.thread_id, None)
+        total = time.perf_counter() - trace.started
+        trace.spans[trace.name] = [1, total]
+        try:
+            self._write(trace, total, failed)
+        except Exception as e:
+            print(f"⚠️ Could not write profile {trace.trace_id}: {e}")
+
+    def _sample_loop(self):
+        """Samples the stacks of all traced threads until no trace is active."""
+        while True:
+            time.sleep(self.interval_ms / 1000.0)
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                traces = list(self._active.values())
+            frames = sys._current_frames()
+            for trace in traces:
+                frame = frames.get(trace.thread_id)
+                if frame is None:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack = ";".join(list(trace.stack) + labels[::-1])
+                trace.samples[stack] = trace.samples.get(stack, 0) + 1
+
+    def _write(self, trace: _Trace, total: float, failed: bool):
+        os.makedirs(self.output_dir, exist_ok=True)
+        folded_path = os.path.join(self.output_dir, f"{trace.trace_id}.folded")
+        with open(folded_path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(trace.samples.items()):
+                f.write(f"{stack} {count}\n")
+
+        summary = {
+            'trace_id': trace.trace_id,
+            'name': trace.name,
+            'meta': trace.meta,
+            'failed': failed,
+            'total_seconds': round(total, 4),
+            'samples': sum(trace.samples.values()),
+            'interval_ms': self.interval_ms,
+            'spans': {path: {'count': count, 'seconds': round(seconds, 4)}
+                      for path, (count, seconds) in sorted(trace.spans.items())},
+            'folded_file': os.path.basename(folded_path),
+        }
+        with open(os.path.join(self.output_dir, f"{trace.trace_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        with self._lock:
+            if len(self.recent) == self.recent.maxlen:
+                self._delete_files(self.recent[0]['trace_id'])
+            self.recent.append(summary)
+        print(f"🔬 Profile {trace.trace_id} saved ({total:.1f}s, {summary['samples']} samples).")
+
+    def _delete_files(self, trace_id: str):
+        for extension in (".folded", ".json"):
+            try:
+                os.remove(os.path.join(self.output_dir, trace_id + extension))
+            except OSError:
+                pass
+
+    # --- Reporting ---
+    def folded_path(self, trace_id: str):
+        """Returns the collapsed-stack file of a recent trace, or None."""
+        with self._lock:
+            known = any(summary['trace_id'] == trace_id for summary in self.recent)
+        path = os.path.join(self.output_dir, f"{trace_id}.folded")
+        return path if known and os.path.exists(path) else None
+
+    def summary(self) -> dict:
+        """Settings, counters and per-span totals (count, mean and p95 seconds) over the recent traces."""
+        with self._lock:
+            recent = list(self.recent)
+        per_span = {}
+        for trace in recent:
+            for path, values in trace['spans'].items():
+                per_span.setdefault(path, []).append(values['seconds'])
+        stages = {}
+        for path, durations in sorted(per_span.items()):
+            durations.sort()
+            stages[path] = {
+                'traces': len(durations),
+                'mean_seconds': round(sum(durations) / len(durations), 4),
+                'p95_seconds': round(durations[min(len(durations) - 1, int(0.95 * len(durations)))], 4),
+            }
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'interval_ms': self.interval_ms,
+            'calls': self.calls,
+            'profiled': self.profiled,
+            'active': len(self._active),
+            'stages': stages,
+            'recent': [{key: trace[key] for key in ('trace_id', 'name', 'meta', 'failed', 'total_seconds', 'samples')}
+                       for trace in reversed(recent)],
+        }
+
+
+class _TraceContext:
+    def __init__(self, profiler: Profiler, name: str, meta: dict):
+        self.profiler = profiler
+        self.name = name
+        self.meta = meta
+        self.trace = None
+
+    def __enter__(self):
+        self.trace = self.profiler._begin(self.name, self.meta)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._end(self.trace, failed=exc_type is not None)
+        return False
+
+
+# Shared by the pipeline stages; the backend's admin endpoints reconfigure it at runtime
+profiler = Profiler()
@@ -0,0 +1,149 @@
+import os
+from src.config import (
+    RESOURCE_PROCESSES, RESOURCE_RESERVED_CPUS, RESOURCE_ENGINE_SHARE, RESOURCE_HASH_FRACTION,
+    STOCKFISH_THREADS, STOCKFISH_HASH_MB, TTS_INTRA_OP_THREADS, TTS_WORKERS, TTS_SHARED_WEIGHTS,
+    POSITION_ENGINES, POSITION_ENGINE_HASH_MB
+)
+
+# Rough resident size of one XTTS model, and of everything else in a backend process
+TTS_MODEL_MB = 2048
+PROCESS_BASE_MB = 512
+
+# Stockfish's default (and smallest sensible) hash, and a cap: beyond this, analysis at
+# depth 15 doesn't get faster and the memory is better left to the page cache
+MIN_HASH_MB = 16
+MAX_HASH_MB = 2048
+
+_CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _read(path: str):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_dirs(controller: str) -> list:
+    """Directories holding this process's cgroup files for a controller (v2 unified or v1), most specific first."""
+    dirs = []
+    for line in (_read("/proc/self/cgroup") or "").splitlines():
+        _, controllers, path = line.split(":", 2)
+        if controllers == "": # cgroup v2
+            dirs.append(os.path.join(_CGROUP_ROOT, path.lstrip("/")))
+        elif controller in controllers.split(","):
+            dirs.append(os.path.join(_CGROUP_ROOT, controllers, path.lstrip("/")))
+            dirs.append(os.path.join(_CGROUP_ROOT, controller, path.lstrip("/")))
+    # Inside a container the process's cgroup is usually mounted as the root
+    return dirs + [_CGROUP_ROOT, os.path.join(_CGROUP_ROOT, controller)]
+
+
+def cgroup_cpu_limit():
+    """CPUs allowed by the cgroup CPU quota (may be fractional), or None if unlimited."""
+    for directory in _cgroup_dirs("cpu"):
+        cpu_max = _read(os.path.join(directory, "cpu.max")) # v2: "<quota> <period>" or "max <period>"
+        if cpu_max:
+            quota, _, period = cpu_max.partition(" ")
+            return None if quota == "max" else int(quota) / int(period or 100000)
+        quota = _read(os.path.join(directory, "cpu.cfs_quota_us")) # v1: -1 = unlimited
+        if quota:
+            period = _read(os.path.join(directory, "cpu.cfs_period_us")) or "100000"
+            return None if int(quota) <= 0 else int(quota) / int(period)
+    return None
+
+
+def cgroup_memory_limit_mb():
+    """Memory limit of the cgroup in MB, or None if unlimited."""
+    for directory in _cgroup_dirs("memory"):
+        limit = _read(os.path.join(directory, "memory.max")) or _read(os.path.join(directory, "memory.limit_in_bytes"))
+        if limit:
+            if limit == "max" or int(limit) >= 2 ** 60: # v1 reports "unlimited" as a huge number
+                return None
+            return int(limit) // 2 ** 20
+    return None
+
+
+def _meminfo_mb() -> dict:
+    fields = {}
+    for line in (_read("/proc/meminfo") or "").splitlines():
+        name, _, value = line.partition(":")
+        if value.strip().endswith("kB"):
+            fields[name] = int(value.split()[0]) // 1024
+    return fields
+
+
+def detect_resources() -> dict:
+    """CPUs and memory this process can actually use: the smallest of the machine, its CPU affinity and cgroup limits."""
+    cpu_count = os.cpu_count() or 1
+    affinity = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else cpu_count
+    quota = cgroup_cpu_limit()
+    cpus = affinity if quota is None else max(1, min(affinity, int(quota)))
+
+    meminfo = _meminfo_mb()
+    total_mb = meminfo.get("MemTotal")
+    cgroup_mb = cgroup_memory_limit_mb()
+    limits = [value for value in (total_mb, cgroup_mb) if value]
+    return {
+        'cpu_count': cpu_count,
+        'affinity_cpus': affinity,
+        'cgroup_cpus': round(quota, 2) if quota is not None else None,
+        'cpus': cpus,
+        'memory_total_mb': total_mb,
+        'memory_available_mb': meminfo.get("MemAvailable"),
+        'cgroup_memory_mb': cgroup_mb,
+        'memory_mb': min(limits) if limits else None,
+    }
+
+
+def plan_resources(detected: dict = None, processes: int = RESOURCE_PROCESSES, tts_workers: int = TTS_WORKERS,
+                   engine_share: float = RESOURCE_ENGINE_SHARE, reserved_cpus: int = RESOURCE_RESERVED_CPUS) -> dict:
+    """
+    Splits one backend process's share of the machine between the analysis Stockfish and torch.
+
+    CPUs: after reserving `reserved_cpus` for the event loop and helpers, `engine_share` of the
+    rest goes to Stockfish's Threads and the remainder to torch's intra-op threads, divided
+    between the TTS workers (they share torch's thread pool but can synthesize at once).
+    Hash: a power of two from RESOURCE_HASH_FRACTION of the memory left once the TTS models,
+    the position engines' hash tables and the process itself are accounted for.
+    Explicit STOCKFISH_THREADS / STOCKFISH_HASH_MB / TTS_INTRA_OP_THREADS settings are kept.
+    """
+    detected = detected or detect_resources()
+    processes = max(1, processes)
+    cpus = max(1, detected['cpus'] // processes)
+    usable = max(1, cpus - reserved_cpus)
+    engine_threads = min(usable, max(1, round(usable * engine_share)))
+    torch_threads = max(1, (usable - engine_threads) // max(1, tts_workers))
+
+    memory_mb = (detected['memory_mb'] or 0) // processes
+    tts_mb = TTS_MODEL_MB / processes if TTS_SHARED_WEIGHTS else TTS_MODEL_MB * tts_workers
+    free_mb = memory_mb - tts_mb - POSITION_ENGINES * POSITION_ENGINE_HASH_MB - PROCESS_BASE_MB
+    hash_mb = MIN_HASH_MB
+    while hash_mb * 2 <= min(MAX_HASH_MB, free_mb * RESOURCE_HASH_FRACTION):
+        hash_mb *= 2
+
+    return {
+        'processes': processes,
+        'cpus_per_process': cpus,
+        'memory_mb_per_process': memory_mb,
+        'engine_threads': STOCKFISH_THREADS or engine_threads,
+        'engine_hash_mb': STOCKFISH_HASH_MB or hash_mb,
+        'torch_threads': TTS_INTRA_OP_THREADS or torch_threads,
+        'position_engines': POSITION_ENGINES,
+        'position_engine_threads': 1,
+        'overrides': [name for name, value in (("STOCKFISH_THREADS", STOCKFISH_THREADS), ("STOCKFISH_HASH_MB", STOCKFISH_HASH_MB),
+                                               ("TTS_INTRA_OP_THREADS", TTS_INTRA_OP_THREADS)) if value],
+    }
+
+
+def engine_parameters(plan: dict) -> dict:
+    """Stockfish UCI options for the analysis engine."""
+    return {"Threads": plan['engine_threads'], "Hash": plan['engine_hash_mb']}
+
+
+def apply_torch_threads(plan: dict):
+    """Sets torch's intra-op thread count for this process. Call before loading the TTS models."""
+    import torch
+    torch.set_num_threads(plan['torch_threads'])
+    print(f"🧮 Resource plan: Stockfish {plan['engine_threads']} threads / {plan['engine_hash_mb']} MB hash, "
+          f"torch {plan['torch_threads']} threads ({plan['cpus_per_process']} CPUs for this process).")
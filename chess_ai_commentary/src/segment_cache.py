@@ -0,0 +1,133 @@
+import os
+import hashlib
+import tempfile
+import threading
+import wave
+from collections import OrderedDict
+import numpy as np
+
+class SegmentCache:
+    """
+    A bounded, disk-backed LRU cache of synthesized TTS segments.
+    Each entry is a 16-bit mono WAV file keyed by (sentence, voice, language, model variant),
+    so stock phrases are only synthesized once across all jobs, and audio from the baseline,
+    int8-quantized and shared-weights models is never mixed.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        """Opens (or creates) the cache directory and indexes existing entries."""
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+        print(f"✅ TTS segment cache ready: {len(self._index)} segments ({self._total_bytes / 1e6:.1f} MB) in {self.cache_dir}")
+
+    @staticmethod
+    def make_key(sentence: str, voice_id: str, language: str, model_variant: str = "xtts") -> str:
+        """Builds a stable cache key. Whitespace is normalized, case and punctuation are kept."""
+        normalized = " ".join(sentence.split())
+        return hashlib.sha1(f"{model_variant}\x00{voice_id}\x00{language}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def _path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.wav")
+
+    def _load_index(self):
+        """Rebuilds the LRU order from the files on disk, oldest access first."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".wav"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def get(self, key: str, sample_rate: int):
+        """Returns the cached int16 samples for a key, or None on a miss."""
+        path = self._path_for(key)
+        try:
+            with wave.open(path, "rb") as wf:
+                if wf.getframerate() != sample_rate or wf.getsampwidth() != 2:
+                    raise ValueError("sample format mismatch")
+                samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+            os.utime(path)
+        except (OSError, EOFError, ValueError, wave.Error):
+            # Missing, evicted by another worker, or unreadable: treat as a miss.
+            with self._lock:
+                self.misses += 1
+                size = self._index.pop(key, None)
+                if size is not None:
+                    self._total_bytes -= size
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._index:
+                self._index.move_to_end(key)
+            else:
+                self._index[key] = os.path.getsize(path)
+                self._total_bytes += self._index[key]
+        return samples
+
+    def put(self, key: str, samples: np.ndarray, sample_rate: int):
+        """Stores int16 samples for a key, evicting least recently used entries if over budget."""
+        path = self._path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file first so concurrent readers never see a partial WAV.
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                with wave.open(f, "wb") as wf:
+                    wf.setnchannels(1)
+                    wf.setsampwidth(2)
+                    wf.setframerate(sample_rate)
+                    wf.writeframes(samples.astype(np.int16).tobytes())
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️ Could not write TTS segment to cache: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            size = os.path.getsize(path)
+            self._total_bytes += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._evict()
+
+    def _evict(self):
+        """Removes least recently used entries until the cache fits its byte budget."""
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path_for(key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and current disk usage."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'segments': len(self._index),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,57 @@
+import os
+import json
+
+# The WAV files written by VoiceGenerator are 16-bit mono PCM with a canonical
+# 44-byte header (RIFF + fmt + data chunk headers), so sample offsets map
+# directly to byte offsets for HTTP Range requests.
+WAV_HEADER_BYTES = 44
+SAMPLE_WIDTH_BYTES = 2
+
+def timeline_path_for(audio_path: str) -> str:
+    """Returns the path of the timeline index stored next to an audio file."""
+    return os.path.splitext(audio_path)[0] + ".timeline.json"
+
+def build_timeline(moves: list, spans: list, sample_rate: int, audio_filename: str) -> dict:
+    """
+    Builds a per-move index into a commentary WAV file.
+    `moves` and `spans` are parallel lists: spans[i] is the (start_sample, end_sample)
+    range of moves[i]'s commentary. End offsets are exclusive, so a move's bytes
+    are requested with `Range: bytes={start_byte}-{end_byte - 1}`.
+    """
+    entries = []
+    for move, (start_sample, end_sample) in zip(moves, spans):
+        entries.append({
+            'move_number': move.get('move_number'),
+            'move_san': move.get('move_san'),
+            'player': move.get('player'),
+            'start_sample': start_sample,
+            'end_sample': end_sample,
+            'start_time': round(start_sample / sample_rate, 3),
+            'end_time': round(end_sample / sample_rate, 3),
+            'start_byte': WAV_HEADER_BYTES + start_sample * SAMPLE_WIDTH_BYTES,
+            'end_byte': WAV_HEADER_BYTES + end_sample * SAMPLE_WIDTH_BYTES,
+        })
+
+    return {
+        'audio_file': audio_filename,
+        'sample_rate': sample_rate,
+        'channels': 1,
+        'sample_width': SAMPLE_WIDTH_BYTES,
+        'data_offset': WAV_HEADER_BYTES,
+        'moves': entries,
+    }
+
+def save_timeline(timeline: dict, audio_path: str) -> str:
+    """Writes the timeline index next to its audio file and returns the index path."""
+    path = timeline_path_for(audio_path)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(timeline, f)
+    return path
+
+def load_timeline(audio_path: str):
+    """Loads the timeline index for an audio file, or None if it has none."""
+    path = timeline_path_for(audio_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,143 @@
+import os
+import wave
+import threading
+from types import SimpleNamespace
+import numpy as np
+import torch
+from TTS.tts.configs.xtts_config import XttsConfig
+from TTS.tts.models.xtts import Xtts
+from src.utils import _legacy_torch_load
+from src.config import TTS_MODEL_NAME, TTS_SHARED_WEIGHTS_PATH
+
+# torch.load(mmap=True) and load_state_dict(assign=True) need PyTorch 2.1+
+_MIN_TORCH = (2, 1)
+
+
+def shared_weights_path(model_dir: str = TTS_MODEL_NAME) -> str:
+    return TTS_SHARED_WEIGHTS_PATH or os.path.join(model_dir, "model_mmap.pt")
+
+
+def export_shared_weights(model_dir: str = TTS_MODEL_NAME, weights_path: str = None) -> str:
+    """
+    Converts the XTTS checkpoint in model_dir to a plain state_dict file that torch.load can
+    memory-map: weights only, no optimizer/trainer state, tensors stored uncompressed in
+    torch's zip format. The file is written to a temporary name and renamed, so workers
+    starting at the same time never see a partial file. Returns its path.
+    """
+    weights_path = weights_path or shared_weights_path(model_dir)
+    print(f"📦 Exporting memory-mappable XTTS weights to {weights_path}...")
+    config = XttsConfig()
+    config.load_json(os.path.join(model_dir, "config.json"))
+    model = Xtts.init_from_config(config)
+    with _legacy_torch_load():
+        model.load_checkpoint(config, checkpoint_dir=model_dir, eval=True)
+
+    temp_path = f"{weights_path}.{os.getpid()}.tmp"
+    torch.save(model.state_dict(), temp_path)
+    os.replace(temp_path, weights_path)
+    print(f"✅ Exported {os.path.getsize(weights_path) / 2**20:.0f} MB of weights.")
+    return weights_path
+
+
+def load_shared_xtts(model_dir: str = TTS_MODEL_NAME, weights_path: str = None):
+    """
+    Loads XTTS with its weights memory-mapped (read-only, copy-on-write) from the exported
+    state_dict instead of copied into process memory. Every process (uvicorn workers,
+    forked or spawned) and every extra TTS model in one process maps the same file, so the
+    weights sit in the OS page cache once; each model only owns its activations and the few
+    buffers that aren't part of the state_dict.
+
+    Module construction still allocates freshly initialized weights for a moment; they are
+    released as soon as the mapped tensors are assigned in their place.
+    Returns a SharedXtts adapter, or raises on failure.
+    """
+    if tuple(int(part) for part in torch.__version__.split(".")[:2]) < _MIN_TORCH:
+        raise RuntimeError(f"Shared TTS weights need PyTorch >= 2.1 (found {torch.__version__})")
+
+    weights_path = weights_path or shared_weights_path(model_dir)
+    if not os.path.exists(weights_path):
+        export_shared_weights(model_dir, weights_path)
+
+    config = XttsConfig()
+    config.load_json(os.path.join(model_dir, "config.json"))
+    model = Xtts.init_from_config(config)
+    state_dict = torch.load(weights_path, mmap=True, weights_only=True, map_location="cpu")
+
+    # load_checkpoint also sets up the tokenizer, speakers and GPT inference wrapper; have it take the
+    # mapped state_dict as is (instead of reading model.pth) and assign its tensors rather than copying them
+    model.get_compatible_checkpoint_state_dict = lambda model_path: state_dict
+    model.load_state_dict = lambda checkpoint, strict=True: torch.nn.Module.load_state_dict(model, checkpoint, strict=strict, assign=True)
+    try:
+        model.load_checkpoint(config, checkpoint_dir=model_dir, eval=True)
+    finally:
+        del model.get_compatible_checkpoint_state_dict
+        del model.load_state_dict
+    for parameter in model.parameters():
+        parameter.requires_grad_(False)
+
+    print(f"✅ XTTS loaded with memory-mapped weights from {weights_path}")
+    return SharedXtts(model, config)
+
+
+class SharedXtts:
+    """
+    The subset of the Coqui TTS API the project uses (tts(), tts_to_file(), synthesizer.output_sample_rate),
+    on top of an Xtts model loaded by load_shared_xtts. Conditioning latents are computed once
+    per reference voice file and reused.
+    """
+
+    def __init__(self, model: Xtts, config: XttsConfig):
+        self.model = model
+        self.config = config
+        # synthesizer.tts_model lets optimize_tts_for_cpu() reach the model, as with a TTS object
+        self.synthesizer = SimpleNamespace(tts_model=model, output_sample_rate=config.model_args.output_sample_rate)
+        self._latents = {}
+        self._latents_lock = threading.Lock()
+
+    def _conditioning(self, speaker_wav: str = None, speaker: str = None):
+        """Returns (gpt_cond_latent, speaker_embedding) for a reference WAV or a built-in speaker name."""
+        if speaker:
+            latents = self.model.speaker_manager.speakers[speaker]
+            return latents["gpt_cond_latent"], latents["speaker_embedding"]
+        stat = os.stat(speaker_wav)
+        key = (speaker_wav, stat.st_mtime_ns, stat.st_size)
+        with self._latents_lock:
+            if key not in self._latents:
+                self._latents[key] = self.model.get_conditioning_latents(
+                    audio_path=[speaker_wav],
+                    gpt_cond_len=self.config.gpt_cond_len,
+                    max_ref_length=self.config.max_ref_len,
+                    sound_norm_refs=self.config.sound_norm_refs,
+                )
+            return self._latents[key]
+
+    def tts(self, text: str, speaker: str = None, language: str = None, speaker_wav=None, split_sentences: bool = True, **kwargs):
+        """Synthesizes text and returns the waveform as a list of floats (like TTS.api.TTS.tts)."""
+        if isinstance(speaker_wav, (list, tuple)):
+            speaker_wav = speaker_wav[0]
+        with torch.inference_mode():
+            gpt_cond_latent, speaker_embedding = self._conditioning(speaker_wav, speaker)
+            output = self.model.inference(
+                text, language, gpt_cond_latent, speaker_embedding,
+                temperature=self.config.temperature,
+                length_penalty=self.config.length_penalty,
+                repetition_penalty=self.config.repetition_penalty,
+                top_k=self.config.top_k,
+                top_p=self.config.top_p,
+                enable_text_splitting=split_sentences,
+            )
+        wav = output["wav"]
+        if torch.is_tensor(wav):
+            wav = wav.cpu().numpy()
+        return np.asarray(wav, dtype=np.float32).squeeze().tolist()
+
+    def tts_to_file(self, text: str, speaker: str = None, language: str = None, speaker_wav=None,
+                    file_path: str = "output.wav", split_sentences: bool = True, **kwargs) -> str:
+        """Synthesizes text into a 16-bit mono WAV file. Returns its path."""
+        wav = np.clip(np.asarray(self.tts(text, speaker, language, speaker_wav, split_sentences), dtype=np.float32), -1.0, 1.0)
+        with wave.open(file_path, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.synthesizer.output_sample_rate)
+            wf.writeframes((wav * 32767).astype(np.int16).tobytes())
+        return file_path
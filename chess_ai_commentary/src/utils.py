@@ -1,5 +1,8 @@
 import os
 import torch
+import functools
+import threading
+from contextlib import contextmanager
 import google.generativeai as genai
 from stockfish import Stockfish
 from TTS.api import TTS
@@ -8,6 +11,10 @@ import requests
 
 # We need to import the config to get the API key for initialization
 from src.config import GEMINI_API_KEY, STOCKFISH_PATH, DEVICE, TTS_MODEL_NAME
+from src.config import TTS_FAST_CPU, TTS_INTRA_OP_THREADS, TTS_INTER_OP_THREADS, TTS_QUANTIZE, TTS_COMPILE, TTS_SHARED_WEIGHTS
+
+# Serializes the torch.load patch below, so concurrent model loads can't restore each other's patch
+_TORCH_LOAD_LOCK = threading.Lock()
 
 # This is your SAMPLE_GAMES dictionary, now stored in utils
 SAMPLE_GAMES = {
@@ -47,28 +54,127 @@ def setup_environment():
     print(f"🐍 PyTorch version: {torch.__version__}")
     return DEVICE
 
-def initialize_tts_model(model_name=TTS_MODEL_NAME, device=DEVICE):
-    """Loads the Coqui TTS model with a compatibility patch for PyTorch."""
-    
-    print("\n2. Initializing Coqui TTS model...")
-    try:
-        # --- START: Robust PyTorch Patch ---
+@contextmanager
+def _legacy_torch_load():
+    """Makes torch.load default to weights_only=False (needed by XTTS checkpoints) for the duration of the block."""
+    with _TORCH_LOAD_LOCK:
         original_load = torch.load
-        
+
         def patched_load(*args, **kwargs):
             kwargs['weights_only'] = False
             return original_load(*args, **kwargs)
-        
+
         torch.load = patched_load
-        # --- END: Robust PyTorch Patch ---
+        try:
+            yield
+        finally:
+            # --- IMPORTANT: Always restore the original torch.load function ---
+            torch.load = original_load
 
-        # Load the TTS model
-        tts = TTS(model_name).to(device)
+def _conv1d_to_linear(module):
+    """
+    Replaces transformers' GPT-2 Conv1D layers (a Linear with transposed weights) with nn.Linear,
+    so dynamic quantization picks them up. Works in place and returns the number of layers replaced.
+    """
+    replaced = 0
+    for name, child in module.named_children():
+        if type(child).__name__ == "Conv1D" and hasattr(child, "nf"):
+            linear = torch.nn.Linear(child.weight.shape[0], child.nf, bias=child.bias is not None)
+            linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous(), requires_grad=False)
+            if child.bias is not None:
+                linear.bias = torch.nn.Parameter(child.bias.detach().clone(), requires_grad=False)
+            setattr(module, name, linear)
+            replaced += 1
+        else:
+            replaced += _conv1d_to_linear(child)
+    return replaced
+
+def optimize_tts_for_cpu(tts, intra_op_threads=TTS_INTRA_OP_THREADS, inter_op_threads=TTS_INTER_OP_THREADS,
+                         quantize=TTS_QUANTIZE, compile_model=TTS_COMPILE):
+    """
+    Applies the fast CPU mode to a loaded TTS model (in place) and returns it:
+    - explicit intra-op / inter-op thread counts (0 keeps PyTorch's default)
+    - every tts() call (and so tts_to_file()) runs under torch.inference_mode()
+    - dynamic int8 quantization of the XTTS GPT's linear layers, which dominate CPU time
+    - optionally torch.compile on the HiFi-GAN vocoder
+    Each step is skipped with a warning if it fails, leaving the model usable.
+    """
+    print("⚡ Enabling fast CPU mode for TTS...")
+    if intra_op_threads > 0:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            # Only allowed before PyTorch runs any inter-op parallel work in this process
+            print(f"⚠️ Could not set inter-op threads: {e}")
+    print(f"   - Threads: {torch.get_num_threads()} intra-op, {torch.get_num_interop_threads()} inter-op")
+
+    model = tts.synthesizer.tts_model
+    model.eval()
 
-        # --- IMPORTANT: Restore the original torch.load function ---
-        torch.load = original_load
+    if quantize:
+        try:
+            converted = _conv1d_to_linear(model.gpt)
+            # In place, so the GPT-2 inference wrapper that shares these layers sees the change too
+            torch.ao.quantization.quantize_dynamic(model.gpt, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+            tts.model_variant = f"{getattr(tts, 'model_variant', 'xtts')}+int8"
+            print(f"   - GPT linear layers quantized to int8 ({converted} Conv1D layers converted first)")
+        except Exception as e:
+            print(f"⚠️ Dynamic quantization skipped: {e}")
+
+    if compile_model:
+        try:
+            model.hifigan_decoder = torch.compile(model.hifigan_decoder, dynamic=True)
+            tts.model_variant = f"{getattr(tts, 'model_variant', 'xtts')}+compiled"
+            print("   - HiFi-GAN decoder compiled (the first synthesis will be slow)")
+        except Exception as e:
+            print(f"⚠️ torch.compile skipped: {e}")
+
+    tts_call = tts.tts
+
+    @functools.wraps(tts_call)
+    def tts_inference_mode(*args, **kwargs):
+        with torch.inference_mode():
+            return tts_call(*args, **kwargs)
+
+    tts.tts = tts_inference_mode # Instance attribute, so tts_to_file() goes through it too
+    print("✅ Fast CPU mode enabled.")
+    return tts
+
+def _model_label(model_name: str) -> str:
+    """Short model name for the variant tag, e.g. "xtts_v2" from the model folder."""
+    return os.path.basename(os.path.normpath(model_name)).split("--")[-1]
+
+def initialize_tts_model(model_name=TTS_MODEL_NAME, device=DEVICE, fast_cpu=TTS_FAST_CPU, shared_weights=TTS_SHARED_WEIGHTS):
+    """
+    Loads the Coqui TTS model with a compatibility patch for PyTorch.
+    With fast_cpu (and a CPU device), also applies optimize_tts_for_cpu().
+    With shared_weights (and a CPU device), the weights are memory-mapped and shared between
+    processes (see src/tts_shared.py); the returned adapter has the same tts()/tts_to_file() API.
+    The returned model has a `model_variant` string (e.g. "xtts_v2+cpu+int8") naming the weights and
+    optimizations in use, so the TTS segment cache never mixes audio from different variants.
+    """
+    
+    print("\n2. Initializing Coqui TTS model...")
+    try:
+        if shared_weights and device == "cpu":
+            from src.tts_shared import load_shared_xtts # Imports the XTTS model classes
+            tts = load_shared_xtts(model_name)
+            tts.model_variant = f"{_model_label(model_name)}+mmap"
+            if fast_cpu:
+                optimize_tts_for_cpu(tts, quantize=False) # Quantizing would copy the shared weights
+            return tts
+
+        # Load the TTS model
+        with _legacy_torch_load():
+            tts = TTS(model_name).to(device)
+        tts.model_variant = f"{_model_label(model_name)}+{device}"
         
         print("✅ Coqui TTS model loaded successfully!")
+
+        if fast_cpu and device == "cpu":
+            optimize_tts_for_cpu(tts)
         return tts
         
     except Exception as e:
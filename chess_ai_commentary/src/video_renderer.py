@@ -0,0 +1,266 @@
+import os
+import wave
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+import chess
+from src.chess_analyzer import ChessAnalyzer
+from src.timeline import load_timeline
+from src.config import (
+    VIDEO_TEMPLATE_DIR, VIDEO_OUTPUT_DIR, VIDEO_BOARD_SIZE, VIDEO_FPS,
+    VIDEO_WORKERS, VIDEO_FRAME_CACHE_SIZE, FFMPEG_PATH
+)
+
+# BGR tint blended over the from/to squares of the last move
+LAST_MOVE_COLOR = np.array([80, 220, 240], dtype=np.float32)
+LAST_MOVE_ALPHA = 0.35
+
+
+class BoardRenderer:
+    """
+    Draws board positions from the piece/square sprites in input/templates
+    (e.g. wP_L.png is a white pawn on a light square, empty_D.png a dark square).
+    Sprites are scaled once per board size, and rendered boards are kept in an
+    LRU cache keyed by placement, last move and orientation, so repeated positions
+    (and the many frames of one move) cost nothing.
+    """
+
+    def __init__(self, template_dir: str = VIDEO_TEMPLATE_DIR, board_size: int = VIDEO_BOARD_SIZE,
+                 cache_size: int = VIDEO_FRAME_CACHE_SIZE):
+        self.square = board_size // 8
+        self.board_size = self.square * 8
+        self.cache_size = cache_size
+        self._boards = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._sprites = self._load_sprites(template_dir)
+
+    def _load_sprites(self, template_dir: str) -> dict:
+        """Returns {(piece symbol or None, is_light): square image} for every piece on both square colors."""
+        sprites = {}
+        backgrounds = {}
+        for is_light, suffix in ((True, "L"), (False, "D")):
+            empty = cv2.imread(os.path.join(template_dir, f"empty_{suffix}.png"), cv2.IMREAD_COLOR)
+            if empty is None:
+                raise FileNotFoundError(f"Missing sprite empty_{suffix}.png in {template_dir}")
+            backgrounds[is_light] = empty[empty.shape[0] // 2, empty.shape[1] // 2].copy()
+            sprites[(None, is_light)] = np.full((self.square, self.square, 3), backgrounds[is_light], dtype=np.uint8)
+
+        for color in "wb":
+            for piece in "PNBRQK":
+                symbol = piece if color == "w" else piece.lower()
+                for is_light, suffix in ((True, "L"), (False, "D")):
+                    tile = cv2.imread(os.path.join(template_dir, f"{color}{piece}_{suffix}.png"), cv2.IMREAD_COLOR)
+                    if tile is None:
+                        raise FileNotFoundError(f"Missing sprite {color}{piece}_{suffix}.png in {template_dir}")
+                    sprites[(symbol, is_light)] = self._fit(tile, backgrounds[is_light])
+        return sprites
+
+    def _fit(self, tile: np.ndarray, background: np.ndarray) -> np.ndarray:
+        """Scales a (cropped, not always square) sprite to fit a square, centered on the square's color."""
+        scale = min(self.square / tile.shape[0], self.square / tile.shape[1])
+        height, width = max(1, round(tile.shape[0] * scale)), max(1, round(tile.shape[1] * scale))
+        resized = cv2.resize(tile, (width, height), interpolation=cv2.INTER_AREA)
+        out = np.full((self.square, self.square, 3), background, dtype=np.uint8)
+        top, left = (self.square - height) // 2, (self.square - width) // 2
+        out[top:top + height, left:left + width] = resized
+        return out
+
+    def render(self, fen: str, last_move: str = None, flipped: bool = False) -> np.ndarray:
+        """Returns the board image (BGR, board_size x board_size) for a FEN. The array is shared; don't modify it."""
+        key = (fen.split(" ")[0], last_move, flipped)
+        frame = self._boards.get(key)
+        if frame is not None:
+            self._boards.move_to_end(key)
+            self.hits += 1
+            return frame
+        self.misses += 1
+
+        board = chess.Board(fen)
+        highlighted = set()
+        if last_move:
+            move = chess.Move.from_uci(last_move)
+            highlighted = {move.from_square, move.to_square}
+
+        frame = np.empty((self.board_size, self.board_size, 3), dtype=np.uint8)
+        size = self.square
+        for square in chess.SQUARES:
+            file, rank = chess.square_file(square), chess.square_rank(square)
+            row, col = (rank, 7 - file) if flipped else (7 - rank, file)
+            piece = board.piece_at(square)
+            tile = self._sprites[(piece.symbol() if piece else None, (file + rank) % 2 == 1)]
+            if square in highlighted:
+                tile = (tile * (1 - LAST_MOVE_ALPHA) + LAST_MOVE_COLOR * LAST_MOVE_ALPHA).astype(np.uint8)
+            frame[row * size:(row + 1) * size, col * size:(col + 1) * size] = tile
+
+        frame.setflags(write=False)
+        self._boards[key] = frame
+        if len(self._boards) > self.cache_size:
+            self._boards.popitem(last=False)
+        return frame
+
+
+def build_scenes(pgn_string: str, timeline: dict, audio_seconds: float, fps: int = VIDEO_FPS) -> list:
+    """
+    Turns the audio timeline into a list of (fen, last_move_uci, frame_count) scenes.
+    The starting position is shown until the first narrated move; each narrated move's
+    position is then held until the next one starts. Frame counts are computed from
+    absolute times, so the video never drifts from the audio.
+    """
+    mainline = ChessAnalyzer._read_mainline(pgn_string) # Falls back to python-chess on movetext the fast parser rejects
+    if not mainline:
+        raise ValueError("Invalid PGN")
+
+    scenes = [(mainline['start_fen'], None, 0.0)]
+    for entry in timeline.get('moves', []):
+        ply = entry.get('move_number')
+        if not ply or ply > len(mainline['fen']):
+            continue
+        scenes.append((mainline['fen'][ply - 1], mainline['uci'][ply - 1], entry['start_time']))
+
+    result = []
+    for i, (fen, last_move, start) in enumerate(scenes):
+        end = scenes[i + 1][2] if i + 1 < len(scenes) else audio_seconds
+        frames = round(end * fps) - round(start * fps)
+        if frames > 0:
+            result.append((fen, last_move, frames))
+    return result
+
+
+# --- Worker processes ---
+_worker_renderer = None
+
+def _init_worker(template_dir: str, board_size: int, cache_size: int):
+    global _worker_renderer
+    _worker_renderer = BoardRenderer(template_dir, board_size, cache_size)
+
+
+def _encode_segment(args):
+    """
+    Encodes one run of consecutive scenes to an H.264 segment (in a worker process).
+    Each distinct board is written once as a PNG and held for its duration with ffmpeg's
+    concat demuxer, so a still position costs one render no matter how long it is shown.
+    """
+    scenes, flipped, fps, work_dir, index, ffmpeg = args
+    segment_dir = os.path.join(work_dir, f"segment_{index:04d}")
+    os.makedirs(segment_dir, exist_ok=True)
+
+    lines = []
+    frame_paths = {}
+    for fen, last_move, frames in scenes:
+        key = (fen.split(" ")[0], last_move)
+        path = frame_paths.get(key)
+        if path is None:
+            path = os.path.join(segment_dir, f"frame_{len(frame_paths):04d}.png")
+            cv2.imwrite(path, _worker_renderer.render(fen, last_move, flipped), [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            frame_paths[key] = path
+        lines.append(f"file '{path}'\nduration {frames / fps:.6f}")
+    lines.append(f"file '{path}'") # The concat demuxer ignores the last entry's duration
+
+    list_path = os.path.join(segment_dir, "frames.txt")
+    with open(list_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+    total_frames = sum(frames for _, _, frames in scenes)
+    output_path = os.path.join(work_dir, f"segment_{index:04d}.mp4")
+    command = [
+        ffmpeg, "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-vf", f"fps={fps}", "-frames:v", str(total_frames),
+        "-c:v", "libx264", "-preset", "veryfast", "-tune", "stillimage",
+        "-pix_fmt", "yuv420p", "-r", str(fps),
+        output_path,
+    ]
+    subprocess.run(command, check=True, capture_output=True)
+    return output_path
+
+
+def _split_scenes(scenes: list, parts: int) -> list:
+    """Splits scenes into up to `parts` contiguous runs with roughly equal frame counts."""
+    total = sum(frames for _, _, frames in scenes)
+    target = max(1, total / max(1, parts))
+    runs, current, current_frames = [], [], 0
+    for scene in scenes:
+        current.append(scene)
+        current_frames += scene[2]
+        if current_frames >= target and len(runs) < parts - 1:
+            runs.append(current)
+            current, current_frames = [], 0
+    if current:
+        runs.append(current)
+    return runs
+
+
+def _audio_seconds(audio_path: str) -> float:
+    with wave.open(audio_path, "rb") as wf:
+        return wf.getnframes() / wf.getframerate()
+
+
+def render_commentary_video(pgn_string: str, audio_path: str, output_path: str = None, flipped: bool = False,
+                            fps: int = VIDEO_FPS, workers: int = VIDEO_WORKERS):
+    """
+    Renders a board-animation video for a generated commentary WAV and muxes the audio into it.
+    Board changes follow the per-move timeline saved next to the audio (see src/timeline.py).
+    Segments are encoded in parallel worker processes and joined without re-encoding.
+    Workers are spawned, not forked: the server process runs torch, Stockfish and executor
+    threads, and forking a threaded process can deadlock the child on a lock held at fork time.
+    Returns the .mp4 path, or None on failure.
+    """
+    ffmpeg = shutil.which(FFMPEG_PATH)
+    if not ffmpeg:
+        print(f"❌ ffmpeg not found ({FFMPEG_PATH}); cannot render video.")
+        return None
+    timeline = load_timeline(audio_path)
+    if not timeline:
+        print(f"❌ No timeline found for {audio_path}; cannot render video.")
+        return None
+
+    if not output_path:
+        os.makedirs(VIDEO_OUTPUT_DIR, exist_ok=True)
+        output_path = os.path.join(VIDEO_OUTPUT_DIR, os.path.splitext(os.path.basename(audio_path))[0] + ".mp4")
+
+    try:
+        scenes = build_scenes(pgn_string, timeline, _audio_seconds(audio_path), fps)
+        runs = _split_scenes(scenes, workers)
+        print(f"🎬 Rendering video: {len(scenes)} scenes, {sum(s[2] for s in scenes)} frames, {len(runs)} segments on {workers} workers...")
+
+        with tempfile.TemporaryDirectory(prefix="chess_video_") as work_dir:
+            jobs = [(run, flipped, fps, work_dir, i, ffmpeg) for i, run in enumerate(runs)]
+            if workers > 1 and len(runs) > 1:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init_worker,
+                                         initargs=(VIDEO_TEMPLATE_DIR, VIDEO_BOARD_SIZE, VIDEO_FRAME_CACHE_SIZE)) as pool:
+                    segments = list(pool.map(_encode_segment, jobs))
+            else:
+                _init_worker(VIDEO_TEMPLATE_DIR, VIDEO_BOARD_SIZE, VIDEO_FRAME_CACHE_SIZE)
+                segments = [_encode_segment(job) for job in jobs]
+
+            concat_path = os.path.join(work_dir, "segments.txt")
+            with open(concat_path, "w") as f:
+                f.write("".join(f"file '{segment}'\n" for segment in segments))
+
+            command = [
+                ffmpeg, "-y", "-loglevel", "error",
+                "-f", "concat", "-safe", "0", "-i", concat_path,
+                "-i", audio_path,
+                "-map", "0:v", "-map", "1:a",
+                "-c:v", "copy", "-c:a", "aac", "-b:a", "128k",
+                "-movflags", "+faststart", "-shortest",
+                output_path,
+            ]
+            subprocess.run(command, check=True, capture_output=True)
+
+        print(f"✅ Video saved to: {output_path}")
+        return output_path
+
+    except subprocess.CalledProcessError as e:
+        print(f"❌ ffmpeg failed: {e.stderr.decode(errors='replace').strip()}")
+        return None
+    except Exception as e:
+        print(f"❌ Video rendering failed: {e}")
+        return None
@@ -1,8 +1,22 @@
 import os
+import re
+import hashlib
 import tempfile
+import threading
+import wave
 import pygame
 import time
+import numpy as np
 from TTS.api import TTS
+from src.segment_cache import SegmentCache
+from src.profiler import profiler
+from src.cancellation import JobCancelled
+
+# Split after sentence-ending punctuation (including "!" in "Checkmate!") followed by whitespace.
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])\s+')
+
+# Silence inserted between sentences when assembling segmented audio.
+SENTENCE_PAUSE_SECONDS = 0.4
 
 class VoiceGenerator:
     """
@@ -11,9 +25,17 @@ class VoiceGenerator:
     and voice cloning (for Gradio app).
     """
     
-    def __init__(self, tts_model: TTS):
-        """Initializes the voice generator with the loaded TTS model."""
+    def __init__(self, tts_model: TTS, segment_cache: SegmentCache = None):
+        """
+        Initializes the voice generator with the loaded TTS model.
+        If a segment_cache is given, cloned-voice audio is synthesized
+        sentence by sentence and repeated sentences are reused from the cache.
+        """
         self.tts_model = tts_model
+        self.segment_cache = segment_cache
+        self.model_variant = getattr(tts_model, "model_variant", "xtts") # Set by initialize_tts_model
+        self._voice_ids = {}
+        self._tts_lock = threading.Lock() # XTTS inference is not thread-safe
         # This is the default built-in speaker for the notebook
         self.notebook_speaker_name = "Claribel Dervla" 
         
@@ -38,6 +60,9 @@ class VoiceGenerator:
             print(f"❌ Speaker WAV file not found: {speaker_wav_path}")
             return None
 
+        if self.segment_cache:
+            return self.generate_audio_segmented(text, speaker_wav_path, language, output_path)
+
         try:
             print(f"🎤 Generating audio with cloned voice from: {os.path.basename(speaker_wav_path)}...")
             start_time = time.time()
@@ -58,6 +83,123 @@ class VoiceGenerator:
             print(f"❌ Audio generation failed: {e}")
             return None
 
+    # --- Segmented synthesis with cross-job sentence cache ---
+    @staticmethod
+    def split_sentences(text: str) -> list:
+        """Splits commentary text into sentences for per-sentence synthesis and caching."""
+        return [s.strip() for s in _SENTENCE_BOUNDARY.split(text) if s.strip()]
+
+    def get_sample_rate(self) -> int:
+        """Output sample rate of the loaded model (XTTS v2 produces 24 kHz audio)."""
+        synthesizer = getattr(self.tts_model, 'synthesizer', None)
+        return getattr(synthesizer, 'output_sample_rate', None) or 24000
+
+    def _voice_id(self, speaker_wav_path: str) -> str:
+        """Content hash of the reference voice, memoized per file version."""
+        stat = os.stat(speaker_wav_path)
+        memo_key = (speaker_wav_path, stat.st_mtime_ns, stat.st_size)
+        if memo_key not in self._voice_ids:
+            with open(speaker_wav_path, 'rb') as f:
+                self._voice_ids[memo_key] = hashlib.sha1(f.read()).hexdigest()
+        return self._voice_ids[memo_key]
+
+    def _synthesize_sentence(self, sentence: str, speaker_wav_path: str, language: str) -> np.ndarray:
+        """Runs XTTS on a single sentence and returns 16-bit PCM samples."""
+        with profiler.span("xtts"), self._tts_lock:
+            wav = self.tts_model.tts(
+                text=sentence,
+                speaker_wav=speaker_wav_path,
+                language=language,
+                split_sentences=False # <-- We already split into sentences
+            )
+        wav = np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0)
+        return (wav * 32767).astype(np.int16)
+
+    def _sentence_samples(self, sentence: str, speaker_wav_path: str, voice_id: str, language: str, sample_rate: int):
+        """Returns samples for one sentence from the cache, synthesizing on a miss. Second value is True if fresh."""
+        if not self.segment_cache:
+            return self._synthesize_sentence(sentence, speaker_wav_path, language), True
+
+        key = SegmentCache.make_key(sentence, voice_id, language, self.model_variant)
+        samples = self.segment_cache.get(key, sample_rate)
+        if samples is not None:
+            return samples, False
+        samples = self._synthesize_sentence(sentence, speaker_wav_path, language)
+        self.segment_cache.put(key, samples, sample_rate)
+        return samples, True
+
+    def generate_audio_segmented(self, text: str, speaker_wav_path: str, language: str, output_path: str):
+        """
+        Generates cloned-voice audio one sentence at a time, reusing cached
+        sentences and caching fresh ones, then assembles a single WAV file.
+        """
+        output_path, _ = self.generate_timed_audio([text], speaker_wav_path, language, output_path)
+        return output_path
+
+    def generate_timed_audio(self, chunks: list, speaker_wav_path: str, language: str, output_path: str, cancel_token=None):
+        """
+        Synthesizes a list of text chunks (e.g. one per move) into a single WAV file.
+        Returns (output_path, spans) where spans[i] is the (start_sample, end_sample)
+        range of chunks[i] in the output, or (None, None) on failure.
+        A cancelled cancel_token (src.cancellation) stops before the next sentence with JobCancelled.
+        """
+        if not self.tts_model:
+            print("❌ TTS model not configured.")
+            return None, None
+        if not os.path.exists(speaker_wav_path):
+            print(f"❌ Speaker WAV file not found: {speaker_wav_path}")
+            return None, None
+
+        try:
+            chunk_sentences = [self.split_sentences(chunk) for chunk in chunks]
+            total_sentences = sum(len(sentences) for sentences in chunk_sentences)
+            print(f"🎤 Generating segmented audio for {total_sentences} sentences with cloned voice from: {os.path.basename(speaker_wav_path)}...")
+            start_time = time.time()
+
+            sample_rate = self.get_sample_rate()
+            voice_id = self._voice_id(speaker_wav_path)
+            pause = np.zeros(int(SENTENCE_PAUSE_SECONDS * sample_rate), dtype=np.int16)
+
+            segments = []
+            spans = []
+            position = 0
+            fresh = 0
+            for sentences in chunk_sentences:
+                chunk_start = position
+                for sentence in sentences:
+                    if cancel_token:
+                        cancel_token.check()
+                    samples, is_fresh = self._sentence_samples(sentence, speaker_wav_path, voice_id, language, sample_rate)
+                    fresh += is_fresh
+                    segments.append(samples)
+                    position += len(samples)
+                    # Each sentence owns the pause after it, so chunks tile the file without gaps.
+                    segments.append(pause)
+                    position += len(pause)
+                spans.append((chunk_start, position))
+
+            audio = np.concatenate(segments) if segments else np.zeros(0, dtype=np.int16)
+            with wave.open(output_path, 'wb') as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(sample_rate)
+                wf.writeframes(audio.tobytes())
+
+            gen_time = time.time() - start_time
+            print(f"✅ Audio generated in {gen_time:.2f} seconds ({fresh} synthesized, {total_sentences - fresh} from cache).")
+            if self.segment_cache:
+                stats = self.segment_cache.stats()
+                print(f"   📈 Segment cache hit rate: {stats['hit_rate']:.1%} ({stats['segments']} segments, {stats['bytes'] / 1e6:.1f} MB)")
+            print(f"   💾 File saved to: {output_path}")
+            return output_path, spans
+
+        except JobCancelled:
+            print(f"🛑 Audio generation cancelled after {fresh} synthesized sentences.")
+            raise
+        except Exception as e:
+            print(f"❌ Audio generation failed: {e}")
+            return None, None
+
     # --- Method for Notebook (Built-in Speaker) ---
     def generate_and_play(self, text: str, output_path: str = None, language: str = 'en'):
         """